@@ -36,4 +36,7 @@ for meta in data:
         boxes = find_product_boxes(meta, data)
 
         # Be sure to use the exact value returned by meta.file_path_str()
-        solution.append(meta.file_path_str(), boxes)
\ No newline at end of file
+        solution.append(meta.file_path_str(), boxes)
+
+# Wait until all labels are written
+solution.close()
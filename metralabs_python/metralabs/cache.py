@@ -0,0 +1,177 @@
+import sys
+
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from PIL import Image
+
+import pyvista as pv
+
+# bytes per band for PIL image modes that do not use 8 bit per band
+IMAGE_BAND_BYTES = { 'I': 4, 'F': 4, 'I;16': 2, 'I;16B': 2, 'I;16L': 2, 'I;16N': 2 }
+
+def payload_size(value) -> int:
+    '''
+    Approximate memory footprint of a decoded payload in bytes.
+    '''
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands()) * IMAGE_BAND_BYTES.get(value.mode, 1)
+
+    if isinstance(value, pv.DataSet):
+        return value.actual_memory_size * 1024
+
+    return sys.getsizeof(value)
+
+class LRUCache:
+    '''
+    Thread-safe least-recently-used cache bounded by the total size of its entries in bytes.
+
+    Pinned keys are never evicted but count towards the budget.
+    Values larger than the budget are not cached.
+    '''
+
+    def __init__(self, max_bytes : int, size_of=payload_size):
+
+        self.max_bytes_ = int(max_bytes)
+        self.size_of_ = size_of
+
+        # key -> (value, size in bytes), least recently used first
+        self.entries_ = OrderedDict()
+        self.pinned_ = set()
+
+        self.bytes_ = 0
+
+        self.hits_ = 0
+        self.misses_ = 0
+        self.evictions_ = 0
+
+        self.lock_ = threading.Lock()
+
+    def __len__(self):
+
+        return len(self.entries_)
+
+    def __contains__(self, key):
+
+        return key in self.entries_
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value and marks it as most recently used.
+        '''
+        with self.lock_:
+
+            entry = self.entries_.get(key)
+
+            if entry is None:
+                self.misses_ += 1
+                return default
+
+            self.hits_ += 1
+            self.entries_.move_to_end(key)
+
+            return entry[0]
+
+    def put(self, key, value):
+        '''
+        Inserts or replaces a value, evicting the least recently used unpinned entries to stay within the budget.
+        '''
+        size = self.size_of_(value)
+
+        with self.lock_:
+
+            self.discard(key)
+
+            if size > self.max_bytes_:
+                return
+
+            self.entries_[key] = (value, size)
+            self.bytes_ += size
+
+            self.evict()
+
+    def get_or_load(self, key, load):
+        '''
+        Returns the cached value or calls `load()` and caches its result.
+        '''
+        with self.lock_:
+
+            entry = self.entries_.get(key)
+
+            if entry is not None:
+                self.hits_ += 1
+                self.entries_.move_to_end(key)
+                return entry[0]
+
+            self.misses_ += 1
+
+        value = load()
+
+        self.put(key, value)
+
+        return value
+
+    def pin(self, key):
+        '''
+        Excludes the key from eviction, whether it is cached yet or not.
+        '''
+        with self.lock_:
+            self.pinned_.add(key)
+
+    def unpin(self, key):
+
+        with self.lock_:
+            self.pinned_.discard(key)
+
+            self.evict()
+
+    def clear(self):
+
+        with self.lock_:
+            self.entries_.clear()
+            self.bytes_ = 0
+
+    def stats(self) -> dict:
+        '''
+        Returns the hit/miss/eviction counters and the current memory usage.
+        '''
+        return dict(
+            hits=self.hits_,
+            misses=self.misses_,
+            evictions=self.evictions_,
+            entries=len(self.entries_),
+            bytes=self.bytes_,
+            max_bytes=self.max_bytes_
+        )
+
+    def discard(self, key):
+        # lock must be held
+        entry = self.entries_.pop(key, None)
+
+        if entry is not None:
+            self.bytes_ -= entry[1]
+
+    def evict(self):
+        # lock must be held
+        excess = self.bytes_ - self.max_bytes_
+
+        victims = []
+
+        for key, (_, size) in self.entries_.items():
+
+            if excess <= 0:
+                break
+
+            if key not in self.pinned_:
+                victims.append(key)
+                excess -= size
+
+        for key in victims:
+            self.discard(key)
+            self.evictions_ += 1
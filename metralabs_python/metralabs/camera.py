@@ -1,27 +1,43 @@
 
 import numpy as np
 
-from metralabs.data import MessageMeta, MessageType
+from metralabs.cache import LRUCache
+from metralabs.message import MessageMeta, MessageType
+
+def shelf_distance(position) -> float:
+    '''
+    Rough distance between a camera at `position` (x,y,z) and the shelf.
+    The y coordinate of the camera position is the distance from the shelf.
+    '''
+    return position[1] + 0.1
 
 class Camera:
     '''
     Utility class for camera transformations.
     '''
 
+    # (fx, fy, cx, cy, width, height, stride, roi) -> ray grid, see get_ray_grid
+    RAY_GRIDS = LRUCache(256 * 2**20)
+
+    # normalized intrinsics (fx, fy, cx, cy)
+    DEPTH_INTRINSICS = (0.510, 0.906, 0.500, 0.499)
+    COLOR_INTRINSICS = (0.711, 1.264, 0.504, 0.522)
+
+    @staticmethod
+    def intrinsics(msg_type : MessageType):
+        '''
+        Returns the normalized intrinsics (fx, fy, cx, cy) of the camera producing messages of the specified type.
+        '''
+        if msg_type in [MessageType.IMAGE_DEPTH, MessageType.IMAGE_COLOR_REG]:
+            return Camera.DEPTH_INTRINSICS
+
+        return Camera.COLOR_INTRINSICS
+
     def __init__(self, meta : MessageMeta):
         
         self.meta_ = meta
 
-        if meta.type in [MessageType.IMAGE_DEPTH, MessageType.IMAGE_COLOR_REG]:
-            self.fx_ = 0.510
-            self.fy_ = 0.906
-            self.cx_ = 0.500
-            self.cy_ = 0.499
-        else:
-            self.fx_ = 0.711
-            self.fy_ = 1.264
-            self.cx_ = 0.504
-            self.cy_ = 0.522
+        self.fx_, self.fy_, self.cx_, self.cy_ = Camera.intrinsics(meta.type())
 
     def get_position(self, x, y, dist) -> np.typing.ArrayLike:
         '''
@@ -49,12 +65,89 @@ class Camera:
 
         return self.meta_.pose().apply(self.get_position(x, y, dist))
 
+    def get_positions(self, x, y, dist) -> np.ndarray:
+        '''
+        Batched get_position(...) for arrays of image coordinates and distances.
+        Returns (N,3) positions within the camera's coordinate frame.
+        '''
+        x, y, dist = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64).ravel() for v in (x, y, dist)))
+
+        return np.stack(((x - self.cx_) * dist / self.fx_, (y - self.cy_) * dist / self.fy_, dist), axis=1)
+
+    def get_world_positions(self, x, y, dist) -> np.ndarray:
+        '''
+        Batched get_world_position(...) for arrays of image coordinates and distances.
+        Returns (N,3) world positions.
+        '''
+        return self.meta_.pose().apply(self.get_positions(x, y, dist))
+
+    def get_ray_grid(self, width : int, height : int, stride=1, roi=None) -> np.ndarray:
+        '''
+        Directions (x/z, y/z, 1) of the rays through the pixel centers of an image with the specified resolution, as (H,W,3) float32 array.
+        The most recently used grids are cached per intrinsics, resolution, stride and roi. Do not modify the result.
+
+        :param stride:  Only use every stride-th pixel in both directions.
+        :param roi:     Region (x_min, y_min, x_max, y_max) in pixels, max exclusive.
+        '''
+        key = (self.fx_, self.fy_, self.cx_, self.cy_, width, height, stride, roi)
+
+        def load():
+
+            x_min, y_min, x_max, y_max = (0, 0, width, height) if roi is None else roi
+
+            u = (np.arange(x_min, x_max, stride) + 0.5) / width
+            v = (np.arange(y_min, y_max, stride) + 0.5) / height
+
+            grid = np.empty((len(v), len(u), 3), dtype=np.float32)
+
+            grid[:,:,0] = ((u - self.cx_) / self.fx_)[None,:]
+            grid[:,:,1] = ((v - self.cy_) / self.fy_)[:,None]
+            grid[:,:,2] = 1
+
+            grid.flags.writeable = False
+
+            return grid
+
+        return Camera.RAY_GRIDS.get_or_load(key, load)
+
+    def depth_to_points(self, depth, stride=1, roi=None, world=True, scale=1e-3) -> np.ndarray:
+        '''
+        Back-projects a depth image into a point cloud. Pixels without depth (0) are skipped.
+        Returns (N,3) float32 points.
+
+        :param depth:   Depth image (PIL image or (H,W) array), e.g. the data of an IMAGE_DEPTH message.
+        :param stride:  Only use every stride-th pixel in both directions.
+        :param roi:     Region (x_min, y_min, x_max, y_max) in pixels, max exclusive.
+        :param world:   Return world coordinates instead of coordinates within the camera frame.
+        :param scale:   Factor converting pixel values to [m]. Depth images store [mm].
+        '''
+        depth = np.asarray(depth)
+
+        height, width = depth.shape[:2]
+
+        grid = self.get_ray_grid(width, height, stride, roi)
+
+        x_min, y_min, x_max, y_max = (0, 0, width, height) if roi is None else roi
+
+        z = depth[y_min:y_max:stride, x_min:x_max:stride]
+
+        valid = z > 0
+
+        points = grid[valid] * (z[valid].astype(np.float32) * np.float32(scale))[:,None]
+
+        if not world:
+            return points
+
+        mat = self.meta_.pose().matrix().astype(np.float32)
+
+        return points @ mat[:3,:3].T + mat[:3,3]
+
     def get_world_normal(self):
         '''
         Normal vector of the image plane (where the camera is pointing) in world coordinates. 
         '''
 
-        return self.meta_.pose().rot_.apply([0,0,1])
+        return self.meta_.pose().rotation()[:,2]
     
     def get_world_center(self, dist):
         '''
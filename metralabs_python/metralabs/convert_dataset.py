@@ -1,46 +1,203 @@
 #!/bin/env python
+'''
+Converts Pascal VOC annotations (*.xml) of a dataset into label files (*_label.json).
 
-import xml.etree.ElementTree as ET
+Run:
+
+python -m metralabs.convert_dataset path/to/dataset [--jobs N] [--dry-run] [--force]
+
+Label files that are newer than their annotation and meta file are skipped, so converting
+an unchanged dataset again only scans the directory tree.
+'''
 
-from typing import List
+import os
 
 import json
 
-import sys
+import xml.etree.ElementTree as ET
+
+from typing import List, NamedTuple
 
 from pathlib import Path
 
 from metralabs.solution import Box
+from metralabs.index import META_SUFFIX, scan_files
+from metralabs.labels import LABEL_SUFFIX
+from metralabs.parallel import make_executor, map_chunks
+
+VOC_SUFFIX = '.xml'
+
+CONVERTED = 'converted'
+SKIPPED = 'skipped'
+FAILED = 'failed'
 
 def get_boxes(file_path : str) -> List[Box]:
     ''' Get boxes from pascal voc file '''
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-    
     boxes = []
-    for obj in root.findall('object'):
-        bndbox = obj.find('bndbox')
-        xmin = int(bndbox.find('xmin').text)
-        ymin = int(bndbox.find('ymin').text)
-        xmax = int(bndbox.find('xmax').text)
-        ymax = int(bndbox.find('ymax').text)
-        boxes.append([xmin, ymin, xmax, ymax])
-    
+
+    with open(file_path, 'rb') as f:
+        for _, element in ET.iterparse(f):
+
+            if element.tag != 'object':
+                continue
+
+            bndbox = element.find('bndbox')
+            xmin = int(bndbox.find('xmin').text)
+            ymin = int(bndbox.find('ymin').text)
+            xmax = int(bndbox.find('xmax').text)
+            ymax = int(bndbox.find('ymax').text)
+            boxes.append([xmin, ymin, xmax, ymax])
+
+            # objects are not needed anymore, keeps memory flat for large files
+            element.clear()
+
     return boxes
 
+class ConvertResult(NamedTuple):
+    source: str
+    target: str
+    status: str
+    error: str = ''
+
+def related_path(voc_path : str, suffix : str) -> str:
+    '''
+    Path of the file belonging to the annotation, e.g. a/b.xml -> a/b_meta.json
+    '''
+    return voc_path[:-len(VOC_SUFFIX)] + suffix
+
+def plan(root : Path, force=False):
+    '''
+    Finds the annotations below root whose label file is missing or older than the annotation or its meta file.
+    Returns (annotations to convert, up to date annotations), both as lists of paths relative to root.
+    '''
+    mtimes = { path: mtime for path, mtime, _ in scan_files(root, (VOC_SUFFIX, META_SUFFIX, LABEL_SUFFIX)) }
+
+    convert = []
+    skip = []
+
+    for path in sorted(mtimes):
+
+        if not path.endswith(VOC_SUFFIX):
+            continue
+
+        label_mtime = mtimes.get(related_path(path, LABEL_SUFFIX))
+
+        # a missing meta file is reported by the conversion
+        meta_mtime = mtimes.get(related_path(path, META_SUFFIX), 0)
+
+        if not force and label_mtime is not None and label_mtime >= max(mtimes[path], meta_mtime):
+            skip.append(path)
+        else:
+            convert.append(path)
+
+    return convert, skip
+
+def convert_file(root : Path, path : str) -> ConvertResult:
+    '''
+    Writes the label file of one annotation (relative to root).
+    '''
+    target = related_path(path, LABEL_SUFFIX)
+
+    try:
+        boxes = get_boxes(root.joinpath(path))
+
+        with open(root.joinpath(related_path(path, META_SUFFIX)), 'rb') as f:
+            filename = json.load(f)['File']
+
+        label_path = root.joinpath(target)
+        tmp_path = label_path.with_name(label_path.name + '.tmp')
+
+        # an interrupted write must not leave a label that looks up to date
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(file=filename, boxes=boxes), f)
+
+            os.replace(tmp_path, label_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    except (OSError, ET.ParseError, KeyError, ValueError, AttributeError) as e:
+        return ConvertResult(path, target, FAILED, f'{type(e).__name__}: {e}')
+
+    return ConvertResult(path, target, CONVERTED)
+
+def convert_files(tasks) -> List[ConvertResult]:
+    '''
+    Converts a chunk of (root, path) tasks. Used by worker processes.
+    '''
+    return [convert_file(root, path) for root, path in tasks]
+
+def convert(root : Path, jobs=1, dry_run=False, force=False) -> List[ConvertResult]:
+    '''
+    Converts all annotations below root whose label file is missing or outdated.
+    Returns one result per annotation, sorted by path.
+
+    :param jobs:    Number of worker processes, all CPUs if None.
+    :param dry_run: Only report which annotations would be converted, without writing anything.
+    :param force:   Convert all annotations, even if their label file is up to date.
+    '''
+    root = Path(root)
+
+    convert_paths, skip_paths = plan(root, force)
+
+    results = [ConvertResult(path, related_path(path, LABEL_SUFFIX), SKIPPED) for path in skip_paths]
+
+    if dry_run:
+        results += [ConvertResult(path, related_path(path, LABEL_SUFFIX), CONVERTED) for path in convert_paths]
+
+    elif len(convert_paths) > 0:
+
+        executor = make_executor(min(jobs, len(convert_paths)) if jobs is not None else None)
+
+        try:
+            results += map_chunks(convert_files, ((root, path) for path in convert_paths), executor, chunk_size=64)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    return sorted(results, key=lambda result: result.source)
+
+def summarize(results : List[ConvertResult]) -> dict:
+    '''
+    Number of results per status.
+    '''
+    counts = { CONVERTED: 0, SKIPPED: 0, FAILED: 0 }
+
+    for result in results:
+        counts[result.status] += 1
+
+    return counts
+
+if __name__ == '__main__':
+
+    import sys
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert Pascal VOC annotations (*.xml) into label files (*_label.json).')
+    parser.add_argument('dataset', help='dataset directory')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--dry-run', '-n', action='store_true', help='only list the annotations that would be converted')
+    parser.add_argument('--force', '-f', action='store_true', help='convert all annotations, even if their label file is up to date')
+
+    args = parser.parse_args()
+
+    results = convert(Path(args.dataset), args.jobs, args.dry_run, args.force)
 
-files = Path(sys.argv[1]).glob('**/*.xml')
+    for result in results:
+        if result.status == CONVERTED:
+            print(result.source, '-->', result.target)
 
-for file in files:
-    boxes = get_boxes(file.__str__())
-    
-    meta = json.load(open(file.__str__().replace('.xml', '_meta.json'), 'rb'))
+    counts = summarize(results)
 
-    filename = meta['File']
+    verb = 'Would convert' if args.dry_run else 'Converted'
 
-    json_dest = file.__str__().replace('.xml', '_label.json')
+    print(f'{verb} {counts[CONVERTED]}, skipped {counts[SKIPPED]} up to date, failed {counts[FAILED]}')
 
-    print(file.__str__(), "-->", json_dest)
+    failures = [result for result in results if result.status == FAILED]
 
-    json.dump(dict(file=filename, boxes=boxes), open(json_dest, 'w'))
+    for result in failures:
+        print(f'Failed {result.source}: {result.error}', file=sys.stderr)
 
+    if len(failures) > 0:
+        sys.exit(1)
@@ -29,35 +29,75 @@ import os
 
 import json
 
+from collections import deque
+
+from concurrent.futures import ThreadPoolExecutor
+
 from pathlib import Path
 
 from typing import Iterator
 
 import numpy as np
 
-import open3d as o3d
-
 from PIL import Image
 
 import pyvista as pv
 
-from metralabs.message import MessageMeta, MessageType
+from metralabs.message import MessageMeta, MessageType, MetaStore
+from metralabs.index import MetaIndex
+from metralabs.spatial import SpatialIndex
+from metralabs.cache import LRUCache
+from metralabs.pcd import read_pcd
+from metralabs import images
+from metralabs.packed import PackedData
+from metralabs.labels import LabelStore
+
+def load_json(path) -> dict:
+
+    with open(path, 'rb') as f:
+        return json.load(f)
 
 class DataFolder:
 
-    def __init__(self, path):
+    def __init__(self, path, index=True, rebuild=False, cache_bytes=0):
+        '''
+        :param path:        Dataset directory.
+        :param index:       Use (and maintain) the persistent metadata index in `<path>/.metralabs`.
+                            Only meta files that changed since the last run are parsed.
+        :param rebuild:     Discard the existing index and parse all meta files again.
+        :param cache_bytes: Memory budget of the cache for data decoded by load_data(...). Disabled if 0.
+        '''
 
         self.path_ = Path(os.path.expanduser(path))
 
         if not self.path_.exists():
             raise OSError(f'Specified data directory not found: {self.path_.absolute()}')
-        
-        self.meta_paths_ = self.path_.glob('**/*_meta.json')
 
-        self.meta_ = sorted(
-            (MessageMeta(json.load(open(meta_file))) for meta_file in self.meta_paths_),
-            key=lambda meta: meta.time()
-        )
+        # packed datasets (see metralabs.pack) are read from their shards
+        self.packed_ = PackedData(self.path_) if PackedData.is_packed(self.path_) else None
+
+        if self.packed_ is not None:
+            self.index_ = None
+
+            self.meta_ = self.packed_.store()
+        elif index:
+            self.index_ = MetaIndex.open(self.path_, rebuild=rebuild)
+
+            self.meta_ = self.index_.store()
+        else:
+            self.index_ = None
+
+            self.meta_ = MetaStore.from_records(
+                load_json(meta_file) for meta_file in self.path_.glob('**/*_meta.json')
+            ).sorted()
+
+        # projection distance -> SpatialIndex
+        self.spatial_ = {}
+
+        self.cache_ = LRUCache(cache_bytes) if cache_bytes > 0 else None
+
+        # LabelStore, loaded on first use
+        self.labels_ = None
 
     def __iter__(self):
 
@@ -67,27 +107,103 @@ class DataFolder:
 
         return len(self.meta_)
 
+    def store(self) -> MetaStore:
+        '''
+        Column-wise metadata of all messages, sorted by time. Iterating yields MessageMeta views.
+        '''
+        return self.meta_
+
+    def spatial_index(self, dist=None) -> SpatialIndex:
+        '''
+        Spatial index over the image footprints and point cloud centers of all messages.
+        Built on first use and persisted alongside the metadata index.
+
+        :param dist: Projection distance of images in [m], see metralabs.spatial.message_bounds.
+        '''
+        if dist not in self.spatial_:
+            self.spatial_[dist] = SpatialIndex.open(self.path_, self.meta_, dist, save=self.index_ is not None or self.packed_ is not None)
+
+        return self.spatial_[dist]
+
     def get_start_time(self):
 
-        return self.meta_[0].time_ if len(self.meta_) > 0 else -1
+        return int(self.meta_.time_[0]) if len(self.meta_) > 0 else -1
     
     def get_end_time(self):
 
-        return self.meta_[-1].time_ if len(self.meta_) > 0 else -1
+        return int(self.meta_.time_[-1]) if len(self.meta_) > 0 else -1
 
 
     def load_data(self, meta : MessageMeta):
         '''
         Returns load_image(...) or load_pcl(...) dpending on message type.
+
+        If the cache is enabled, decoded data is kept in memory and shared between calls. Do not modify it.
+        '''
+        if self.cache_ is None:
+            return self.load_uncached(meta)
+
+        return self.cache_.get_or_load(meta.file_path_str(), lambda: self.load_uncached(meta, decode=True))
+
+    def load_uncached(self, meta : MessageMeta, decode=False):
+        '''
+        Loads the data of the message, bypassing the cache.
+
+        :param decode: Decode images right away instead of lazily on first access.
         '''
         msg_type = meta.type()
 
         if msg_type == MessageType.POINT_CLOUD:
             return self.load_pcd(meta.file_path())
-        elif msg_type.startswith('IMAGE'):
-            return self.load_image(meta.file_path())
+        elif msg_type.name.startswith('IMAGE'):
+            image = self.load_image(meta.file_path())
+
+            if decode:
+                image.load()
+
+            return image
         else:
-            raise Exception('Unsupported message type: ' + msg_type)
+            raise Exception('Unsupported message type: ' + msg_type.name)
+
+    def iter_loaded(self, prefetch=8, workers=4, types=None, query=None):
+        '''
+        Iterates over (meta, data) pairs in time order while a thread pool loads and decodes
+        the next `prefetch` messages in the background.
+
+        At most `prefetch` decoded messages are held in memory at once. Stopping the iteration
+        early (break, close()) cancels all pending loads.
+
+        :param prefetch:    Number of messages to load ahead of the consumer.
+        :param workers:     Number of loader threads.
+        :param types:       Only load messages of these MessageTypes.
+        :param query:       Only load messages matching this DataQuery.
+        '''
+        if types is not None:
+            query = MessageTypes(*types) if query is None else query & MessageTypes(*types)
+
+        messages = iter(self) if query is None else query.run(self.meta_)
+
+        load = self.load_data if self.cache_ is not None else lambda meta: self.load_uncached(meta, decode=True)
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='DataFolder.iter_loaded')
+
+        pending = deque()
+
+        try:
+            for meta in messages:
+
+                pending.append((meta, pool.submit(load, meta)))
+
+                if len(pending) >= max(prefetch, 1):
+                    meta, future = pending.popleft()
+                    yield meta, future.result()
+
+            while pending:
+                meta, future = pending.popleft()
+                yield meta, future.result()
+
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
 
     def resolve(self, path) -> Path:
         '''
@@ -99,20 +215,93 @@ class DataFolder:
         '''
         Load image file.
         '''
+        if self.packed_ is not None:
+            return self.packed_.load_image(file_path)
+
         return Image.open(self.resolve(file_path).__str__())
 
-    def load_pcd(self, file_path) -> pv.PolyData:
+    def load_images(self, meta, size=None, mode='RGB', normalize=False, out=None, workers=None, executor=None) -> np.ndarray:
+        '''
+        Decodes the images of a list of MessageMeta into one contiguous (B,H,W,C) uint8 array using a process pool.
+        See metralabs.images.load_images for the parameters.
+        '''
+        if self.packed_ is not None:
+            sources = [self.packed_.byte_range(m.file_path()) for m in meta]
+        else:
+            sources = [self.resolve(m.file_path()) for m in meta]
+
+        return images.load_images(
+            sources,
+            size=size, mode=mode, normalize=normalize, out=out, workers=workers, executor=executor
+        )
+
+    def load_pcd(self, file_path, raw=False) -> pv.PolyData:
         '''
         Load .pcd file relative to data directory as pv.PolyData.
 
         See https://docs.pyvista.org/version/stable/api/core/_autosummary/pyvista.PolyData.html
+
+        :param raw: Return the (N,3) float32 point array instead. For binary files this is a read-only view into the memory-mapped file.
+                    Otherwise the points are copied, the returned PolyData owns them.
         '''
-        
-        pc = o3d.io.read_point_cloud(self.resolve(file_path).__str__())
+        if self.packed_ is not None:
+            points = self.packed_.load_pcd(file_path)
+        else:
+            points = read_pcd(self.resolve(file_path))
 
-        return pv.PolyData(np.asarray(pc.points))
+        # pyvista wraps the array without copying and does not respect read-only views
+        return points if raw else pv.PolyData(points, deep=True)
+
+    def label_store(self, refresh=False) -> LabelStore:
+        '''
+        Boxes of all labels within the dataset. Loaded on first use and persisted alongside the metadata index.
+
+        :param refresh: Parse label files that changed since the store was loaded.
+        '''
+        if self.labels_ is None:
+
+            if self.packed_ is not None:
+                self.labels_ = LabelStore.from_labels(self.packed_.labels())
+            else:
+                self.labels_ = LabelStore.open(self.path_, rebuild=self.index_ is None, save=self.index_ is not None)
+
+        elif refresh and self.packed_ is None and self.labels_.refresh() and self.index_ is not None:
+            self.labels_.save()
+
+        return self.labels_
+
+    def labels(self) -> Iterator[dict]:
+        '''
+        All labels (dicts with `file` and `boxes`) within the dataset.
+        '''
+        return iter(self.label_store())
+
+    def load_label(self, meta : MessageMeta):
+        '''
+        Returns the label of the message or None if it is not labeled.
+        '''
+        return self.label_store().label(meta.file_path_str())
+
+def row_indices(rows) -> np.ndarray:
+    '''
+    Converts a row selection (slice or index array) to a sorted index array.
+    '''
+    if isinstance(rows, slice):
+        return np.arange(rows.start, rows.stop, dtype=np.int64)
+
+    return rows
 
 class DataQuery:
+    '''
+    Query over message metadata.
+
+    Queries can be combined using `&`, `|` and `~`. When run on a DataFolder or MetaStore, each
+    query narrows down the set of candidate rows using the columns of the store (`select_rows`).
+    Queries that only override `matches` are evaluated per message on the remaining candidates.
+    '''
+
+    # Rough cost of select_rows, used to order the terms of And queries. Cheap, selective queries go first.
+    cost = 0
 
     def matches(self, meta : MessageMeta) -> bool:
         '''
@@ -120,15 +309,217 @@ class DataQuery:
         '''
         return True
 
+    def select_rows(self, store : MetaStore, rows):
+        '''
+        Column-based implementation of `matches`.
+        Receives the candidate rows as slice or sorted index array and returns the matching subset in either form.
+        '''
+        return rows
+
+    def indexed(self) -> bool:
+        '''
+        True if `select_rows` can be used, i.e. no subclass changed the semantics of `matches`.
+        '''
+        for cls in type(self).__mro__:
+            if 'select_rows' in vars(cls):
+                return type(self).matches is cls.matches
+
+    def select(self, store : MetaStore, rows=None):
+        '''
+        Returns the rows of the store matching the query, as slice or sorted index array.
+
+        :param rows: Candidate rows (slice or sorted index array). Defaults to all rows.
+        '''
+        if rows is None:
+            rows = slice(0, len(store))
+
+        if self.indexed():
+            return self.select_rows(store, rows)
+
+        return np.array([i for i in row_indices(rows).tolist() if self.matches(store[i])], dtype=np.int64)
+
     def run(self, meta : Iterator[MessageMeta]) -> Iterator[MessageMeta]:
+
+        if isinstance(meta, DataFolder):
+            meta = meta.store()
+
+        if isinstance(meta, MetaStore):
+            return (meta[i] for i in row_indices(self.select(meta)).tolist())
+
         return (m for m in meta if self.matches(m))
 
+    def __and__(self, other : 'DataQuery') -> 'DataQuery':
+        return And(self, other)
+
+    def __or__(self, other : 'DataQuery') -> 'DataQuery':
+        return Or(self, other)
+
+    def __invert__(self) -> 'DataQuery':
+        return Not(self)
+
+class And(DataQuery):
+
+    cost = 1
+
+    def __init__(self, *queries : DataQuery):
+        self.queries_ = queries
+
+    def matches(self, meta : MessageMeta):
+        return all(query.matches(meta) for query in self.queries_)
+
+    def select_rows(self, store : MetaStore, rows):
+
+        # queries evaluated per message go last, on as few candidates as possible
+        for query in sorted(self.queries_, key=lambda query: query.cost if query.indexed() else 10):
+            rows = query.select(store, rows)
+
+        return rows
+
+class Or(DataQuery):
+
+    cost = 3
+
+    def __init__(self, *queries : DataQuery):
+        self.queries_ = queries
+
+    def matches(self, meta : MessageMeta):
+        return any(query.matches(meta) for query in self.queries_)
+
+    def select_rows(self, store : MetaStore, rows):
+
+        selected = np.zeros(0, dtype=np.int64)
+
+        for query in self.queries_:
+            selected = np.union1d(selected, row_indices(query.select(store, rows)))
+
+        return selected
+
+class Not(DataQuery):
+
+    cost = 3
+
+    def __init__(self, query : DataQuery):
+        self.query_ = query
+
+    def matches(self, meta : MessageMeta):
+        return not self.query_.matches(meta)
+
+    def select_rows(self, store : MetaStore, rows):
+
+        rows = row_indices(rows)
+
+        return np.setdiff1d(rows, row_indices(self.query_.select(store, rows)), assume_unique=True)
+
 class TimeRange(DataQuery):
-    
+    '''
+    Messages with start <= time <= end. Resolved by binary search on the time column.
+    '''
+
+    cost = 0
+
     def __init__(self, start : int, end : int):
         self.start_ = start
         self.end_ = end
 
     def matches(self, meta : MessageMeta):
         
-        return self.start_ <= meta.time_ <= self.end_
\ No newline at end of file
+        return self.start_ <= meta.time_ <= self.end_
+
+    def select_rows(self, store : MetaStore, rows):
+
+        if isinstance(rows, slice):
+
+            times = store.time_[rows]
+
+            return slice(
+                rows.start + int(np.searchsorted(times, self.start_, side='left')),
+                rows.start + int(np.searchsorted(times, self.end_, side='right'))
+            )
+
+        times = store.time_[rows]
+
+        return rows[(self.start_ <= times) & (times <= self.end_)]
+
+class GroupQuery(DataQuery):
+    '''
+    Base class for queries matching a set of codes of a categorical column of the store.
+    Resolved using the per-code row groups of the store.
+    '''
+
+    cost = 1
+
+    column = None
+
+    def codes(self, store : MetaStore):
+        return []
+
+    def select_rows(self, store : MetaStore, rows):
+
+        codes = self.codes(store)
+
+        if isinstance(rows, slice):
+
+            selected = []
+
+            for code in codes:
+                group = store.group_rows(self.column, code)
+                selected.append(group[np.searchsorted(group, rows.start):np.searchsorted(group, rows.stop)])
+
+            return np.sort(np.concatenate(selected)) if len(selected) > 0 else np.zeros(0, dtype=np.int64)
+
+        return rows[np.isin(getattr(store, self.column)[rows], codes)]
+
+class MessageTypes(GroupQuery):
+    '''
+    Messages of any of the specified types.
+    '''
+
+    column = 'type_'
+
+    def __init__(self, *types : MessageType):
+        self.types_ = types
+
+    def matches(self, meta : MessageMeta):
+        return meta.type() in self.types_
+
+    def codes(self, store : MetaStore):
+        return [store.type_code(t) for t in self.types_]
+
+class Folder(GroupQuery):
+    '''
+    Messages whose file is located within the specified folder relative to the dataset, e.g. 'cam1' or 'cam1/ColorImage'.
+    '''
+
+    column = 'dir_code_'
+
+    def __init__(self, folder : str):
+        self.prefix_ = folder.strip('/') + '/'
+
+    def matches(self, meta : MessageMeta):
+        return meta.file_path_str().startswith(self.prefix_)
+
+    def codes(self, store : MetaStore):
+        return [code for code,d in enumerate(store.dirs_) if d.startswith(self.prefix_)]
+
+class PoseBox(DataQuery):
+    '''
+    Messages whose pose position lies within the axis aligned box [min_corner, max_corner].
+    '''
+
+    cost = 2
+
+    def __init__(self, min_corner, max_corner):
+        self.min_ = np.asarray(min_corner, dtype=np.float64)
+        self.max_ = np.asarray(max_corner, dtype=np.float64)
+
+    def matches(self, meta : MessageMeta):
+        pos = meta.pose().trans_
+        return bool(np.all((self.min_ <= pos) & (pos <= self.max_)))
+
+    def select_rows(self, store : MetaStore, rows):
+
+        pos = store.pose_[rows, :3]
+
+        mask = np.all((self.min_ <= pos) & (pos <= self.max_), axis=1)
+
+        return row_indices(rows)[mask]
@@ -1,15 +1,30 @@
 
+import csv
+
 import json
 
-from typing import List, Tuple
+import os
+
+import hashlib
+
+import time
+
+from typing import List, NamedTuple, Tuple
+
+from concurrent.futures import Executor
 
 from pathlib import Path
 
 import numpy as np
 
-from munkres import Munkres
+from scipy import sparse
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse.csgraph import connected_components
 
-from metralabs.solution import Box
+from metralabs.solution import Box, is_jsonl_solution, read_solution, read_solution_lines
+from metralabs.index import save_npz
+from metralabs.labels import LabelStore
+from metralabs.parallel import make_executor, map_chunks
 
 # Box = (x_1, y_1, x_2, y_2)
 
@@ -28,6 +43,71 @@ def intersection(a: Box, b: Box) -> float:
 
     return area((x_left, y_top, x_right, y_bottom))
 
+def iou_matrix(solution, reference) -> np.ndarray:
+    '''
+    Intersection over union of every solution box (N,4) with every reference box (M,4) as (N,M) matrix.
+    '''
+    a = np.asarray(solution, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(reference, dtype=np.float64).reshape(-1, 4)
+
+    x_left = np.maximum(a[:,None,0], b[None,:,0])
+    y_top = np.maximum(a[:,None,1], b[None,:,1])
+    x_right = np.minimum(a[:,None,2], b[None,:,2])
+    y_bottom = np.minimum(a[:,None,3], b[None,:,3])
+
+    int_area = np.where((x_right < x_left) | (y_bottom < y_top), 0.0, (x_right - x_left) * (y_bottom - y_top))
+
+    area_a = np.abs(a[:,0] - a[:,2]) * np.abs(a[:,1] - a[:,3])
+    area_b = np.abs(b[:,0] - b[:,2]) * np.abs(b[:,1] - b[:,3])
+
+    union_area = area_b[None,:] + area_a[:,None] - int_area
+
+    return np.divide(int_area, union_area, out=np.zeros_like(int_area), where=union_area > 0)
+
+def assign(iou : np.ndarray):
+    '''
+    Maximum IoU assignment for the (N,M) IoU matrix.
+    Returns the matched column (or -1) for each row.
+
+    Boxes only interact through non-zero IoU, so the problem is split into the connected
+    components of the overlap graph which are solved independently.
+    '''
+    n_rows, n_cols = iou.shape
+
+    match = np.full(n_rows, -1, dtype=np.int64)
+
+    if n_rows == 0 or n_cols == 0:
+        return match
+
+    overlap = sparse.csr_matrix(iou > 0)
+
+    # bipartite graph: nodes [0, n_rows) are rows, [n_rows, n_rows + n_cols) are columns
+    graph = sparse.bmat([[None, overlap], [overlap.T, None]])
+
+    _, labels = connected_components(graph, directed=False)
+
+    order = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+
+    for nodes in np.split(order, bounds):
+
+        rows = nodes[nodes < n_rows]
+        cols = nodes[nodes >= n_rows] - n_rows
+
+        # isolated boxes without any overlap
+        if len(rows) == 0 or len(cols) == 0:
+            continue
+
+        if len(rows) == 1 and len(cols) == 1:
+            match[rows[0]] = cols[0]
+            continue
+
+        r, c = linear_sum_assignment(iou[np.ix_(rows, cols)], maximize=True)
+
+        match[rows[r]] = cols[c]
+
+    return match
+
 def associate_boxes(solution : List[Box], reference: List[Box]):
     '''
     Associates each box in the solution with a box in the reference.
@@ -40,15 +120,19 @@ def associate_boxes(solution : List[Box], reference: List[Box]):
 
     iou = np.zeros((n, n))
 
-    for i,sol in enumerate(solution):
-        for j,ref in enumerate(reference):
+    iou[:len(solution), :len(reference)] = iou_matrix(solution, reference)
 
-            int_area = intersection(sol, ref)
+    match = np.full(n, -1, dtype=np.int64)
+    match[:len(solution)] = assign(iou[:len(solution), :len(reference)])
 
-            union_area = area(ref) + area(sol) - int_area
-            iou[i,j] = int_area/union_area
+    # pair the remaining rows and columns (zero IoU) in order
+    used = np.zeros(n, dtype=bool)
+    used[match[match >= 0]] = True
 
-    return iou, Munkres().compute(np.zeros_like(iou) - iou)
+    free = match < 0
+    match[free] = np.flatnonzero(~used)[:np.count_nonzero(free)]
+
+    return iou, [(i, j) for i, j in enumerate(match.tolist())]
 
 
 def grade_boxes(solution : List[Box], reference: List[Box]) -> float:
@@ -56,8 +140,16 @@ def grade_boxes(solution : List[Box], reference: List[Box]) -> float:
     Grades the solution for one set of boxes within [0,1].
     '''
 
+    return grade_boxes_ious(solution, reference)[0]
+
+def grade_boxes_ious(solution : List[Box], reference: List[Box]) -> Tuple[float, np.ndarray]:
+    '''
+    Returns the grade of the boxes (see grade_boxes) and the non-zero IoUs of all matched box pairs.
+    Detection metrics at any IoU threshold follow from the IoUs of this single assignment.
+    '''
+
     if len(reference) == 0 or len(solution) == 0:
-        return 0
+        return 0, np.zeros(0)
 
     iou, indices = associate_boxes(solution, reference)
 
@@ -66,51 +158,531 @@ def grade_boxes(solution : List[Box], reference: List[Box]) -> float:
     for i,j in indices:
         score += iou[i,j]
 
-    return score/len(indices)
+    rows, cols = np.array(indices).T
+
+    ious = iou[rows, cols]
+
+    return score/len(indices), ious[ious > 0]
+
+class FileResult(NamedTuple):
+    '''
+    Grading result of one labeled file.
+    '''
+    file : str
+    # grade_boxes(...) of the file within [0,1]
+    score : float
+    sol_count : int
+    ref_count : int
+    # time spent grading the file
+    seconds : float
+    # non-zero IoUs of the matched box pairs, a tuple so results stay immutable and comparable
+    ious : Tuple[float, ...] = ()
+
+def grade_label(sol, ref) -> FileResult:
+    '''
+    Grades the solution label of one file against its reference label.
+    '''
+    start = time.perf_counter()
+
+    score, ious = grade_boxes_ious(sol['boxes'], ref['boxes'])
+
+    return FileResult(ref['file'], float(score), len(sol['boxes']), len(ref['boxes']), time.perf_counter() - start, tuple(ious.tolist()))
+
+def grade_label_files(pairs) -> List[FileResult]:
+    '''
+    Grades a list of (solution label, reference label) pairs where each label is a dict or the path of a label file.
+    Used by worker processes.
+    '''
+    def load(label):
+        return label if isinstance(label, dict) else load_label(label)
+
+    return [grade_label(load(sol), load(ref)) for sol, ref in pairs]
+
+def load_label(path) -> dict:
+
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+def label_files(paths) -> List[str]:
+    '''
+    The labeled file of each label file in a list. Used by worker processes.
+    '''
+    return [load_label(path)['file'] for path in paths]
+
+def index_labels(labels) -> dict:
+    '''
+    Maps the file of each label to the label. The first label of a file is used.
+    '''
+    index = {}
+
+    for label in labels:
+        index.setdefault(label['file'], label)
+
+    return index
+
+def index_label_files(paths, executor : Executor = None) -> dict:
+    '''
+    Maps the file of each label file to its path. The label files are read by the executor, the first label of a file is used.
+    '''
+    paths = list(paths)
+
+    index = {}
+
+    for path, file in zip(paths, map_chunks(label_files, paths, executor)):
+        index.setdefault(file, path)
+
+    return index
+
+def grade_files(sol_labels, ref_labels, executor : Executor = None) -> List[FileResult]:
+    '''
+    Grades each reference label against the solution label of the same file.
+    Reference labels are streamed, the results are sorted by file.
+
+    :param executor: Grades chunks of files in this executor (e.g. a ProcessPoolExecutor) if given.
+    '''
+    return grade_indexed(index_labels(sol_labels), ref_labels, executor)
+
+def grade_indexed(solution : dict, ref_labels, executor : Executor = None) -> List[FileResult]:
+    '''
+    grade_files(...) for solution labels indexed by file, see index_labels and index_label_files.
+    Solution labels given as paths are read by the executor, only the results are sent back.
+    '''
+    def pairs():
+
+        for ref in ref_labels:
+
+            sol = solution.get(ref['file'])
+
+            if sol is None:
+                raise Exception('Missing solution label for file ' + ref['file'])
+
+            yield sol, ref
+
+    results = list(map_chunks(grade_label_files, pairs(), executor))
 
-def grade_solution(sol_labels, ref_labels) -> Tuple[float, int, int]:
+    results.sort(key=lambda result: result.file)
 
-    sol_labels = list(sol_labels)
+    return results
 
+def summarize(results : List[FileResult]) -> Tuple[float, int, int]:
+    '''
+    Aggregates per-file results to (score, number of solution boxes, number of reference boxes).
+    The score is the average over all reference boxes.
+    '''
     score = 0
     # total number of boxes in reference
     ref_count = 0
     # total number of boxes in solution
     sol_count = 0
 
-    for ref in ref_labels:
+    for result in results:
 
-        sol = next((label for label in sol_labels if label['file'] == ref['file']), None)
-        
-        if sol == None:
-            raise Exception('Missing solution label for file ' + ref['file'])
-        
-        sol_labels.remove(sol)
+        score += result.score*result.ref_count
 
-        sol_score = grade_boxes(sol['boxes'], ref['boxes'])
+        ref_count += result.ref_count
+        sol_count += result.sol_count
 
-        score += sol_score*len(ref['boxes'])
+    return score / ref_count, sol_count, ref_count
 
-        ref_count += len(ref['boxes'])
-        sol_count += len(sol['boxes'])
+# IoU thresholds 0.5, 0.55, ..., 0.95
+DEFAULT_THRESHOLDS = tuple(np.round(np.arange(0.5, 0.96, 0.05), 2).tolist())
 
-    
-    return score / ref_count, sol_count, ref_count
+def camera_of(file : str) -> str:
+    '''
+    Camera of a labeled file, i.e. its top-level folder (e.g. 'cam1').
+    '''
+    return file.split('/', 1)[0] if '/' in file else ''
 
-    
-def grade_solution_dir(solution_dir : Path, reference_dir : Path):
+def true_positives(results : List[FileResult], thresholds=DEFAULT_THRESHOLDS) -> np.ndarray:
+    '''
+    (N,T) number of matched box pairs with IoU >= threshold for each result and threshold.
+    '''
+    thresholds = np.asarray(thresholds, dtype=np.float64)
 
-    ref_labels = (json.load(open(label_path, 'rb')) for label_path in reference_dir.glob('**/*_label.json') )
-    sol_labels = (json.load(open(label_path, 'rb')) for label_path in solution_dir.glob('**/*_label.json') )
-    
-    return grade_solution(sol_labels, ref_labels)
+    ious = np.concatenate([np.zeros(0)] + [np.asarray(result.ious, dtype=np.float64) for result in results])
+
+    owner = np.repeat(np.arange(len(results)), [len(result.ious) for result in results])
+
+    tp = np.zeros((len(results), len(thresholds)), dtype=np.int64)
+
+    for k, threshold in enumerate(thresholds):
+        tp[:, k] = np.bincount(owner[ious >= threshold], minlength=len(results))
+
+    return tp
+
+def detection_metrics(score_sum, sol_count, ref_count, tp, thresholds=DEFAULT_THRESHOLDS) -> dict:
+    '''
+    Score and precision, recall, F1 and AP per IoU threshold for aggregated counts.
+
+    Solution boxes have no confidences, so the precision/recall curve is a single point and AP = precision * recall.
+
+    :param score_sum:   Sum of the per-file scores weighted by the number of reference boxes.
+    :param tp:          (T,) true positives for each threshold, see true_positives(...).
+    '''
+    tp = np.asarray(tp, dtype=np.float64)
+
+    precision = tp / sol_count if sol_count > 0 else np.zeros_like(tp)
+    recall = tp / ref_count if ref_count > 0 else np.zeros_like(tp)
+
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=precision + recall > 0)
+
+    ap = precision * recall
+
+    metrics = dict(
+        score=score_sum / ref_count if ref_count > 0 else 0.0,
+        sol_count=int(sol_count),
+        ref_count=int(ref_count),
+        mAP=float(ap.mean()) if len(ap) > 0 else 0.0
+    )
+
+    for k, threshold in enumerate(thresholds):
+        metrics[f'precision@{threshold:g}'] = float(precision[k])
+        metrics[f'recall@{threshold:g}'] = float(recall[k])
+        metrics[f'f1@{threshold:g}'] = float(f1[k])
+        metrics[f'ap@{threshold:g}'] = float(ap[k])
+
+    return metrics
+
+def grouped_metrics(results : List[FileResult], groups, thresholds=DEFAULT_THRESHOLDS) -> dict:
+    '''
+    Detection metrics for each group of results, e.g. per camera.
+
+    :param groups: Group name of each result.
+    '''
+    tp = true_positives(results, thresholds)
+
+    names, group = np.unique(np.array(groups, dtype=np.str_), return_inverse=True)
+
+    def total(values):
+        return np.bincount(group, weights=np.asarray(values, dtype=np.float64), minlength=len(names))
+
+    score_sum = total([result.score * result.ref_count for result in results])
+    sol_count = total([result.sol_count for result in results])
+    ref_count = total([result.ref_count for result in results])
+
+    tp_sum = np.zeros((len(names), len(thresholds)))
+    np.add.at(tp_sum, group, tp)
+
+    return {
+        name: detection_metrics(score_sum[g], sol_count[g], ref_count[g], tp_sum[g], thresholds)
+        for g, name in enumerate(names.tolist())
+    }
+
+def write_metrics(results : List[FileResult], directory : Path, thresholds=DEFAULT_THRESHOLDS):
+    '''
+    Writes detection metrics per file (files.csv) and per camera and in total (cameras.csv) to the directory.
+    '''
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    files = [result.file for result in results]
+
+    per_file = grouped_metrics(results, files, thresholds)
+    per_camera = grouped_metrics(results, [camera_of(file) for file in files], thresholds)
+    per_camera['all'] = detection_metrics(
+        sum(result.score * result.ref_count for result in results),
+        sum(result.sol_count for result in results),
+        sum(result.ref_count for result in results),
+        true_positives(results, thresholds).sum(axis=0),
+        thresholds
+    )
+
+    write_csv(directory.joinpath('files.csv'), 'file', per_file)
+    write_csv(directory.joinpath('cameras.csv'), 'camera', per_camera)
+
+def write_csv(path : Path, key : str, rows : dict):
+
+    columns = list(next(iter(rows.values())).keys()) if len(rows) > 0 else []
+
+    with open(path, 'w', newline='') as f:
+
+        writer = csv.writer(f)
+        writer.writerow([key] + columns)
+
+        for name, metrics in rows.items():
+            writer.writerow([name] + [metrics[column] for column in columns])
+
+def grade_solution(sol_labels, ref_labels, jobs=1) -> Tuple[float, int, int]:
+
+    executor = make_executor(jobs)
+
+    try:
+        return summarize(grade_files(sol_labels, ref_labels, executor))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+class GradeCache:
+    '''
+    Per-file grading results keyed by SHA-1 hashes of the solution and reference labels (see label_digest).
+
+    Hashes of solution label files are memoized by (path, mtime, size), so unchanged files are neither read nor graded again.
+    Only entries of the latest run are kept.
+    '''
+
+    VERSION = 3
+
+    FILE_NAME = 'grade_cache.npz'
+
+    def __init__(self, path : Path):
+
+        self.path_ = Path(path)
+
+        # path -> (mtime_ns, size, digest, file)
+        self.stats_ = {}
+        # (solution digest, reference digest) -> (score, sol_count, ref_count, seconds, ious)
+        self.results_ = {}
+
+        # entries used in the current run
+        self.used_stats_ = {}
+        self.used_results_ = {}
+
+        self.load()
+
+    def file_path(self) -> Path:
+
+        return self.path_.joinpath(GradeCache.FILE_NAME)
+
+    def load(self):
+
+        try:
+            with np.load(self.file_path(), allow_pickle=False) as npz:
+
+                if int(npz['version']) != GradeCache.VERSION:
+                    return
+
+                self.stats_ = {
+                    path: (mtime, size, digest, file)
+                    for path, mtime, size, digest, file in zip(
+                        npz['stat_path'].tolist(), npz['stat_mtime'].tolist(), npz['stat_size'].tolist(),
+                        npz['stat_digest'].tolist(), npz['stat_file'].tolist()
+                    )
+                }
+
+                ious = np.split(npz['ious'], np.cumsum(npz['ious_count'])[:-1])
+
+                self.results_ = {
+                    (sol, ref): (score, sol_count, ref_count, seconds, result_ious)
+                    for sol, ref, score, sol_count, ref_count, seconds, result_ious in zip(
+                        npz['sol_digest'].tolist(), npz['ref_digest'].tolist(), npz['score'].tolist(),
+                        npz['sol_count'].tolist(), npz['ref_count'].tolist(), npz['seconds'].tolist(), [tuple(v.tolist()) for v in ious]
+                    )
+                }
+
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self):
+        '''
+        Writes the entries used since the cache was opened. Failing to do so is not an error.
+        '''
+        stats = self.used_stats_
+        results = self.used_results_
+
+        save_npz(
+            self.file_path(),
+            version=GradeCache.VERSION,
+            stat_path=np.array(list(stats), dtype=np.str_),
+            stat_mtime=np.array([v[0] for v in stats.values()], dtype=np.int64),
+            stat_size=np.array([v[1] for v in stats.values()], dtype=np.int64),
+            stat_digest=np.array([v[2] for v in stats.values()], dtype=np.str_),
+            stat_file=np.array([v[3] for v in stats.values()], dtype=np.str_),
+            sol_digest=np.array([k[0] for k in results], dtype=np.str_),
+            ref_digest=np.array([k[1] for k in results], dtype=np.str_),
+            score=np.array([v[0] for v in results.values()], dtype=np.float64),
+            sol_count=np.array([v[1] for v in results.values()], dtype=np.int64),
+            ref_count=np.array([v[2] for v in results.values()], dtype=np.int64),
+            seconds=np.array([v[3] for v in results.values()], dtype=np.float64),
+            ious=np.array([iou for v in results.values() for iou in v[4]], dtype=np.float64),
+            ious_count=np.array([len(v[4]) for v in results.values()], dtype=np.int64)
+        )
+
+    def describe(self, path : Path):
+        '''
+        Returns (digest, file) of a label file, reading it only if it changed since it was last described.
+        '''
+        path = str(Path(path).absolute())
+
+        stat = os.stat(path)
+
+        entry = self.stats_.get(path)
+
+        if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            entry = (stat.st_mtime_ns, stat.st_size, hashlib.sha1(data).hexdigest(), json.loads(data)['file'])
+
+            self.stats_[path] = entry
+
+        self.used_stats_[path] = entry
+
+        return entry[2], entry[3]
+
+    def get(self, sol_digest : str, ref_digest : str, file : str) -> FileResult:
+
+        entry = self.results_.get((sol_digest, ref_digest))
+
+        if entry is None:
+            return None
+
+        self.used_results_[(sol_digest, ref_digest)] = entry
+
+        return FileResult(file, *entry)
+
+    def put(self, sol_digest : str, ref_digest : str, result : FileResult):
+
+        entry = (result.score, result.sol_count, result.ref_count, result.seconds, result.ious)
+
+        self.results_[(sol_digest, ref_digest)] = entry
+        self.used_results_[(sol_digest, ref_digest)] = entry
+
+def reference_labels(reference_dir : Path) -> LabelStore:
+    '''
+    Reference labels of a dataset, read from its label store without writing to the dataset.
+    '''
+    return LabelStore.open(reference_dir, save=False)
+
+def label_digest(label : dict) -> str:
+    '''
+    SHA-1 hash of the file and boxes of a label, independent of how the label was stored.
+    '''
+    h = hashlib.sha1(label['file'].encode())
+    h.update(np.asarray(label['boxes'], dtype=np.float64).tobytes())
+
+    return h.hexdigest()
+
+def grade_solution_dir_files(solution_dir : Path, reference_dir : Path, executor : Executor = None, cache : GradeCache = None) -> List[FileResult]:
+    '''
+    Per-file results for the label files in the directories. Solution label files are read by the executor,
+    which only sends back the labeled files and the results. Reference labels are read with reference_labels(...).
+
+    :param cache: Only grade files whose solution or reference label changed since they were last graded with this cache.
+    '''
+    jsonl = is_jsonl_solution(solution_dir)
+
+    sol_paths = Path(solution_dir).glob('**/*_label.json')
+
+    if cache is None:
+
+        if jsonl:
+            solution = index_labels(read_solution(solution_dir))
+        else:
+            solution = index_label_files(sol_paths, executor)
+
+        return grade_indexed(solution, iter(reference_labels(reference_dir)), executor)
+
+    # file -> (path or label, digest)
+    solution = {}
+
+    if jsonl:
+
+        for line in read_solution_lines(solution_dir):
+
+            label = json.loads(line)
+
+            solution.setdefault(label['file'], (label, hashlib.sha1(line).hexdigest()))
+
+    else:
+        for path in sol_paths:
+
+            digest, file = cache.describe(path)
+
+            solution.setdefault(file, (path, digest))
+
+    results = []
+    pending = []
+
+    for ref in reference_labels(reference_dir):
+
+        file = ref['file']
+
+        if file not in solution:
+            raise Exception('Missing solution label for file ' + file)
+
+        sol_path, sol_digest = solution[file]
+
+        ref_digest = label_digest(ref)
+
+        result = cache.get(sol_digest, ref_digest, file)
+
+        if result is None:
+            pending.append((sol_path, ref, sol_digest, ref_digest))
+        else:
+            results.append(result)
+
+    graded = map_chunks(grade_label_files, [(sol_path, ref) for sol_path, ref, _, _ in pending], executor)
+
+    for (_, _, sol_digest, ref_digest), result in zip(pending, graded):
+
+        cache.put(sol_digest, ref_digest, result)
+
+        results.append(result)
+
+    cache.save()
+
+    results.sort(key=lambda result: result.file)
+
+    return results
+
+def grade_solution_dir(solution_dir : Path, reference_dir : Path, jobs=1, cache_dir : Path = None):
+
+    executor = make_executor(jobs)
+
+    cache = GradeCache(cache_dir) if cache_dir is not None else None
+
+    try:
+        return summarize(grade_solution_dir_files(solution_dir, reference_dir, executor, cache))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
 
 if __name__ == '__main__':
 
-    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Grade a solution against the reference labels of a dataset.')
+    parser.add_argument('solution', type=Path, help='solution directory, .jsonl file or directory of .jsonl shards')
+    parser.add_argument('reference', type=Path, help='dataset directory with reference labels')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--cache', type=Path, default=None, metavar='DIR', help='directory to cache per-file results in, only changed files are graded again')
+    parser.add_argument('--metrics', type=Path, default=None, metavar='DIR', help='write precision, recall, F1 and AP per file and camera as CSV to this directory')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS, help='IoU thresholds of the metrics')
+    parser.add_argument('--timings', type=int, nargs='?', const=10, default=0, metavar='N', help='print the N files that took longest to grade')
+
+    args = parser.parse_args()
+
+    executor = make_executor(args.jobs)
+
+    try:
+        start = time.perf_counter()
+
+        cache = GradeCache(args.cache) if args.cache is not None else None
+
+        results = grade_solution_dir_files(args.solution, args.reference, executor, cache)
+
+        elapsed = time.perf_counter() - start
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    score, sol_count, ref_count = summarize(results)
+
+    if args.timings > 0:
+
+        print(f"Graded {len(results)} files in {elapsed:.2f} s")
+
+        for result in sorted(results, key=lambda result: result.seconds, reverse=True)[:args.timings]:
+            print(f"{result.seconds * 1e3:10.3f} ms  {result.file} ({result.sol_count} solution, {result.ref_count} reference boxes)")
+
+    if args.metrics is not None:
+
+        write_metrics(results, args.metrics, args.thresholds)
 
-    score, sol_count, ref_count = grade_solution_dir(Path(sys.argv[1]), Path(sys.argv[2]))
+        for camera, metrics in sorted(grouped_metrics(results, [camera_of(result.file) for result in results], args.thresholds).items()):
+            print(f"{camera}: score {metrics['score']:.4f}, mAP {metrics['mAP']:.4f}")
 
     print("Labels in solution: ", sol_count)
     print("Labels in reference: ", ref_count)
@@ -1,12 +1,10 @@
 #!/bin/env python
 
-import json
+import warnings
 
 import numpy as np
 
-from PIL import ImageDraw
-
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QWidget, QFrame, QVBoxLayout, QAction, QSlider
 
 from pyvistaqt import QtInteractor, MainWindow
@@ -14,9 +12,10 @@ from pyvistaqt import QtInteractor, MainWindow
 import pyvista as pv
 import pyvistaqt as pvqt
 
-from metralabs.data import DataFolder, DataQuery, TimeRange
+from metralabs.data import DataFolder, DataQuery, TimeRange, row_indices
 from metralabs.message import MessageMeta, MessageType
-from metralabs.camera import Camera
+from metralabs.textures import TextureCache, mip_level
+from metralabs.visualization import ActorPool, ImageVisualization, PointCloudVisualization, distribute_points, screen_height, visualization_type
 
 class PickSlider(QSlider):
     '''
@@ -40,93 +39,78 @@ class PickSlider(QSlider):
 
         return self.elements_[self.value()]
 
-class MessageVisualization:
-
-    def __init__(self, plotter, meta : MessageMeta, data_folder : DataFolder):
-        
-        self.plotter_ = plotter
-        self.meta_ = meta
-        self.data_folder_ = data_folder
-
-        self.actors_ = [self.plotter_.add_mesh(**kwargs) for kwargs in self.create_polydata()]
-
-    def create_polydata(self):
-        return []
-
-    def __del__(self):
-        for actor in self.actors_:
-            self.plotter_.remove_actor(actor)
-
-class ImageVisualization(MessageVisualization):
-
-    def __init__(self, plotter, meta : MessageMeta, data_folder : DataFolder, label):
-
-        self.boxes_ = [] if label is None else label['boxes']
-
-        MessageVisualization.__init__(self, plotter, meta, data_folder)
-
-
-    def create_polydata(self):
-
-        image = self.data_folder_.load_image(self.meta_.file_path())
-
-        draw = ImageDraw.Draw(image)
-
-        for box in self.boxes_:
-            draw.rectangle(box, width=7, outline='red', fill=None)
+class LoaderSignals(QObject):
+    '''
+    Signals of LoadTasks, delivered to the thread of the window.
+    '''
+    # row, generation, payload
+    loaded = pyqtSignal(int, int, object)
+    # row, generation, error message
+    failed = pyqtSignal(int, int, str)
 
-        texture = pv.numpy_to_texture(np.array(image))
+class LoadTask(QRunnable):
+    '''
+    Prepares the payload of a visualization in a worker thread.
+    Skipped if the request became stale (i.e. the row is no longer pending for this generation) before it started.
+    '''
 
-        pose = self.meta_.pose()
-        
-        # project the image onto the shelf
-        # the y coordinate of the camera position is the distance from the shelf
-        dist = pose.trans_[1] + 0.1
+    def __init__(self, signals : LoaderSignals, pending : dict, row : int, generation : int, visualization, meta : MessageMeta, data_folder : DataFolder, label, options : dict = None):
 
-        camera = Camera(self.meta_)
+        QRunnable.__init__(self)
 
-        texture_coordinates = [
-            (0,0), (1,1), (1,0), (0,1),
-        ]
+        self.signals_ = signals
+        self.pending_ = pending
+        self.row_ = row
+        self.generation_ = generation
+        self.visualization_ = visualization
+        self.meta_ = meta
+        self.data_folder_ = data_folder
+        self.label_ = label
+        # additional keyword arguments of prepare(...)
+        self.options_ = {} if options is None else options
 
-        points = [
-            camera.get_world_position(x,y, dist) for x,y in texture_coordinates
-        ]
+    def run(self):
 
-        plane = pv.PolyData(points, faces=[4,0,2,1,3])
+        if self.pending_.get(self.row_) != self.generation_:
+            return
 
-        plane.active_texture_coordinates = np.array([(u, 1.0 - v) for u,v in texture_coordinates])
+        try:
+            payload = self.visualization_.prepare(self.meta_, self.data_folder_, self.label_, **self.options_)
+        except Exception as e:
+            self.signals_.failed.emit(self.row_, self.generation_, f'{self.meta_.file_path_str()}: {type(e).__name__}: {e}')
+            return
 
-        yield dict(
-            mesh=plane,
-            texture=texture,
-            opacity=0.85
-        )
+        self.signals_.loaded.emit(self.row_, self.generation_, payload)
 
+class PlotWindow(MainWindow):
 
+    def __init__(self, data : DataFolder):
+        super().__init__()
 
-class PointCloudVisualization(MessageVisualization):
+        self.data_ = data
 
-    def create_polydata(self):
+        self.labels_ = data.label_store()
 
-        pc = self.data_folder_.load_pcd(self.meta_.file_path())
+        # row of the message -> visualizer
+        self.visualizers_ = {}
 
-        yield dict(
-            mesh=pc,
-            point_size=1,
-            render_points_as_spheres=True
-        )
+        # rows currently visualized or being loaded
+        self.visible_ = np.zeros(0, dtype=np.int64)
 
-class PlotWindow(MainWindow):
+        # row -> generation of the pending load request, requests of other generations are stale
+        self.pending_ = {}
+        self.generation_ = 0
 
-    def __init__(self, data : DataFolder):
-        super().__init__()
+        self.threads_ = QThreadPool()
 
-        self.data_ = data
+        self.signals_ = LoaderSignals()
+        self.signals_.loaded.connect(self.on_loaded)
+        self.signals_.failed.connect(self.on_failed)
 
-        self.labels_ = [json.load(open(label_path, 'rb')) for label_path in data.path_.glob('**/*_label.json')]
+        self.picked_time_ = 0
 
-        self.visualizers_ = []
+        # box-annotated images by mip level, shared by the worker threads
+        self.textures_ = TextureCache(max_bytes=512 * 2**20)
 
         self.setWindowTitle("Shelf Scanning Inspector")
         self.resize(1200, 900)
@@ -137,6 +121,24 @@ class PlotWindow(MainWindow):
 
         # add the pyvista interactor object
         self.plotter_ = QtInteractor(self.frame_)
+
+        self.pool_ = ActorPool(self.plotter_)
+
+        self.render_timer_ = QTimer(self)
+        self.render_timer_.setSingleShot(True)
+        self.render_timer_.setInterval(15)
+        self.render_timer_.timeout.connect(self.plotter_.render)
+
+        # maximum number of points shown in total, distributed over the visible point clouds
+        self.point_budget_ = 2000000
+
+        self.lod_timer_ = QTimer(self)
+        self.lod_timer_.setSingleShot(True)
+        self.lod_timer_.setInterval(100)
+        self.lod_timer_.timeout.connect(self.update_lod)
+
+        # refine or coarsen point clouds after zooming or moving the camera
+        self.plotter_.iren.add_observer('EndInteractionEvent', lambda *args: self.request_lod())
         
         layout.addWidget(self.plotter_.interactor)
         self.signal_close.connect(self.plotter_.close)
@@ -146,7 +148,8 @@ class PlotWindow(MainWindow):
 
         # time slider 
         self.slider_ = PickSlider(self.data_.meta_)
-        self.slider_.setTracking(False)
+        # loading does not block the UI, so the view can follow the slider while dragging
+        self.slider_.setTracking(True)
 
         self.slider_.valueChanged.connect(self.on_slider_changed)
 
@@ -165,39 +168,168 @@ class PlotWindow(MainWindow):
         Returns the active visualizer for the metadata.
         Returns None if the data is currently not being visualized.
         '''
-        gen = (vis for vis in self.visualizers_ if vis.meta_ == meta)
-        return next(gen, None)
+        vis = self.visualizers_.get(meta.index_)
+
+        return vis if vis is not None and vis.meta_ == meta else None
 
-    def create_visualizer(self, meta : MessageMeta):
+    def create_visualizer(self, meta : MessageMeta, payload=None):
 
         if meta.type() == MessageType.POINT_CLOUD:
-            return PointCloudVisualization(self.plotter_, meta, self.data_)
+            return PointCloudVisualization(self.plotter_, meta, self.data_, self.pool_, payload)
         else:
-            label = next((label for label in self.labels_ if label['file'] == meta.file_path_str()), None)
+            label = self.labels_.label(meta.file_path_str())
 
-            return ImageVisualization(self.plotter_, meta, self.data_, label)
+            return ImageVisualization(self.plotter_, meta, self.data_, label, self.pool_, payload)
 
     def update_query(self):
 
         picked_element : MessageMeta = self.slider_.get_element()
 
+        self.picked_time_ = picked_element.time()
+
         self.query_ = TimeRange(picked_element.time() - self.time_range_//2, picked_element.time() + self.time_range_//2)
         
         self.update_messages()
 
     def update_messages(self):
+        '''
+        Updates the visualized messages to the result of the query.
 
-        result = self.query_.run(self.data_.meta_)
-        
-        visualizers = []
+        Only messages entering or leaving the result are touched. Entering messages are loaded in
+        worker threads, closest to the picked time first, and shown as soon as they are ready.
+        Requests for messages that left the result in the meantime are dropped.
+        '''
+        store = self.data_.store()
+
+        self.generation_ += 1
+
+        # rows of the time range are found by binary search
+        visible = row_indices(self.query_.select(store))
+
+        leaving = np.setdiff1d(self.visible_, visible, assume_unique=True)
+        entering = np.setdiff1d(visible, self.visible_, assume_unique=True)
+
+        # release first, so entering messages can reuse the actors
+        for row in leaving.tolist():
+
+            vis = self.visualizers_.pop(row, None)
+
+            if vis is not None:
+                vis.release()
+
+            self.pending_.pop(row, None)
+
+        # points of clouds that left are available to the remaining ones
+        if len(leaving) > 0:
+            self.request_lod()
+
+        entering = entering[np.argsort(np.abs(store.time_[entering] - self.picked_time_), kind='stable')]
+
+        for row in entering.tolist():
+            self.request_load(row)
+
+        self.visible_ = visible
+
+        self.request_render()
+
+    def screen_height(self, corners : np.ndarray) -> float:
+
+        return screen_height(corners, self.plotter_.camera, self.plotter_.window_size[1])
+
+    def request_load(self, row : int):
+        '''
+        Loads the data of the message at row in a worker thread, see on_loaded(...).
+        '''
+        store = self.data_.store()
+
+        meta = store[row]
+
+        label = None
+        options = {}
+
+        visualization = visualization_type(meta)
+
+        if visualization is ImageVisualization:
+
+            label = self.labels_.label(meta.file_path_str())
+
+            options = dict(textures=self.textures_, screen_height=self.screen_height(ImageVisualization.corners(meta)))
+
+        self.pending_[row] = self.generation_
+
+        self.threads_.start(LoadTask(self.signals_, self.pending_, row, self.generation_, visualization, meta, self.data_, label, options))
+
+    def on_loaded(self, row : int, generation : int, payload):
+
+        if self.pending_.get(row) != generation:
+            return
+
+        del self.pending_[row]
+
+        # a finer texture of a visualized image
+        if row in self.visualizers_:
+
+            self.visualizers_[row].update(payload)
+
+            self.request_render()
+
+            return
+
+        vis = self.create_visualizer(self.data_.store()[row], payload)
+
+        self.visualizers_[row] = vis
+
+        if isinstance(vis, PointCloudVisualization):
+            self.request_lod()
+
+        self.request_render()
+
+    def on_failed(self, row : int, generation : int, message : str):
+
+        if self.pending_.get(row) == generation:
+            del self.pending_[row]
+
+        warnings.warn(f'Failed to load row {row}, {message}')
+
+    def request_render(self):
+        '''
+        Renders once after the current batch of events, instead of once per loaded message.
+        '''
+        if not self.render_timer_.isActive():
+            self.render_timer_.start()
+
+    def request_lod(self):
+
+        if not self.lod_timer_.isActive():
+            self.lod_timer_.start()
+
+    def update_lod(self):
+        '''
+        Distributes the point budget over the visible point clouds, giving clouds closer to the camera more points.
+        Requests finer textures for images that became larger on screen.
+        '''
+        for row, vis in self.visualizers_.items():
+
+            if not isinstance(vis, ImageVisualization) or row in self.pending_:
+                continue
+
+            height = self.textures_.image_height(vis.meta_.file_path_str())
+
+            if height is not None and mip_level(height, self.screen_height(vis.corners_), self.textures_.max_level_) < vis.level_:
+                self.request_load(row)
+
+        clouds = [vis for vis in self.visualizers_.values() if isinstance(vis, PointCloudVisualization)]
+
+        if distribute_points(clouds, self.plotter_.camera.position, self.point_budget_):
+            self.request_render()
+
+    def closeEvent(self, event):
 
-        for meta in result:
-            
-            vis = self.get_visualizer(meta)
-            
-            visualizers.append(vis if vis is not None else self.create_visualizer(meta))
+        self.pending_.clear()
+        self.threads_.clear()
+        self.threads_.waitForDone()
 
-        self.visualizers_ = visualizers
+        super().closeEvent(event)
 
 
 
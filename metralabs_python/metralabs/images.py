@@ -0,0 +1,184 @@
+import io
+
+import os
+
+import tempfile
+
+from typing import NamedTuple
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import numpy as np
+
+from PIL import Image
+
+class ByteRange(NamedTuple):
+    '''
+    Image stored within a larger file, e.g. a shard of a packed dataset.
+    If `shape` is set, the range holds a raw array of that shape and `dtype` instead of an encoded image.
+    '''
+    path : str
+    offset : int
+    length : int
+    shape : tuple = None
+    dtype : str = None
+
+def open_image(source) -> Image.Image:
+    '''
+    Opens an image from a path, file object or ByteRange.
+    '''
+    if not isinstance(source, ByteRange):
+        return Image.open(source)
+
+    if source.shape is not None:
+        array = np.fromfile(source.path, dtype=source.dtype, count=int(np.prod(source.shape)), offset=source.offset)
+        return Image.fromarray(array.reshape(source.shape))
+
+    with open(source.path, 'rb') as f:
+        f.seek(source.offset)
+        return Image.open(io.BytesIO(f.read(source.length)))
+
+def decode_image(source, mode='RGB', size=None) -> np.ndarray:
+    '''
+    Decodes an image (path, file object or ByteRange) into an (H,W,C) uint8 array.
+
+    :param mode: PIL mode to convert to.
+    :param size: Optional (width, height) to downscale/resize to. Uses draft mode (JPEG) and
+                 integer reduction before resizing to avoid work at full resolution.
+    '''
+    with open_image(source) as image:
+
+        if size is not None and image.size != tuple(size):
+
+            image.draft(mode, tuple(size))
+
+            factor = min(image.width // size[0], image.height // size[1])
+
+            if factor >= 2:
+                image = image.reduce(factor)
+
+            if image.size != tuple(size):
+                image = image.resize(tuple(size), Image.BILINEAR)
+
+        if image.mode != mode:
+            image = image.convert(mode)
+
+        array = np.asarray(image)
+
+    return array.reshape(array.shape[0], array.shape[1], -1)
+
+def decode_images_into(buffer_path : str, offset : int, shape, items, mode, size):
+    '''
+    Decodes the images of items [(index, source), ...] into the memory-mapped (B,H,W,C) buffer.
+    Used by worker processes of load_images(...).
+    '''
+    out = np.memmap(buffer_path, dtype=np.uint8, mode='r+', offset=offset, shape=tuple(shape))
+
+    for index, source in items:
+        out[index] = decode_image(source, mode, size)
+
+    del out
+
+def shared_buffer_dir():
+    '''
+    Directory for temporary buffers shared with worker processes. Prefers memory-backed storage.
+    '''
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+def load_images(paths, size=None, mode='RGB', normalize=False, out=None, workers=None, executor : Executor = None) -> np.ndarray:
+    '''
+    Decodes a batch of images into one contiguous (B,H,W,C) uint8 array using a process pool.
+
+    Workers write directly into shared memory: either `out` if it is a np.memmap, or a temporary
+    memory-mapped buffer which is returned (or copied into a regular `out` array).
+
+    :param paths:       Image files or ByteRanges.
+    :param size:        (width, height) of the result. Defaults to the size of the first image; all other images are resized to it.
+    :param mode:        PIL mode, defines the number of channels C.
+    :param normalize:   Return float32 values in [0,1] instead of uint8.
+    :param out:         Preallocated (B,H,W,C) uint8 array to write into.
+    :param workers:     Number of worker processes. Defaults to the number of CPUs. Decodes in the calling process if <= 1.
+    :param executor:    Existing executor to use instead of creating a process pool.
+    '''
+    paths = [p if isinstance(p, ByteRange) else str(p) for p in paths]
+
+    if size is None:
+
+        if out is not None:
+            size = (out.shape[2], out.shape[1])
+        elif len(paths) > 0:
+            with open_image(paths[0]) as image:
+                size = image.size
+        else:
+            size = (0, 0)
+
+    size = tuple(int(v) for v in size)
+
+    shape = (len(paths), size[1], size[0], Image.getmodebands(mode))
+
+    if out is not None and (out.shape != shape or out.dtype != np.uint8):
+        raise ValueError(f'`out` must be a uint8 array of shape {shape}.')
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if len(paths) == 0 or (executor is None and (workers <= 1 or len(paths) == 1)):
+
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+
+        for i, path in enumerate(paths):
+            out[i] = decode_image(path, mode, size)
+
+    elif isinstance(out, np.memmap) and out.filename is not None:
+
+        run_decode_tasks(out, paths, mode, size, workers, executor)
+
+    else:
+        tmp = tempfile.NamedTemporaryFile(prefix='metralabs_images_', dir=shared_buffer_dir(), delete=False)
+        tmp.close()
+
+        try:
+            buffer = np.memmap(tmp.name, dtype=np.uint8, mode='w+', shape=shape)
+
+            run_decode_tasks(buffer, paths, mode, size, workers, executor)
+
+        finally:
+            # the mapping stays valid after the file is removed
+            os.unlink(tmp.name)
+
+        if out is None:
+            out = buffer
+        else:
+            out[...] = buffer
+
+    if normalize:
+        return out.astype(np.float32) / np.float32(255)
+
+    return out
+
+def run_decode_tasks(buffer : np.memmap, paths, mode, size, workers, executor):
+
+    items = list(enumerate(paths))
+
+    n_tasks = max(1, min(len(items), 4 * workers))
+
+    chunks = [items[i::n_tasks] for i in range(n_tasks)]
+
+    own_executor = executor is None
+
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        futures = [
+            executor.submit(decode_images_into, buffer.filename, buffer.offset, buffer.shape, chunk, mode, size)
+            for chunk in chunks
+        ]
+
+        for future in futures:
+            future.result()
+
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,253 @@
+import os
+
+import json
+
+import warnings
+
+import tempfile
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.message import MessageType, MESSAGE_TYPES, MetaStore
+
+# Hidden directory within the dataset root holding derived data (indexes, caches).
+INDEX_DIR = '.metralabs'
+
+META_SUFFIX = '_meta.json'
+
+def scan_meta_files(root : Path):
+    '''
+    Recursively lists all meta files below root.
+    Returns a list of (path relative to root, mtime in ns, size in bytes).
+    '''
+    return scan_files(root, META_SUFFIX)
+
+def scan_files(root : Path, suffix : str):
+    '''
+    Recursively lists all files below root whose name ends with suffix (or one of a tuple of suffixes), skipping INDEX_DIR.
+    Returns a list of (path relative to root, mtime in ns, size in bytes).
+    '''
+    found = []
+
+    stack = [root]
+
+    while stack:
+
+        directory = stack.pop()
+
+        with os.scandir(directory) as it:
+            for entry in it:
+
+                if entry.is_dir(follow_symlinks=True):
+                    if entry.name != INDEX_DIR:
+                        stack.append(entry.path)
+
+                elif entry.name.endswith(suffix):
+                    stat = entry.stat()
+                    found.append((os.path.relpath(entry.path, root), stat.st_mtime_ns, stat.st_size))
+
+    return found
+
+def parse_meta(data : dict):
+    '''
+    Extracts the indexed columns from the contents of a meta file.
+    Returns (time, type code, pose (x,y,z,roll,pitch,yaw), file).
+    '''
+    pose = data['Pose']
+
+    return (
+        int(data['Time']),
+        MESSAGE_TYPES.index(MessageType[data['Type']]),
+        (pose['X'], pose['Y'], pose['Z'], pose['Roll'], pose['Pitch'], pose['Yaw']),
+        data['File']
+    )
+
+def save_npz(path : Path, **arrays):
+    '''
+    Atomically writes arrays to an .npz file, creating its directory if necessary.
+    Failing to do so (e.g. read-only dataset) only results in a warning since the file can be recreated at any time.
+    '''
+    path = Path(path)
+    tmp_path = None
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # unique temporary file, the same file may be written by several threads at once
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + '.', suffix='.tmp', delete=False) as f:
+            tmp_path = Path(f.name)
+            np.savez(f, **arrays)
+
+        os.replace(tmp_path, path)
+
+    except OSError as e:
+        warnings.warn(f'Could not write {path}: {e}')
+
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+class MetaIndex:
+    '''
+    Persistent index over the `*_meta.json` files of a dataset.
+
+    The index is stored in `<dataset>/.metralabs/meta_index.npz` and contains one
+    row per message, sorted by time. On open, only meta files that were added,
+    removed, or whose mtime/size changed are parsed again.
+    '''
+
+    VERSION = 1
+
+    FILE_NAME = 'meta_index.npz'
+
+    # name -> (dtype, trailing shape)
+    COLUMNS = dict(
+        time=(np.int64, ()),
+        type=(np.uint8, ()),
+        pose=(np.float64, (6,)),
+        file_path=(np.str_, ()),
+        source=(np.str_, ()),
+        mtime=(np.int64, ()),
+        size=(np.int64, ()),
+    )
+
+    def __init__(self, root : Path, columns : dict = None):
+
+        self.root_ = Path(root)
+
+        if columns is None:
+            columns = { name: np.zeros((0, *shape), dtype=dtype) for name,(dtype,shape) in MetaIndex.COLUMNS.items() }
+
+        self.columns_ = columns
+
+    @staticmethod
+    def open(root, rebuild=False, save=True) -> 'MetaIndex':
+        '''
+        Loads the index of the dataset at root and brings it up to date.
+
+        :param rebuild: Ignore any existing index and parse all meta files.
+        :param save:    Write the index back to disk if it changed.
+        '''
+        root = Path(root)
+
+        index = None if rebuild else MetaIndex.load(root)
+
+        if index is None:
+            index = MetaIndex(root)
+
+        changed = index.refresh() or rebuild
+
+        if changed and save:
+            index.save()
+
+        return index
+
+    def path(self) -> Path:
+
+        return self.root_.joinpath(INDEX_DIR, MetaIndex.FILE_NAME)
+
+    @staticmethod
+    def load(root):
+        '''
+        Loads the index from disk without refreshing it.
+        Returns None if there is no (compatible) index.
+        '''
+        index = MetaIndex(root)
+
+        try:
+            with np.load(index.path(), allow_pickle=False) as npz:
+
+                if int(npz['version']) != MetaIndex.VERSION:
+                    return None
+
+                if list(npz['types']) != [t.name for t in MESSAGE_TYPES]:
+                    return None
+
+                index.columns_ = { name: npz[name] for name in MetaIndex.COLUMNS }
+
+        except (OSError, KeyError, ValueError):
+            return None
+
+        return index
+
+    def save(self):
+        '''
+        Writes the index to disk. Failing to do so (e.g. read-only dataset) is not an error.
+        '''
+        save_npz(
+            self.path(),
+            version=MetaIndex.VERSION,
+            types=np.array([t.name for t in MESSAGE_TYPES]),
+            **self.columns_
+        )
+
+    def refresh(self) -> bool:
+        '''
+        Synchronizes the index with the meta files on disk.
+        Returns True if anything changed.
+        '''
+        scanned = scan_meta_files(self.root_)
+
+        old_rows = { source: i for i,source in enumerate(self.columns_['source'].tolist()) }
+
+        mtime = self.columns_['mtime']
+        size = self.columns_['size']
+
+        keep = []
+        parse = []
+
+        for entry in scanned:
+
+            source, entry_mtime, entry_size = entry
+
+            row = old_rows.get(source)
+
+            if row is not None and mtime[row] == entry_mtime and size[row] == entry_size:
+                keep.append(row)
+            else:
+                parse.append(entry)
+
+        if len(parse) == 0 and len(keep) == len(old_rows):
+            return False
+
+        parsed = []
+
+        for source, entry_mtime, entry_size in parse:
+
+            with open(self.root_.joinpath(source), 'rb') as f:
+                parsed.append((*parse_meta(json.load(f)), source, entry_mtime, entry_size))
+
+        columns = { name: values[keep] for name,values in self.columns_.items() }
+
+        if len(parsed) > 0:
+
+            new_columns = zip(*parsed)
+
+            for name,values in zip(('time', 'type', 'pose', 'file_path', 'source', 'mtime', 'size'), new_columns):
+
+                dtype, shape = MetaIndex.COLUMNS[name]
+
+                columns[name] = np.concatenate((columns[name], np.array(values, dtype=dtype).reshape(-1, *shape)))
+
+        order = MetaStore.sort_order(columns['time'], columns['file_path'])
+
+        self.columns_ = { name: values[order] for name,values in columns.items() }
+
+        return True
+
+    def __len__(self):
+
+        return len(self.columns_['time'])
+
+    def store(self) -> MetaStore:
+        '''
+        Returns the indexed messages as MetaStore, sorted by time.
+        '''
+        return MetaStore(
+            self.columns_['time'],
+            self.columns_['type'],
+            self.columns_['pose'],
+            self.columns_['file_path'].tolist()
+        )
@@ -0,0 +1,303 @@
+import os
+
+import json
+
+import warnings
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.index import INDEX_DIR, save_npz, scan_files
+
+LABEL_SUFFIX = '_label.json'
+
+def boxes_dtype(boxes : np.ndarray):
+    '''
+    int32 if all box coordinates are integral and fit into it, float64 otherwise.
+    '''
+    if len(boxes) == 0:
+        return np.int32
+
+    integral = np.all(np.round(boxes) == boxes) and np.abs(boxes).max() < 2**31
+
+    return np.int32 if integral else np.float64
+
+def parse_boxes(boxes) -> np.ndarray:
+
+    return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+class LabelStore:
+    '''
+    Boxes of all labels of a dataset in one (total boxes,4) array, with an offset table per labeled file.
+
+    Boxes are int32 (float64 if any coordinate is not integral). Looking up the boxes of a file is a
+    dict lookup plus a slice, no JSON is parsed. Stores opened from a dataset are persisted in
+    `<dataset>/.metralabs` with the boxes memory-mapped, and only label files that changed since
+    the last run are parsed again (see refresh()).
+    '''
+
+    VERSION = 1
+
+    FILE_NAME = 'labels.npz'
+
+    BOXES_FILE_NAME = 'label_boxes.npy'
+
+    # name -> dtype of the per-file columns
+    COLUMNS = dict(
+        file_path=np.str_,
+        source=np.str_,
+        mtime=np.int64,
+        size=np.int64,
+    )
+
+    def __init__(self, root : Path = None, columns : dict = None, offset : np.ndarray = None, boxes : np.ndarray = None):
+
+        self.root_ = Path(root) if root is not None else None
+
+        if columns is None:
+            columns = { name: np.zeros(0, dtype=dtype) for name,dtype in LabelStore.COLUMNS.items() }
+            offset = np.zeros(1, dtype=np.int64)
+            boxes = np.zeros((0, 4), dtype=np.int32)
+
+        self.columns_ = columns
+        self.offset_ = offset
+        self.boxes_ = boxes
+
+        # file -> row, built on first lookup
+        self.rows_ = None
+
+    @staticmethod
+    def from_labels(labels) -> 'LabelStore':
+        '''
+        Creates a store (not backed by files) from label dicts with `file` and `boxes`.
+        '''
+        files = []
+        parsed = []
+
+        for label in labels:
+            files.append(label['file'])
+            parsed.append(parse_boxes(label['boxes']))
+
+        store = LabelStore()
+
+        store.set_rows(files, [''] * len(files), [0] * len(files), [0] * len(files), parsed)
+
+        return store
+
+    @staticmethod
+    def open(root, rebuild=False, save=True) -> 'LabelStore':
+        '''
+        Loads the label store of the dataset at root and brings it up to date.
+
+        :param rebuild: Ignore any existing store and parse all label files.
+        :param save:    Write the store back to disk if it changed.
+        '''
+        root = Path(root)
+
+        store = None if rebuild else LabelStore.load(root)
+
+        if store is None:
+            store = LabelStore(root)
+
+        changed = store.refresh() or rebuild
+
+        if changed and save:
+            store.save()
+
+        return store
+
+    def path(self) -> Path:
+
+        return self.root_.joinpath(INDEX_DIR, LabelStore.FILE_NAME)
+
+    def boxes_path(self) -> Path:
+
+        return self.root_.joinpath(INDEX_DIR, LabelStore.BOXES_FILE_NAME)
+
+    @staticmethod
+    def load(root):
+        '''
+        Loads the store from disk without refreshing it, with the boxes memory-mapped.
+        Returns None if there is no (compatible) store.
+        '''
+        store = LabelStore(root)
+
+        try:
+            with np.load(store.path(), allow_pickle=False) as npz:
+
+                if int(npz['version']) != LabelStore.VERSION:
+                    return None
+
+                columns = { name: npz[name] for name in LabelStore.COLUMNS }
+                offset = npz['offset']
+
+            boxes = np.load(store.boxes_path(), mmap_mode='r', allow_pickle=False)
+
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # the boxes may have been written by another run than the table
+        if boxes.ndim != 2 or boxes.shape[1] != 4 or len(boxes) != offset[-1]:
+            return None
+
+        store.columns_ = columns
+        store.offset_ = offset
+        store.boxes_ = boxes
+
+        return store
+
+    def save(self):
+        '''
+        Writes the store to disk. Failing to do so (e.g. read-only dataset) is not an error.
+        '''
+        boxes_path = self.boxes_path()
+        tmp_path = boxes_path.with_name(boxes_path.name + '.tmp')
+
+        try:
+            boxes_path.parent.mkdir(parents=True, exist_ok=True)
+
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(self.boxes_))
+
+            os.replace(tmp_path, boxes_path)
+
+        except OSError as e:
+            warnings.warn(f'Could not write {boxes_path}: {e}')
+            return
+
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        save_npz(
+            self.path(),
+            version=LabelStore.VERSION,
+            offset=self.offset_,
+            **self.columns_
+        )
+
+    def refresh(self) -> bool:
+        '''
+        Synchronizes the store with the label files on disk, parsing only files that were added or changed.
+        Returns True if anything changed.
+        '''
+        scanned = scan_files(self.root_, LABEL_SUFFIX)
+
+        old_rows = { source: i for i,source in enumerate(self.columns_['source'].tolist()) }
+
+        mtime = self.columns_['mtime']
+        size = self.columns_['size']
+
+        keep = []
+        parse = []
+
+        for entry in scanned:
+
+            source, entry_mtime, entry_size = entry
+
+            row = old_rows.get(source)
+
+            if row is not None and mtime[row] == entry_mtime and size[row] == entry_size:
+                keep.append(row)
+            else:
+                parse.append(entry)
+
+        if len(parse) == 0 and len(keep) == len(old_rows):
+            return False
+
+        files = self.columns_['file_path'][keep].tolist()
+        sources = self.columns_['source'][keep].tolist()
+        mtimes = mtime[keep].tolist()
+        sizes = size[keep].tolist()
+        boxes = [self.boxes_[self.offset_[row]:self.offset_[row + 1]] for row in keep]
+
+        for source, entry_mtime, entry_size in parse:
+
+            with open(self.root_.joinpath(source), 'rb') as f:
+                label = json.load(f)
+
+            files.append(label['file'])
+            sources.append(source)
+            mtimes.append(entry_mtime)
+            sizes.append(entry_size)
+            boxes.append(parse_boxes(label['boxes']))
+
+        self.set_rows(files, sources, mtimes, sizes, boxes)
+
+        return True
+
+    def set_rows(self, files, sources, mtimes, sizes, boxes):
+        '''
+        Replaces the contents of the store, sorting the rows by (file, source).
+        '''
+        files = np.array(files, dtype=np.str_)
+        sources = np.array(sources, dtype=np.str_)
+
+        order = np.lexsort((sources, files))
+
+        counts = np.array([len(b) for b in boxes], dtype=np.int64)[order]
+
+        all_boxes = np.concatenate([np.zeros((0, 4))] + [boxes[i] for i in order.tolist()])
+
+        self.columns_ = dict(
+            file_path=files[order],
+            source=sources[order],
+            mtime=np.array(mtimes, dtype=np.int64)[order],
+            size=np.array(sizes, dtype=np.int64)[order],
+        )
+
+        self.offset_ = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.boxes_ = all_boxes.astype(boxes_dtype(all_boxes))
+
+        self.rows_ = None
+
+    def __len__(self):
+
+        return len(self.columns_['file_path'])
+
+    def __contains__(self, file : str):
+
+        return self.row(file) is not None
+
+    def __iter__(self):
+        '''
+        Yields all labels as dicts with `file` and `boxes`.
+        '''
+        for row, file in enumerate(self.columns_['file_path'].tolist()):
+            yield dict(file=file, boxes=self.boxes_[self.offset_[row]:self.offset_[row + 1]].tolist())
+
+    def files(self) -> list:
+
+        return self.columns_['file_path'].tolist()
+
+    def row(self, file : str):
+        '''
+        Row of the file or None if it is not labeled. If a file has multiple labels, the first one (by source path) is used.
+        '''
+        if self.rows_ is None:
+
+            self.rows_ = {}
+
+            for row, name in enumerate(self.columns_['file_path'].tolist()):
+                self.rows_.setdefault(name, row)
+
+        return self.rows_.get(file)
+
+    def boxes(self, file : str) -> np.ndarray:
+        '''
+        (K,4) boxes of the file (read-only view) or None if it is not labeled.
+        '''
+        row = self.row(file)
+
+        if row is None:
+            return None
+
+        return self.boxes_[self.offset_[row]:self.offset_[row + 1]]
+
+    def label(self, file : str) -> dict:
+        '''
+        Label dict with `file` and `boxes` (as lists) of the file or None if it is not labeled.
+        '''
+        boxes = self.boxes(file)
+
+        return None if boxes is None else dict(file=file, boxes=boxes.tolist())
@@ -0,0 +1,157 @@
+import os
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.index import INDEX_DIR, save_npz
+
+def voxel_keys(points : np.ndarray, voxel_size : float) -> np.ndarray:
+    '''
+    One int64 key per point identifying its voxel of the given size.
+    '''
+    cells = np.floor(points / voxel_size).astype(np.int64)
+
+    if len(cells) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    cells -= cells.min(axis=0)
+
+    dims = cells.max(axis=0) + 1
+
+    if np.prod(dims.astype(np.float64)) < 2**62:
+        return np.ravel_multi_index(cells.T, dims)
+
+    return np.unique(cells, axis=0, return_inverse=True)[1].reshape(-1)
+
+class PointPyramid:
+    '''
+    Multi-resolution version of a point cloud for level-of-detail rendering.
+
+    Level `l` keeps one point per voxel of size `voxel_sizes_[l]`, halving the voxel size with each level;
+    the last level contains all points. Points are ordered such that every level is a prefix
+    of the point array, so any level is a view and no points are duplicated.
+    The representative of a voxel is picked by a fixed random rank, which makes the levels nested.
+    '''
+
+    VERSION = 1
+
+    def __init__(self, points : np.ndarray, counts : np.ndarray, voxel_sizes : np.ndarray):
+
+        self.points_ = points
+        self.counts_ = np.asarray(counts, dtype=np.int64)
+        self.voxel_sizes_ = np.asarray(voxel_sizes, dtype=np.float64)
+
+    @staticmethod
+    def build(points : np.ndarray, min_voxel_size=0.01, levels=8, seed=0) -> 'PointPyramid':
+        '''
+        :param points:          (N,3) points.
+        :param min_voxel_size:  Voxel size of the finest subsampled level in [m].
+        :param levels:          Number of subsampled levels, each with twice the voxel size of the next finer one.
+        '''
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+
+        # a fixed random order, the representative of a voxel is its first point in this order
+        points = points[np.random.default_rng(seed).permutation(len(points))]
+
+        voxel_sizes = min_voxel_size * 2.0**np.arange(levels - 1, -1, -1)
+
+        # coarsest level containing each point, `levels` for points only in the full cloud
+        level = np.full(len(points), levels, dtype=np.int64)
+
+        candidates = np.arange(len(points))
+
+        # from fine to coarse: the representatives of a voxel are among those of its sub-voxels
+        for l in range(levels - 1, -1, -1):
+
+            _, first = np.unique(voxel_keys(points[candidates], voxel_sizes[l]), return_index=True)
+
+            candidates = np.sort(candidates[first])
+
+            level[candidates] = l
+
+        order = np.argsort(level, kind='stable')
+
+        counts = np.searchsorted(level[order], np.arange(levels + 1), side='right')
+
+        return PointPyramid(points[order], counts, np.append(voxel_sizes, 0.0))
+
+    def __len__(self):
+        '''
+        Number of levels, including the full cloud.
+        '''
+        return len(self.counts_)
+
+    def level(self, l : int) -> np.ndarray:
+        '''
+        (N_l,3) points of level l as a view.
+        '''
+        return self.points_[:self.counts_[l]]
+
+    def level_for_budget(self, budget : int) -> int:
+        '''
+        Finest level with at most `budget` points (at least the coarsest level).
+        '''
+        return max(0, int(np.searchsorted(self.counts_, budget, side='right')) - 1)
+
+    def center(self) -> np.ndarray:
+
+        coarse = self.level(0)
+
+        return coarse.mean(axis=0) if len(coarse) > 0 else np.zeros(3, dtype=np.float32)
+
+    @staticmethod
+    def cache_path(data, file_path) -> Path:
+
+        return data.path_.joinpath(INDEX_DIR, 'lod', str(file_path) + '.npz')
+
+    @staticmethod
+    def source_stamp(data, file_path):
+        '''
+        (mtime in ns, size) of the file the point cloud is read from, to detect outdated cache entries.
+        '''
+        if data.packed_ is not None:
+            source = data.packed_.shard_path(int(data.packed_.columns_['shard'][data.packed_.row(file_path)]))
+        else:
+            source = data.resolve(file_path)
+
+        stat = os.stat(source)
+
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def open(data, file_path, min_voxel_size=0.01, levels=8, save=True) -> 'PointPyramid':
+        '''
+        Returns the pyramid of a point cloud of the DataFolder, built once and cached in `<dataset>/.metralabs/lod`.
+        '''
+        path = PointPyramid.cache_path(data, file_path)
+
+        stamp = PointPyramid.source_stamp(data, file_path)
+
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+
+                if (
+                    int(npz['version']) == PointPyramid.VERSION
+                    and tuple(npz['stamp'].tolist()) == stamp
+                    and np.isclose(float(npz['voxel_sizes'][-2]), min_voxel_size)
+                    and len(npz['counts']) == levels + 1
+                ):
+                    return PointPyramid(npz['points'], npz['counts'], npz['voxel_sizes'])
+
+        except (OSError, KeyError, ValueError, IndexError):
+            pass
+
+        pyramid = PointPyramid.build(data.load_pcd(file_path, raw=True), min_voxel_size, levels)
+
+        if save:
+            save_npz(
+                path,
+                version=PointPyramid.VERSION,
+                stamp=np.array(stamp, dtype=np.int64),
+                points=pyramid.points_,
+                counts=pyramid.counts_,
+                voxel_sizes=pyramid.voxel_sizes_
+            )
+
+        return pyramid
@@ -50,12 +50,57 @@ class MessageType(Enum):
     # Single-channel depth image. Pixel values correspond to depth values in mm.
     IMAGE_DEPTH = 'IMAGE_DEPTH'
 
+def euler_to_matrix(rpy, degrees=True) -> np.ndarray:
+    '''
+    Rotation matrices for extrinsic x-y-z (roll, pitch, yaw) euler angles, same convention as
+    `Rotation.from_euler('xyz', ...)`. Accepts (3,) or (N,3) angles, returns (3,3) or (N,3,3).
+    '''
+    rpy = np.asarray(rpy, dtype=np.float64)
+
+    if degrees:
+        rpy = np.deg2rad(rpy)
+
+    cr, cp, cy = np.cos(rpy).T
+    sr, sp, sy = np.sin(rpy).T
+
+    mat = np.empty(rpy.shape[:-1] + (3, 3))
+
+    mat[...,0,0] = cy * cp
+    mat[...,0,1] = cy * sp * sr - sy * cr
+    mat[...,0,2] = cy * sp * cr + sy * sr
+    mat[...,1,0] = sy * cp
+    mat[...,1,1] = sy * sp * sr + cy * cr
+    mat[...,1,2] = sy * sp * cr - cy * sr
+    mat[...,2,0] = -sp
+    mat[...,2,1] = cp * sr
+    mat[...,2,2] = cp * cr
+
+    return mat
+
+def poses_to_matrices(poses) -> np.ndarray:
+    '''
+    Homogeneous (N,4,4) matrices for (N,6) poses (x, y, z, roll, pitch, yaw) with angles in degrees.
+    '''
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, 6)
+
+    mat = np.zeros((len(poses), 4, 4))
+
+    mat[:,:3,:3] = euler_to_matrix(poses[:,3:])
+    mat[:,:3,3] = poses[:,:3]
+    mat[:,3,3] = 1
+
+    return mat
+
 class Transform:
+    '''
+    Rigid transformation, stored as homogeneous 4x4 matrix.
+    Transforms can be composed using `@`: `(a @ b).apply(v) == a.apply(b.apply(v))`.
+    '''
 
     def __init__(self, xyz, rpy=(0,0,0), rot=None):
 
-        self.trans_ = np.array(xyz)
-        
+        self.mat_ = np.identity(4)
+
         if rot is not None:
 
             if not isinstance(rot, Rotation):
@@ -64,48 +109,361 @@ class Transform:
             if rpy is not None:
                 raise Exception('Cannot use rpy and rot at the same time to construct Transform.')
 
-            self.rot_ = rot
+            self.mat_[:3,:3] = rot.as_matrix()
         else:
-            self.rot_ = Rotation.from_euler('xyz', rpy, degrees=True)
-        
+            self.mat_[:3,:3] = euler_to_matrix(rpy)
 
-    def apply(self, vec):
+        self.mat_[:3,3] = xyz
+
+        self.rot_cache_ = rot
 
-        return self.rot_.apply(vec) + self.trans_
+    @staticmethod
+    def from_matrix(mat) -> 'Transform':
+        '''
+        Creates a Transform from a homogeneous 4x4 matrix (not copied).
+        '''
+        transform = Transform.__new__(Transform)
+
+        transform.mat_ = np.asarray(mat, dtype=np.float64)
+        transform.rot_cache_ = None
+
+        return transform
+
+    @property
+    def trans_(self) -> np.ndarray:
+        '''
+        Translation (view into the matrix).
+        '''
+        return self.mat_[:3,3]
+
+    @property
+    def rot_(self) -> Rotation:
+        '''
+        Rotation as scipy Rotation, created on first access.
+        '''
+        if self.rot_cache_ is None:
+            self.rot_cache_ = Rotation.from_matrix(self.mat_[:3,:3])
+
+        return self.rot_cache_
+
+    def rotation(self) -> np.ndarray:
+        '''
+        3x3 rotation matrix (view into the matrix).
+        '''
+        return self.mat_[:3,:3]
+
+    def apply(self, vec):
+        '''
+        Transforms a (3,) vector or (N,3) array of vectors.
+        '''
+        return np.asarray(vec) @ self.mat_[:3,:3].T + self.mat_[:3,3]
 
     def matrix(self):
+        '''
+        Homogeneous 4x4 matrix. Do not modify it.
+        '''
+        return self.mat_
+
+    def inv(self):
+
+        rt = self.mat_[:3,:3].T
 
         mat = np.identity(4)
+        mat[:3,:3] = rt
+        mat[:3,3] = -rt @ self.mat_[:3,3]
 
-        mat[:3,:3] = self.rot_.as_matrix()
-        mat[0:3,2] = self.trans_
+        return Transform.from_matrix(mat)
 
-        return mat
+    def __matmul__(self, other):
 
-    def inv(self):
-        rt = self.rot_.inv()
+        if isinstance(other, Transform):
+            return Transform.from_matrix(self.mat_ @ other.mat_)
+
+        if isinstance(other, TransformArray):
+            return TransformArray(self.mat_ @ other.mat_)
+
+        return NotImplemented
+
+class TransformArray:
+    '''
+    Many rigid transformations stored as one (N,4,4) array, for vectorized operations over all messages.
+    Composition using `@` is element-wise, a single Transform is broadcast.
+    '''
+
+    def __init__(self, matrices):
+
+        self.mat_ = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
+    @staticmethod
+    def from_poses(poses) -> 'TransformArray':
+        '''
+        Creates transforms from (N,6) poses (x, y, z, roll, pitch, yaw) with angles in degrees.
+        '''
+        return TransformArray(poses_to_matrices(poses))
+
+    def __len__(self):
+
+        return len(self.mat_)
+
+    def __getitem__(self, i):
+
+        if isinstance(i, (int, np.integer)):
+            return Transform.from_matrix(self.mat_[i])
+
+        return TransformArray(self.mat_[i])
+
+    def matrices(self) -> np.ndarray:
+
+        return self.mat_
+
+    def translations(self) -> np.ndarray:
+
+        return self.mat_[:,:3,3]
+
+    def rotations(self) -> np.ndarray:
+
+        return self.mat_[:,:3,:3]
+
+    def apply(self, points) -> np.ndarray:
+        '''
+        Applies each transform to its own points: (N,3) -> (N,3) or (N,M,3) -> (N,M,3).
+        '''
+        points = np.asarray(points)
+
+        if points.ndim == 2:
+            return np.einsum('nij,nj->ni', self.mat_[:,:3,:3], points) + self.mat_[:,:3,3]
+
+        return np.einsum('nij,nmj->nmi', self.mat_[:,:3,:3], points) + self.mat_[:,None,:3,3]
+
+    def apply_all(self, points) -> np.ndarray:
+        '''
+        Applies every transform to the same (M,3) points. Returns (N,M,3).
+        '''
+        points = np.asarray(points)
+
+        return np.einsum('nij,mj->nmi', self.mat_[:,:3,:3], points) + self.mat_[:,None,:3,3]
+
+    def inv(self) -> 'TransformArray':
+
+        rt = np.transpose(self.mat_[:,:3,:3], (0, 2, 1))
+
+        mat = np.zeros_like(self.mat_)
+        mat[:,:3,:3] = rt
+        mat[:,:3,3] = -np.einsum('nij,nj->ni', rt, self.mat_[:,:3,3])
+        mat[:,3,3] = 1
 
-        return Transform(-rt.apply(self.trans_), rt)
+        return TransformArray(mat)
+
+    def __matmul__(self, other):
+
+        if isinstance(other, (Transform, TransformArray)):
+            return TransformArray(self.mat_ @ other.mat_)
+
+        return NotImplemented
+
+# Order defines the uint8 type codes used by MetaStore.
+MESSAGE_TYPES = list(MessageType)
+
+class MetaStore:
+    '''
+    Struct-of-arrays storage for the metadata of many messages.
+
+    Columns are NumPy arrays, allowing for vectorized operations over the whole dataset:
+
+    - `time_`:      (N,) int64 time stamps
+    - `type_`:      (N,) uint8 codes into MESSAGE_TYPES
+    - `pose_`:      (N,6) float64 poses (x, y, z, roll, pitch, yaw)
+    - `dirs_`:      interned table of directories (including trailing separator)
+    - `dir_code_`:  (N,) int32 indices into `dirs_`
+    - `names_`:     (N,) utf-8 encoded file names
+
+    Indexing the store returns MessageMeta views.
+    '''
+
+    def __init__(self, time, type, pose, file_path):
+
+        self.time_ = np.asarray(time, dtype=np.int64)
+        self.type_ = np.asarray(type, dtype=np.uint8)
+        self.pose_ = np.asarray(pose, dtype=np.float64).reshape(-1, 6)
+
+        dirs = {}
+        dir_code = np.empty(len(self.time_), dtype=np.int32)
+        names = []
+
+        for i,path in enumerate(file_path):
+
+            head, sep, name = str(path).rpartition('/')
+
+            dir_code[i] = dirs.setdefault(head + sep, len(dirs))
+            names.append(name.encode())
+
+        self.dirs_ = list(dirs)
+        self.dir_code_ = dir_code
+        self.names_ = np.array(names, dtype=np.bytes_)
+
+        # (column name, code) -> sorted row indices, see group_rows()
+        self.groups_ = {}
+
+    @staticmethod
+    def from_records(records) -> 'MetaStore':
+        '''
+        Creates a store from dicts in the format of the `*_meta.json` files.
+        '''
+        records = list(records)
+
+        poses = [record['Pose'] for record in records]
+
+        return MetaStore(
+            time=[record['Time'] for record in records],
+            type=[MESSAGE_TYPES.index(MessageType[record['Type']]) for record in records],
+            pose=[(p['X'], p['Y'], p['Z'], p['Roll'], p['Pitch'], p['Yaw']) for p in poses],
+            file_path=[record['File'] for record in records]
+        )
+
+    def take(self, indices) -> 'MetaStore':
+        '''
+        Returns a new store containing the selected rows (index array or boolean mask).
+        '''
+        indices = np.arange(len(self))[indices]
+
+        return MetaStore(
+            self.time_[indices],
+            self.type_[indices],
+            self.pose_[indices],
+            [self.file_path_str(i) for i in indices]
+        )
+
+    @staticmethod
+    def sort_order(time, file_path) -> np.ndarray:
+        '''
+        Row order of messages sorted by time, messages with the same time stamp by file path.
+        '''
+        return np.lexsort((np.asarray(file_path, dtype=np.str_), np.asarray(time, dtype=np.int64)))
+
+    def sorted(self) -> 'MetaStore':
+        '''
+        Returns a copy of the store sorted by time, see sort_order().
+        '''
+        return self.take(MetaStore.sort_order(self.time_, [self.file_path_str(i) for i in range(len(self))]))
+
+    def __len__(self):
+
+        return len(self.time_)
+
+    def __getitem__(self, i) -> 'MessageMeta':
+        '''
+        MessageMeta view of row i, or a list of views for a slice.
+        '''
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+
+        # views are created on demand, keeping them would bring back one Python object per message
+        return MessageMeta.view(self, range(len(self))[i])
+
+    def __iter__(self):
+
+        return (self[i] for i in range(len(self)))
+
+    def file_path_str(self, i) -> str:
+
+        return self.dirs_[self.dir_code_[i]] + self.names_[i].decode()
+
+    def message_type(self, i) -> MessageType:
+
+        return MESSAGE_TYPES[self.type_[i]]
+
+    def transforms(self, rows=None) -> TransformArray:
+        '''
+        Poses of all (or the selected) rows as TransformArray.
+        '''
+        return TransformArray.from_poses(self.pose_ if rows is None else self.pose_[rows])
+
+    def type_code(self, msg_type : MessageType) -> int:
+
+        return MESSAGE_TYPES.index(msg_type)
+
+    def group_rows(self, column : str, code : int) -> np.ndarray:
+        '''
+        Sorted indices of all rows where `column` ('type_' or 'dir_code_') equals `code`.
+        The groups of a column are computed once, on first use.
+        '''
+        if column not in self.groups_:
+
+            values = getattr(self, column)
+
+            order = np.argsort(values, kind='stable')
+            codes, starts = np.unique(values[order], return_index=True)
+
+            self.groups_[column] = dict(zip(codes.tolist(), np.split(order, starts[1:])))
+
+        return self.groups_[column].get(code, np.zeros(0, dtype=np.int64))
 
 class MessageMeta:
     '''
     Message metadata.
     This part of the message contains identifying information. 
     It does not contain the actual data, allowing for efficient queries.
+
+    MessageMeta is a lightweight view of one row of a MetaStore.
     '''
 
+    __slots__ = ('store_', 'index_', 'transform_')
+
     def __init__(self, data : dict):
 
-        self.type_ : MessageType = MessageType[data['Type']]
-        # self.bounds_ = load_bounds(data['Bounds'])
-        self.time_ : int = data['Time']
+        self.store_ = MetaStore.from_records([data])
+        self.index_ = 0
+        self.transform_ = None
+
+    @staticmethod
+    def view(store : MetaStore, index : int) -> 'MessageMeta':
+        '''
+        Creates a view of row `index` of the store.
+        '''
+        meta = MessageMeta.__new__(MessageMeta)
+
+        meta.store_ = store
+        meta.index_ = index
+        meta.transform_ = None
+
+        return meta
+
+    def __eq__(self, other):
 
-        pose = data['Pose']
+        if not isinstance(other, MessageMeta):
+            return NotImplemented
 
-        self.pose_ = Transform([pose['X'], pose['Y'], pose['Z']], [pose['Roll'], pose['Pitch'], pose['Yaw']])
+        # views of the same row are equal
+        return self.store_ is other.store_ and self.index_ == other.index_
 
-        self.file_path_ = Path(data['File'])
-        self.file_path_str_ = data['File']
+    def __hash__(self):
+
+        return hash((id(self.store_), self.index_))
+
+    @property
+    def type_(self) -> MessageType:
+        return self.store_.message_type(self.index_)
+
+    @property
+    def time_(self) -> int:
+        return int(self.store_.time_[self.index_])
+
+    @property
+    def file_path_(self) -> Path:
+        return Path(self.file_path_str_)
+
+    @property
+    def file_path_str_(self) -> str:
+        return self.store_.file_path_str(self.index_)
+
+    @property
+    def pose_(self) -> 'Transform':
+
+        if self.transform_ is None:
+            pose = self.store_.pose_[self.index_]
+            self.transform_ = Transform(pose[:3], pose[3:])
+
+        return self.transform_
 
     def type(self) -> MessageType:
         '''
@@ -134,6 +492,8 @@ class MessageMeta:
         3d pose (x, y, z, roll, pitch, yaw) 
         Center of the bounding box for point clouds.
         Focal point (roughly the camera's position) for images.
+
+        The Transform is created on first access.
         '''
         return self.pose_
 
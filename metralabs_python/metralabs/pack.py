@@ -0,0 +1,130 @@
+#!/bin/env python
+'''
+Packs a dataset into a small number of time-ordered shards for fast sequential reads.
+
+Run:
+
+python -m metralabs.pack path/to/dataset path/to/packed/dataset [--shard-size MiB] [--raw-images]
+
+The packed dataset can be opened with DataFolder like any other dataset.
+'''
+
+import json
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.packed import PackedData, ENCODING_RAW, ALIGNMENT
+
+def pack(data, dst, shard_bytes=1 << 30, raw_images=False, verbose=False):
+    '''
+    Packs the DataFolder into the directory dst.
+
+    :param shard_bytes: Approximate maximum size of each shard.
+    :param raw_images:  Store images as decoded arrays instead of the original files. Larger, but no decoding is necessary when reading.
+    '''
+    dst = Path(dst)
+
+    if dst.exists() and any(dst.iterdir()):
+        raise OSError(f'Destination is not empty: {dst}')
+
+    dst.mkdir(parents=True, exist_ok=True)
+
+    store = data.store()
+
+    n = len(store)
+
+    shard = np.zeros(n, dtype=np.int32)
+    offset = np.zeros(n, dtype=np.int64)
+    length = np.zeros(n, dtype=np.int64)
+    encoding = np.zeros(n, dtype=np.uint8)
+    shape = np.zeros((n, 3), dtype=np.int32)
+    dtype = np.full(n, '', dtype='<U8')
+
+    shard_index = 0
+    shard_file = None
+    position = 0
+
+    try:
+        for i, meta in enumerate(store):
+
+            if raw_images and meta.type().name.startswith('IMAGE'):
+
+                with data.load_image(meta.file_path()) as image:
+                    array = np.asarray(image)
+
+                payload = array.tobytes()
+
+                encoding[i] = ENCODING_RAW
+                shape[i, :array.ndim] = array.shape
+                dtype[i] = array.dtype.str
+            else:
+                payload = data.resolve(meta.file_path()).read_bytes()
+
+            if shard_file is None or (position > 0 and position + len(payload) > shard_bytes):
+
+                if shard_file is not None:
+                    shard_file.close()
+                    shard_index += 1
+
+                shard_file = open(dst.joinpath(f'shard_{shard_index:05d}.bin'), 'wb')
+                position = 0
+
+            padding = -position % ALIGNMENT
+            shard_file.write(b'\0' * padding)
+            position += padding
+
+            shard_file.write(payload)
+
+            shard[i] = shard_index
+            offset[i] = position
+            length[i] = len(payload)
+
+            position += len(payload)
+
+            if verbose and (i + 1) % 1000 == 0:
+                print(f'Packed {i + 1}/{n} messages')
+
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+
+    with open(dst.joinpath(PackedData.LABELS_FILE), 'w') as f:
+        for label in data.labels():
+            f.write(json.dumps(label) + '\n')
+
+    np.savez(
+        dst.joinpath(PackedData.INDEX_FILE),
+        version=PackedData.VERSION,
+        time=store.time_,
+        type=store.type_,
+        pose=store.pose_,
+        file_path=np.array([store.file_path_str(i) for i in range(n)], dtype=np.str_),
+        shard=shard,
+        offset=offset,
+        length=length,
+        encoding=encoding,
+        shape=shape,
+        dtype=dtype
+    )
+
+    return shard_index + 1 if n > 0 else 0
+
+if __name__ == '__main__':
+
+    import argparse
+
+    from metralabs.data import DataFolder
+
+    parser = argparse.ArgumentParser(description='Pack a dataset into time-ordered shards.')
+    parser.add_argument('src', help='dataset directory')
+    parser.add_argument('dst', help='output directory, must be empty or not exist')
+    parser.add_argument('--shard-size', type=int, default=1024, help='maximum shard size in MiB')
+    parser.add_argument('--raw-images', action='store_true', help='store images as decoded arrays')
+
+    args = parser.parse_args()
+
+    shards = pack(DataFolder(args.src), args.dst, args.shard_size * 2**20, args.raw_images, verbose=True)
+
+    print(f'Wrote {shards} shards to {args.dst}')
@@ -0,0 +1,149 @@
+import io
+
+import json
+
+import mmap
+
+from pathlib import Path
+
+import numpy as np
+
+from PIL import Image
+
+from metralabs.message import MetaStore
+from metralabs.images import ByteRange
+from metralabs.pcd import read_pcd_buffer
+
+# payload encodings
+ENCODING_FILE = 0
+ENCODING_RAW = 1
+
+# payloads start at multiples of this, allowing for aligned views into the shards
+ALIGNMENT = 64
+
+class PackedData:
+    '''
+    Read access to a packed dataset created by metralabs.pack.
+
+    Layout:
+    - `pack_index.npz`:     metadata columns (see MetaStore) plus the location of each payload
+    - `shard_XXXXX.bin`:    concatenated payloads, ordered by time
+    - `labels.jsonl`:       one label dict per line
+
+    Shards are memory-mapped on first access.
+    '''
+
+    INDEX_FILE = 'pack_index.npz'
+
+    LABELS_FILE = 'labels.jsonl'
+
+    VERSION = 1
+
+    def __init__(self, path):
+
+        self.path_ = Path(path)
+
+        with np.load(self.path_.joinpath(PackedData.INDEX_FILE), allow_pickle=False) as npz:
+
+            if int(npz['version']) != PackedData.VERSION:
+                raise OSError(f'Unsupported packed dataset version in {self.path_}')
+
+            self.columns_ = { name: npz[name] for name in npz.files }
+
+        self.rows_ = None
+        self.shards_ = {}
+        self.labels_ = None
+
+    @staticmethod
+    def is_packed(path) -> bool:
+
+        return Path(path).joinpath(PackedData.INDEX_FILE).exists()
+
+    def store(self) -> MetaStore:
+
+        return MetaStore(
+            self.columns_['time'],
+            self.columns_['type'],
+            self.columns_['pose'],
+            self.columns_['file_path'].tolist()
+        )
+
+    def row(self, file_path) -> int:
+        '''
+        Row of the message with the specified file path (relative to the dataset).
+        '''
+        if self.rows_ is None:
+            self.rows_ = { path: i for i,path in enumerate(self.columns_['file_path'].tolist()) }
+
+        row = self.rows_.get(Path(file_path).as_posix())
+
+        if row is None:
+            raise FileNotFoundError(f'{file_path} not found in packed dataset {self.path_}')
+
+        return row
+
+    def shard_path(self, shard : int) -> Path:
+
+        return self.path_.joinpath(f'shard_{shard:05d}.bin')
+
+    def view(self, row : int) -> memoryview:
+        '''
+        Payload of the row as memoryview into the memory-mapped shard.
+        '''
+        shard = int(self.columns_['shard'][row])
+
+        if shard not in self.shards_:
+            with open(self.shard_path(shard), 'rb') as f:
+                self.shards_[shard] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        offset = int(self.columns_['offset'][row])
+
+        return self.shards_[shard][offset:offset + int(self.columns_['length'][row])]
+
+    def byte_range(self, file_path) -> ByteRange:
+        '''
+        Location of the payload of the message, e.g. for decoding within other processes.
+        '''
+        row = self.row(file_path)
+
+        raw = self.columns_['encoding'][row] == ENCODING_RAW
+
+        return ByteRange(
+            str(self.shard_path(int(self.columns_['shard'][row]))),
+            int(self.columns_['offset'][row]),
+            int(self.columns_['length'][row]),
+            tuple(int(v) for v in self.columns_['shape'][row] if v > 0) if raw else None,
+            str(self.columns_['dtype'][row]) if raw else None
+        )
+
+    def load_image(self, file_path) -> Image.Image:
+
+        row = self.row(file_path)
+
+        data = self.view(row)
+
+        if self.columns_['encoding'][row] == ENCODING_RAW:
+
+            shape = tuple(int(v) for v in self.columns_['shape'][row] if v > 0)
+
+            return Image.fromarray(np.frombuffer(data, dtype=str(self.columns_['dtype'][row])).reshape(shape))
+
+        return Image.open(io.BytesIO(data))
+
+    def load_pcd(self, file_path) -> np.ndarray:
+
+        return read_pcd_buffer(self.view(self.row(file_path)))
+
+    def labels(self) -> list:
+
+        if self.labels_ is None:
+
+            path = self.path_.joinpath(PackedData.LABELS_FILE)
+
+            self.labels_ = []
+
+            if path.exists():
+                with open(path, 'r') as f:
+                    self.labels_ = [json.loads(line) for line in f if line.strip()]
+
+        return self.labels_
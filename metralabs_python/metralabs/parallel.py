@@ -0,0 +1,59 @@
+import os
+
+from collections import deque
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+def make_executor(jobs : int):
+    '''
+    Process pool for `jobs` workers (all CPUs if None), or None to run in the calling process.
+    '''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    return ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+def chunks(items, size : int):
+    '''
+    Splits an iterable into lists of at most `size` items without materializing it.
+    '''
+    chunk = []
+
+    for item in items:
+
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+def map_chunks(function, items, executor : Executor = None, chunk_size=256, max_pending=16):
+    '''
+    Applies `function` to chunks of the items, in the executor if given, and yields the concatenated results in order.
+    The items are consumed lazily, at most `max_pending` chunks are submitted ahead of the consumer.
+    '''
+    if executor is None:
+        for chunk in chunks(items, chunk_size):
+            yield from function(chunk)
+
+        return
+
+    pending = deque()
+
+    try:
+        for chunk in chunks(items, chunk_size):
+
+            pending.append(executor.submit(function, chunk))
+
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+    finally:
+        for future in pending:
+            future.cancel()
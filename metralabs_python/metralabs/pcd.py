@@ -0,0 +1,200 @@
+import mmap
+
+from pathlib import Path
+
+import numpy as np
+
+from numpy.lib import recfunctions
+
+# PCD (TYPE, SIZE) -> NumPy type
+PCD_TYPES = {
+    ('F', 4): np.float32, ('F', 8): np.float64,
+    ('I', 1): np.int8, ('I', 2): np.int16, ('I', 4): np.int32, ('I', 8): np.int64,
+    ('U', 1): np.uint8, ('U', 2): np.uint16, ('U', 4): np.uint32, ('U', 8): np.uint64,
+}
+
+class PcdHeader:
+    '''
+    Header of a .pcd file, see https://pointclouds.org/documentation/tutorials/pcd_file_format.html
+    '''
+
+    def __init__(self, fields, dtype : np.dtype, points : int, data : str, data_offset : int):
+
+        self.fields_ = fields
+        self.dtype_ = dtype
+        self.points_ = points
+        self.data_ = data
+        self.data_offset_ = data_offset
+
+def parse_header(buffer) -> PcdHeader:
+    '''
+    Parses the header at the start of the buffer (bytes, mmap, memoryview, ...).
+    '''
+    head = bytes(buffer[:4096])
+
+    # grow the window until it contains the complete DATA line
+    while len(head) < len(buffer):
+
+        pos = head.find(b'\nDATA')
+
+        if pos >= 0 and head.find(b'\n', pos + 1) >= 0:
+            break
+
+        head = bytes(buffer[:2 * len(head)])
+
+    entries = {}
+    offset = 0
+
+    while 'DATA' not in entries:
+
+        end = head.find(b'\n', offset)
+
+        if end < 0:
+            raise ValueError('Invalid .pcd file: header is missing DATA entry.')
+
+        line = head[offset:end].decode('ascii').strip()
+        offset = end + 1
+
+        if len(line) == 0 or line.startswith('#'):
+            continue
+
+        key, *values = line.split()
+        entries[key] = values
+
+    fields = entries['FIELDS']
+    sizes = [int(s) for s in entries['SIZE']]
+    types = entries['TYPE']
+    counts = [int(c) for c in entries.get('COUNT', [1] * len(fields))]
+
+    dtype = np.dtype([
+        # '_' marks padding and may appear multiple times
+        (name if name != '_' else f'_{i}', PCD_TYPES[(t, size)], (count,) if count > 1 else ())
+        for i, (name, size, t, count) in enumerate(zip(fields, sizes, types, counts))
+    ])
+
+    if 'POINTS' in entries:
+        points = int(entries['POINTS'][0])
+    else:
+        points = int(entries['WIDTH'][0]) * int(entries['HEIGHT'][0])
+
+    return PcdHeader(fields, dtype, points, entries['DATA'][0].lower(), offset)
+
+def lzf_decompress(data, size : int) -> bytearray:
+    '''
+    Decompresses LZF data as used by the binary_compressed .pcd format.
+    '''
+    out = bytearray(size)
+
+    i = 0
+    o = 0
+
+    while i < len(data):
+
+        ctrl = data[i]
+        i += 1
+
+        if ctrl < 32:
+            # literal run
+            n = ctrl + 1
+            out[o:o + n] = data[i:i + n]
+            i += n
+            o += n
+        else:
+            # back reference
+            n = ctrl >> 5
+
+            if n == 7:
+                n += data[i]
+                i += 1
+
+            ref = o - ((ctrl & 0x1f) << 8) - data[i] - 1
+            i += 1
+
+            n += 2
+
+            if ref + n <= o:
+                out[o:o + n] = out[ref:ref + n]
+            else:
+                # overlapping copy, e.g. repeated patterns
+                for k in range(n):
+                    out[o + k] = out[ref + k]
+
+            o += n
+
+    if o != size:
+        raise ValueError('Invalid .pcd file: corrupted compressed data.')
+
+    return out
+
+def parse_points(buffer, header : PcdHeader) -> np.ndarray:
+    '''
+    Returns the points of the .pcd file in the buffer as structured array.
+    For binary data, the array is a view into the buffer.
+    '''
+    offset = header.data_offset_
+
+    if header.data_ == 'binary':
+        return np.frombuffer(buffer, dtype=header.dtype_, count=header.points_, offset=offset)
+
+    if header.data_ == 'ascii':
+
+        values = np.array(bytes(buffer[offset:]).split(), dtype=np.float64).reshape(header.points_, -1)
+
+        return recfunctions.unstructured_to_structured(values, dtype=header.dtype_)
+
+    if header.data_ == 'binary_compressed':
+
+        compressed_size, size = np.frombuffer(buffer, dtype=np.uint32, count=2, offset=offset).tolist()
+
+        raw = lzf_decompress(bytes(buffer[offset + 8:offset + 8 + compressed_size]), size)
+
+        # the decompressed data is stored field by field
+        points = np.empty(header.points_, dtype=header.dtype_)
+
+        offset = 0
+
+        for name in header.dtype_.names:
+
+            field_dtype = header.dtype_.fields[name][0]
+            nbytes = field_dtype.itemsize * header.points_
+
+            points[name] = np.frombuffer(raw, dtype=field_dtype, count=header.points_, offset=offset).reshape(points[name].shape)
+
+            offset += nbytes
+
+        return points
+
+    raise ValueError(f'Unsupported .pcd data format: {header.data_}')
+
+def xyz(points : np.ndarray) -> np.ndarray:
+    '''
+    Returns the (N,3) float32 coordinates of structured points. This is a view if the layout permits it.
+    '''
+    coords = recfunctions.structured_to_unstructured(points[['x', 'y', 'z']], copy=False)
+
+    return coords.astype(np.float32, copy=False)
+
+def read_pcd_buffer(buffer) -> np.ndarray:
+    '''
+    Reads the (N,3) float32 point coordinates from the contents of a .pcd file (bytes, mmap, ...).
+    '''
+    header = parse_header(buffer)
+
+    return xyz(parse_points(buffer, header))
+
+def read_pcd(path) -> np.ndarray:
+    '''
+    Reads the (N,3) float32 point coordinates of a .pcd file.
+
+    Binary files are memory-mapped, the result is a read-only view into the file whenever the
+    point layout permits it. Supports the ascii, binary, and binary_compressed formats.
+    '''
+    with open(Path(path), 'rb') as f:
+
+        if Path(path).stat().st_size == 0:
+            raise ValueError(f'Empty .pcd file: {path}')
+
+        # the mapping stays valid after the file is closed
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return read_pcd_buffer(buffer)
@@ -0,0 +1,168 @@
+import numpy as np
+
+from scipy.spatial.transform import Rotation
+
+from metralabs.message import MessageType, MetaStore, Transform, TransformArray, poses_to_matrices
+
+def quat_to_matrix(quat) -> np.ndarray:
+    '''
+    Rotation matrices (N,3,3) for unit quaternions (N,4) in scalar-last (x, y, z, w) order.
+    '''
+    x, y, z, w = np.asarray(quat, dtype=np.float64).T
+
+    mat = np.empty((len(x), 3, 3))
+
+    mat[:,0,0] = 1 - 2 * (y * y + z * z)
+    mat[:,0,1] = 2 * (x * y - z * w)
+    mat[:,0,2] = 2 * (x * z + y * w)
+    mat[:,1,0] = 2 * (x * y + z * w)
+    mat[:,1,1] = 1 - 2 * (x * x + z * z)
+    mat[:,1,2] = 2 * (y * z - x * w)
+    mat[:,2,0] = 2 * (x * z - y * w)
+    mat[:,2,1] = 2 * (y * z + x * w)
+    mat[:,2,2] = 1 - 2 * (x * x + y * y)
+
+    return mat
+
+def slerp(q0, q1, alpha) -> np.ndarray:
+    '''
+    Spherical linear interpolation between (N,4) unit quaternions for (N,) factors in [0,1].
+    '''
+    dot = np.sum(q0 * q1, axis=1)
+
+    # take the short way around
+    q1 = np.where((dot < 0)[:,None], -q1, q1)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.sin(theta)
+
+    # fall back to linear interpolation for (almost) identical rotations
+    small = sin_theta < 1e-9
+    safe_sin = np.where(small, 1, sin_theta)
+
+    w0 = np.where(small, 1 - alpha, np.sin((1 - alpha) * theta) / safe_sin)
+    w1 = np.where(small, alpha, np.sin(alpha * theta) / safe_sin)
+
+    q = w0[:,None] * q0 + w1[:,None] * q1
+
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+class PoseBuffer:
+    '''
+    Poses of one sensor over time, answering pose queries at arbitrary time stamps.
+
+    Translations are interpolated linearly, rotations by SLERP between the two closest
+    recorded poses, found by binary search. Times outside the recorded range are clamped.
+    '''
+
+    def __init__(self, times, matrices):
+
+        times = np.asarray(times, dtype=np.int64)
+        matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+
+        if len(times) == 0:
+            raise ValueError('PoseBuffer requires at least one pose.')
+
+        order = np.argsort(times, kind='stable')
+
+        # keep the first pose of duplicate time stamps
+        times, first = np.unique(times[order], return_index=True)
+
+        matrices = matrices[order][first]
+
+        self.times_ = times
+        self.trans_ = np.ascontiguousarray(matrices[:,:3,3])
+
+        quats = Rotation.from_matrix(matrices[:,:3,:3]).as_quat()
+
+        # make consecutive quaternions lie in the same hemisphere
+        signs = np.ones(len(quats))
+        signs[1:] = np.where(np.sum(quats[1:] * quats[:-1], axis=1) < 0, -1, 1)
+
+        self.quats_ = quats * np.cumprod(signs)[:,None]
+
+    @staticmethod
+    def from_store(store : MetaStore, rows=None) -> 'PoseBuffer':
+        '''
+        Creates a buffer from the poses of the selected rows (index array, slice or mask) of the store.
+        '''
+        rows = slice(None) if rows is None else rows
+
+        return PoseBuffer(store.time_[rows], poses_to_matrices(store.pose_[rows]))
+
+    @staticmethod
+    def per_camera(data, types=None) -> dict:
+        '''
+        Creates one buffer per camera, i.e. per top-level folder of the dataset (e.g. 'cam1').
+
+        :param data:    DataFolder or MetaStore.
+        :param types:   Only use messages of these MessageTypes. Messages of different types may be
+                        captured by different sensors of a camera, restrict this to one sensor frame.
+        '''
+        store = data if isinstance(data, MetaStore) else data.store()
+
+        camera_of_dir = np.array([d.split('/', 1)[0] if '/' in d else '' for d in store.dirs_], dtype=np.str_)
+
+        cameras = camera_of_dir[store.dir_code_]
+
+        mask = np.ones(len(store), dtype=bool)
+
+        if types is not None:
+            mask = np.isin(store.type_, [store.type_code(MessageType(t)) for t in types])
+
+        return {
+            camera: PoseBuffer.from_store(store, np.flatnonzero(mask & (cameras == camera)))
+            for camera in np.unique(cameras[mask]).tolist()
+        }
+
+    def __len__(self):
+
+        return len(self.times_)
+
+    def start_time(self) -> int:
+
+        return int(self.times_[0])
+
+    def end_time(self) -> int:
+
+        return int(self.times_[-1])
+
+    def interpolate(self, times):
+        '''
+        Returns interpolated (translations (N,3), quaternions (N,4)) at the time stamps.
+        '''
+        times = np.asarray(times, dtype=np.int64).reshape(-1)
+
+        if len(self.times_) == 1:
+            return np.repeat(self.trans_, len(times), axis=0), np.repeat(self.quats_, len(times), axis=0)
+
+        i = np.clip(np.searchsorted(self.times_, times, side='right') - 1, 0, len(self.times_) - 2)
+
+        t0 = self.times_[i]
+        t1 = self.times_[i + 1]
+
+        alpha = np.clip((times - t0).astype(np.float64) / (t1 - t0).astype(np.float64), 0, 1)
+
+        trans = self.trans_[i] + alpha[:,None] * (self.trans_[i + 1] - self.trans_[i])
+
+        return trans, slerp(self.quats_[i], self.quats_[i + 1], alpha)
+
+    def poses_at(self, times) -> TransformArray:
+        '''
+        Interpolated poses at the time stamps (array of int) as TransformArray.
+        '''
+        trans, quats = self.interpolate(times)
+
+        mat = np.zeros((len(trans), 4, 4))
+        mat[:,:3,:3] = quat_to_matrix(quats)
+        mat[:,:3,3] = trans
+        mat[:,3,3] = 1
+
+        return TransformArray(mat)
+
+    def pose_at(self, time : int) -> Transform:
+        '''
+        Interpolated pose at the time stamp.
+        '''
+        return self.poses_at([time])[0]
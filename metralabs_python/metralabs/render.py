@@ -0,0 +1,271 @@
+#!/bin/env python
+'''
+Renders review frames and fly-through videos of a dataset without a display.
+
+Run:
+
+python -m metralabs.render path/to/dataset path/to/output [--step SECONDS] [--size 1280x720] [--jobs N] [--video scan.mp4]
+
+The timeline is split into one segment per worker process; each worker renders its frames
+with an off-screen plotter, using the same visualizations as the GUI.
+'''
+
+import os
+
+import warnings
+
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+from pathlib import Path
+
+import numpy as np
+
+import pyvista as pv
+
+from PIL import Image
+
+from metralabs.data import DataFolder, TimeRange, row_indices
+from metralabs.message import MessageMeta
+from metralabs.camera import Camera, shelf_distance
+from metralabs.textures import TextureCache
+from metralabs.visualization import ActorPool, ImageVisualization, PointCloudVisualization, distribute_points, screen_height, visualization_type
+
+def frame_times(data : DataFolder, step : float) -> np.ndarray:
+    '''
+    Time stamps of the frames from the start to the end of the dataset.
+
+    :param step: Time between frames in [s].
+    '''
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.arange(data.get_start_time(), data.get_end_time() + 1, max(int(step * 1e9), 1), dtype=np.int64)
+
+def camera_view(meta : MessageMeta, back=1.5):
+    '''
+    Returns (position, focal point, view up) of a view behind the camera of the message, looking at the shelf.
+
+    :param back: Distance in [m] to move the view backwards, so neighboring images are visible as well.
+    '''
+    pose = meta.pose()
+
+    origin = np.array(pose.trans_)
+
+    focal_point = Camera(meta).get_world_position(0.5, 0.5, shelf_distance(origin))
+
+    direction = focal_point - origin
+    direction /= max(np.linalg.norm(direction), 1e-9)
+
+    # image y points down
+    view_up = -pose.rotation()[:, 1]
+
+    return origin - back * direction, focal_point, view_up
+
+class Renderer:
+    '''
+    Renders the messages around a time stamp with an off-screen plotter.
+    Consecutive frames only load messages entering the time range, like the GUI.
+    '''
+
+    def __init__(self, data : DataFolder, size=(1280, 720), time_range=4.0, point_budget=2000000, texture_bytes=512 * 2**20):
+        '''
+        :param time_range:      Time range in [s] of messages to show around each time stamp.
+        :param point_budget:    Maximum number of points shown in total.
+        '''
+        self.data_ = data
+        self.labels_ = data.label_store()
+
+        self.time_range_ = int(time_range * 1e9)
+        self.point_budget_ = point_budget
+
+        self.plotter_ = pv.Plotter(off_screen=True, window_size=list(size))
+
+        self.pool_ = ActorPool(self.plotter_)
+        self.textures_ = TextureCache(max_bytes=texture_bytes)
+
+        # row of the message -> visualizer
+        self.visualizers_ = {}
+        self.visible_ = np.zeros(0, dtype=np.int64)
+
+    def create_visualizer(self, meta : MessageMeta):
+
+        if visualization_type(meta) is PointCloudVisualization:
+            return PointCloudVisualization(self.plotter_, meta, self.data_, self.pool_)
+
+        label = self.labels_.label(meta.file_path_str())
+
+        corners = ImageVisualization.corners(meta)
+
+        payload = ImageVisualization.prepare(
+            meta, self.data_, label, self.textures_,
+            screen_height(corners, self.plotter_.camera, self.plotter_.window_size[1])
+        )
+
+        return ImageVisualization(self.plotter_, meta, self.data_, label, self.pool_, payload)
+
+    def render(self, time : int) -> np.ndarray:
+        '''
+        Renders the messages around the time stamp. Returns the (H,W,3) uint8 image.
+        '''
+        store = self.data_.store()
+
+        if len(store) > 0:
+
+            # follow the camera of the message closest to the time stamp
+            row = min(int(np.searchsorted(store.time_, time)), len(store) - 1)
+
+            position, focal_point, view_up = camera_view(store[row])
+
+            self.plotter_.camera.position = position
+            self.plotter_.camera.focal_point = focal_point
+            self.plotter_.camera.up = view_up
+
+        visible = row_indices(TimeRange(time - self.time_range_//2, time + self.time_range_//2).select(store))
+
+        leaving = np.setdiff1d(self.visible_, visible, assume_unique=True)
+        entering = np.setdiff1d(visible, self.visible_, assume_unique=True)
+
+        # release first, so entering messages can reuse the actors
+        for row in leaving.tolist():
+            self.visualizers_.pop(row).release()
+
+        for row in entering.tolist():
+            self.visualizers_[row] = self.create_visualizer(store[row])
+
+        self.visible_ = visible
+
+        clouds = [vis for vis in self.visualizers_.values() if isinstance(vis, PointCloudVisualization)]
+
+        distribute_points(clouds, self.plotter_.camera.position, self.point_budget_)
+
+        self.plotter_.camera.reset_clipping_range()
+
+        return self.plotter_.screenshot(return_img=True)
+
+    def close(self):
+
+        for vis in self.visualizers_.values():
+            vis.release()
+
+        self.visualizers_ = {}
+
+        self.plotter_.close()
+
+def frame_path(output : Path, index : int) -> Path:
+
+    return Path(output).joinpath(f'frame_{index:06d}.png')
+
+def render_segment(data_path, times, first_index : int, output, options : dict) -> list:
+    '''
+    Renders the frames of consecutive time stamps into output. Used by worker processes.
+    Returns the paths of the frames.
+    '''
+    renderer = Renderer(DataFolder(data_path), **options)
+
+    paths = []
+
+    try:
+        for i, time in enumerate(times):
+
+            path = frame_path(output, first_index + i)
+
+            Image.fromarray(renderer.render(int(time))).save(path)
+
+            paths.append(path)
+    finally:
+        renderer.close()
+
+    return paths
+
+def render(data_path, output, step=0.5, jobs=None, verbose=False, **options) -> list:
+    '''
+    Renders frames of the dataset every `step` seconds into the directory output as frame_000000.png, ...
+    Returns the paths of the frames in order.
+
+    :param jobs:    Number of worker processes, each rendering one segment of the timeline. Defaults to the number of CPUs.
+    :param options: Arguments of Renderer (size, time_range, point_budget, texture_bytes).
+    '''
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    # builds or refreshes the indexes once, before the workers open the dataset
+    data = DataFolder(data_path)
+    data.label_store()
+
+    times = frame_times(data, step)
+
+    # off-screen plotters need a GL context, do not create one for nothing
+    if len(times) == 0:
+        warnings.warn(f'No frames to render in {data_path}')
+        return []
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    jobs = max(1, min(jobs, len(times)))
+
+    segments = [segment for segment in np.array_split(np.arange(len(times)), jobs) if len(segment) > 0]
+
+    if verbose:
+        print(f'Rendering {len(times)} frames in {len(segments)} segments')
+
+    if jobs == 1:
+        return render_segment(data_path, times, 0, output, options)
+
+    # VTK does not survive forking, start fresh worker processes
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+
+        futures = [
+            executor.submit(render_segment, data_path, times[segment], int(segment[0]), output, options)
+            for segment in segments
+        ]
+
+        return [path for future in futures for path in future.result()]
+
+def write_video(frames, path, fps=10):
+    '''
+    Writes the frames (image files) to a video. The format follows the file extension, e.g. .mp4 or .gif.
+    Requires the optional imageio package (and imageio-ffmpeg for .mp4).
+    '''
+    try:
+        import imageio.v2 as imageio
+    except ImportError:
+        raise ImportError('Writing videos requires imageio: pip install imageio imageio-ffmpeg')
+
+    with imageio.get_writer(path, fps=fps) as writer:
+        for frame in frames:
+            writer.append_data(np.asarray(Image.open(frame)))
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Render frames (and a video) of a dataset off-screen.')
+    parser.add_argument('dataset', help='dataset directory')
+    parser.add_argument('output', help='directory for the frames')
+    parser.add_argument('--step', type=float, default=0.5, help='time between frames in seconds')
+    parser.add_argument('--size', default='1280x720', help='frame size WIDTHxHEIGHT')
+    parser.add_argument('--time-range', type=float, default=4.0, help='time range in seconds of messages shown in each frame')
+    parser.add_argument('--point-budget', type=int, default=2000000, help='maximum number of points shown in each frame')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--video', default=None, help='also write the frames to this video file (.mp4, .gif, ...), requires imageio')
+    parser.add_argument('--fps', type=float, default=10, help='frame rate of the video')
+
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    frames = render(
+        args.dataset, args.output, args.step, args.jobs, verbose=True,
+        size=(width, height), time_range=args.time_range, point_budget=args.point_budget
+    )
+
+    print(f'Wrote {len(frames)} frames to {args.output}')
+
+    if args.video is not None and len(frames) > 0:
+
+        write_video(frames, args.video, args.fps)
+
+        print(f'Wrote {args.video}')
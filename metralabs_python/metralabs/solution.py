@@ -1,14 +1,25 @@
 
 import json
 
+import queue
+
+import weakref
+
+import threading
+
 from typing import List, Tuple
 
 from pathlib import Path
 
+import numpy as np
+
 
 # x_min,y_min,x_max,y_max
 Box = Tuple[int,int,int,int]
 
+# file names of the single-file (JSON Lines) solution format
+SOLUTION_SHARD_GLOB = 'solution_*.jsonl'
+
 
 def labels_to_dict(file : str, boxes : List[Box]):
     '''
@@ -16,22 +27,265 @@ def labels_to_dict(file : str, boxes : List[Box]):
     '''
     return dict(file=file, boxes=list(boxes))
 
+def label_path(path : Path, file : str) -> Path:
+    '''
+    Path of the solution label for `file` in the per-file solution layout rooted at path.
+    '''
+    return Path(Path(path).joinpath(file).absolute().with_suffix('').__str__() + '_sol_label.json')
+
+def to_json(value):
+    '''
+    Converts NumPy values for json.dump(s).
+    '''
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def is_jsonl_solution(path : Path) -> bool:
+    '''
+    Whether path is a solution in the single-file format, i.e. a .jsonl file or a directory of solution shards.
+    '''
+    path = Path(path)
+
+    if path.is_file():
+        return path.suffix == '.jsonl'
+
+    return path.is_dir() and next(path.glob(SOLUTION_SHARD_GLOB), None) is not None
+
+def read_solution(path : Path):
+    '''
+    Iterates over the labels of a solution in either format.
+    '''
+    path = Path(path)
+
+    if not is_jsonl_solution(path):
+
+        for file_path in path.glob('**/*_label.json'):
+            with open(file_path, 'rb') as f:
+                yield json.load(f)
+
+        return
+
+    for line in read_solution_lines(path):
+        yield json.loads(line)
+
+def read_solution_lines(path : Path):
+    '''
+    Iterates over the raw (bytes) records of a solution in the single-file format.
+    '''
+    path = Path(path)
+
+    shards = [path] if path.is_file() else sorted(path.glob(SOLUTION_SHARD_GLOB))
+
+    for shard in shards:
+        with open(shard, 'rb') as f:
+            for line in f:
+
+                line = line.strip()
+
+                if len(line) > 0:
+                    yield line
+
+def export_solution(src : Path, dst : Path) -> int:
+    '''
+    Writes a solution in the single-file format to the per-file `_sol_label.json` layout in dst.
+    Returns the number of labels written.
+    '''
+    count = 0
+
+    with Solution(Path(dst)) as solution:
+
+        for label in read_solution(src):
+            solution.append(label['file'], label['boxes'])
+            count += 1
+
+    return count
+
+class SolutionWriter:
+    '''
+    Writes the queued labels of a Solution in a background thread.
+    Kept separate from Solution, so the thread does not keep an abandoned Solution alive.
+    '''
+
+    def __init__(self, path : Path, jsonl : bool, shard_records, queue_size : int):
+
+        self.path_ = path
+
+        self.jsonl_ = jsonl
+        self.shard_records_ = shard_records
+
+        self.queue_ = queue.Queue(maxsize=queue_size)
+
+        # first error of the thread, labels queued after it are dropped
+        self.error_ = None
+
+        self.dirs_ = set()
+        self.shard_ = None
+        self.shard_index_ = 0
+        self.shard_count_ = 0
+
+        self.thread_ = threading.Thread(target=self.run, name='SolutionWriter', daemon=True)
+        self.thread_.start()
+
+    def flush(self):
+
+        self.queue_.join()
+
+        if self.shard_ is not None:
+            self.shard_.flush()
+
+    def stop(self):
+        '''
+        Writes all queued labels and stops the thread.
+        '''
+        self.queue_.put(None)
+        self.thread_.join()
+
+    def run(self):
+
+        try:
+            while True:
+
+                label = self.queue_.get()
+
+                try:
+                    if label is None:
+                        break
+
+                    if self.error_ is None:
+                        self.write(label)
+
+                except Exception as e:
+                    self.error_ = e
+
+                finally:
+                    self.queue_.task_done()
+
+        finally:
+            if self.shard_ is not None:
+                self.shard_.close()
+                self.shard_ = None
+
+    def write(self, label : dict):
+
+        if not self.jsonl_:
+
+            path = label_path(self.path_, label['file'])
+
+            if path.parent not in self.dirs_:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.dirs_.add(path.parent)
+
+            with open(path, 'w') as f:
+                json.dump(label, f, default=to_json)
+
+            return
+
+        if self.shard_ is None or (self.shard_records_ is not None and self.shard_count_ >= self.shard_records_):
+
+            if self.shard_ is not None:
+                self.shard_.close()
+                self.shard_index_ += 1
+
+            self.path_.mkdir(parents=True, exist_ok=True)
+
+            self.shard_ = open(self.path_.joinpath(f'solution_{self.shard_index_:05d}.jsonl'), 'w')
+            self.shard_count_ = 0
+
+        self.shard_.write(json.dumps(label, default=to_json) + '\n')
+        self.shard_count_ += 1
+
 class Solution:
     '''
     This class helps you in writing your solution to disk in the correct format.
+
+    Labels are written by a background thread, so `append` does not wait for the file system.
+    Call `close` (or use the solution as context manager) to make sure all labels are written;
+    remaining labels are also written when the solution is garbage collected or the interpreter exits.
+
+    If writing a label fails, all later labels are dropped and every following call of
+    `append`, `flush` or `close` raises the error.
     '''
-    def __init__(self, path : Path):
 
+    def __init__(self, path : Path, jsonl=False, shard_records=None, queue_size=1024):
+        '''
+        :param path:            Output directory.
+        :param jsonl:           Write all labels as JSON Lines into `solution_00000.jsonl`, ... in path
+                                instead of one `_sol_label.json` file per image. See export_solution(...).
+        :param shard_records:   Maximum number of labels per .jsonl shard. Unlimited if None.
+        :param queue_size:      Maximum number of labels waiting to be written before `append` blocks.
+        '''
         self.path_ = path.absolute()
 
+        self.writer_ = SolutionWriter(self.path_, jsonl, shard_records, queue_size)
+
+        # stops the writer when the solution is closed, collected or at exit, without referencing the solution
+        self.finalizer_ = weakref.finalize(self, self.writer_.stop)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
     def resolve(self, path):
 
         return self.path_.joinpath(path)
 
     def append(self, file : str, boxes : List[Box]):
-        
-        label_path = self.resolve(file).absolute().with_suffix('').__str__() + '_sol_label.json'
-        
-        Path(label_path).parent.mkdir(parents=True, exist_ok=True)
+        '''
+        Queues the boxes of the image `file` for writing. Blocks only if the queue is full.
+        '''
+        self.check()
+
+        if not self.finalizer_.alive:
+            raise ValueError('Solution is closed.')
+
+        # copy, the caller may reuse the boxes
+        boxes = boxes.tolist() if isinstance(boxes, np.ndarray) else [list(box) for box in boxes]
+
+        self.writer_.queue_.put(labels_to_dict(file, boxes))
+
+    def flush(self):
+        '''
+        Waits until all queued labels are written.
+        '''
+        self.writer_.flush()
+
+        self.check()
+
+    def close(self):
+        '''
+        Writes all queued labels and stops the writer thread. Raises if any label could not be written.
+        '''
+        # runs the writer's stop() only once
+        self.finalizer_()
+
+        self.check()
+
+    def check(self):
+        '''
+        Raises errors of the writer thread in the calling thread. Errors are not cleared, labels queued after them were lost.
+        '''
+        error = self.writer_.error_
+
+        if error is not None:
+            raise RuntimeError(f'Writing the solution to {self.path_} failed, labels were lost: {error!r}') from error
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export a single-file (.jsonl) solution to one _sol_label.json file per image.')
+    parser.add_argument('src', type=Path, help='.jsonl file or directory of solution_*.jsonl shards')
+    parser.add_argument('dst', type=Path, help='output directory')
+
+    args = parser.parse_args()
 
-        json.dump(labels_to_dict(file, boxes), open(label_path, 'w'))
+    print(f'Exported {export_solution(args.src, args.dst)} labels to {args.dst}')
@@ -0,0 +1,357 @@
+import hashlib
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.message import MessageType, MetaStore, MESSAGE_TYPES
+from metralabs.camera import Camera, shelf_distance
+from metralabs.index import INDEX_DIR, save_npz
+
+# image corners in normalized image coordinates, see Camera.get_world_position
+IMAGE_CORNERS = np.array([(0,0), (1,1), (1,0), (0,1)], dtype=np.float64)
+
+def message_bounds(store : MetaStore, dist=None):
+    '''
+    Axis aligned world bounding boxes of all messages in the store.
+
+    Images are represented by their footprint, i.e. the image plane projected at distance `dist`
+    (see Camera.get_world_extent). If dist is None, the distance from the shelf is estimated from
+    the camera position like in the GUI. Point clouds are represented by their pose center.
+
+    Returns (min_corners, max_corners), each (N,3).
+    '''
+    position = store.pose_[:, :3]
+
+    min_corners = position.copy()
+    max_corners = position.copy()
+
+    for msg_type in MESSAGE_TYPES:
+
+        if msg_type == MessageType.POINT_CLOUD:
+            continue
+
+        rows = store.group_rows('type_', store.type_code(msg_type))
+
+        if len(rows) == 0:
+            continue
+
+        fx, fy, cx, cy = Camera.intrinsics(msg_type)
+
+        d = shelf_distance(position[rows].T) if dist is None else np.full(len(rows), dist, dtype=np.float64)
+
+        # (R,4,3) corners within the camera frames
+        corners = np.empty((len(rows), len(IMAGE_CORNERS), 3))
+        corners[:,:,0] = (IMAGE_CORNERS[:,0] - cx) * d[:,None] / fx
+        corners[:,:,1] = (IMAGE_CORNERS[:,1] - cy) * d[:,None] / fy
+        corners[:,:,2] = d[:,None]
+
+        world = store.transforms(rows).apply(corners)
+
+        min_corners[rows] = world.min(axis=1)
+        max_corners[rows] = world.max(axis=1)
+
+    return min_corners, max_corners
+
+def store_fingerprint(store : MetaStore) -> str:
+    '''
+    Hash over the columns relevant for the spatial layout of the messages.
+    '''
+    h = hashlib.sha1()
+
+    for column in (store.time_, store.type_, store.pose_):
+        h.update(np.ascontiguousarray(column).tobytes())
+
+    return h.hexdigest()
+
+class SpatialIndex:
+    '''
+    Uniform grid over the world bounding boxes (see message_bounds) of all messages of a MetaStore.
+
+    Each box is registered in all grid cells it overlaps. Boxes that would cover too many cells
+    are kept in a separate list that is checked by every query.
+    Box and point queries return sorted row indices into the store.
+    '''
+
+    VERSION = 2
+
+    # boxes overlapping more cells than this are not registered within the grid
+    MAX_CELLS_PER_BOX = 64
+
+    def __init__(self, min_corners, max_corners, cell_size : float, grid : dict = None):
+        '''
+        :param grid: Cell lookup tables (keys, starts, rows, oversized) of an index with the same boxes, built if None.
+        '''
+        self.min_ = np.asarray(min_corners, dtype=np.float64).reshape(-1, 3)
+        self.max_ = np.asarray(max_corners, dtype=np.float64).reshape(-1, 3)
+
+        self.cell_size_ = float(cell_size)
+
+        self.origin_ = self.min_.min(axis=0) if len(self.min_) > 0 else np.zeros(3)
+
+        hi = self.cell_of(self.max_)
+
+        self.shape_ = hi.max(axis=0) + 1 if len(hi) > 0 else np.ones(3, dtype=np.int64)
+
+        if grid is None:
+            grid = self.build_grid()
+
+        # sorted keys of the non-empty cells, rows_[starts_[i]:starts_[i + 1]] are the boxes within cell keys_[i]
+        self.keys_ = grid['keys']
+        self.starts_ = grid['starts']
+        self.rows_ = grid['rows']
+
+        self.oversized_ = grid['oversized']
+
+    def build_grid(self) -> dict:
+        '''
+        Registers each box in all grid cells it overlaps.
+        '''
+        lo = self.cell_of(self.min_)
+        hi = self.cell_of(self.max_)
+
+        counts = hi - lo + 1
+        n_cells = counts.prod(axis=1)
+
+        in_grid = np.flatnonzero(n_cells <= SpatialIndex.MAX_CELLS_PER_BOX)
+
+        oversized = np.flatnonzero(n_cells > SpatialIndex.MAX_CELLS_PER_BOX)
+
+        # enumerate all (box, cell) pairs
+        lo, counts, n_cells = lo[in_grid], counts[in_grid], n_cells[in_grid]
+
+        rows = np.repeat(in_grid, n_cells)
+
+        local = np.arange(n_cells.sum()) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+
+        nx = np.repeat(counts[:,0], n_cells)
+        ny = np.repeat(counts[:,1], n_cells)
+
+        cells = np.repeat(lo, n_cells, axis=0) + np.stack((local % nx, (local // nx) % ny, local // (nx * ny)), axis=1)
+
+        keys = self.key_of(cells)
+
+        order = np.argsort(keys, kind='stable')
+
+        keys, starts = np.unique(keys[order], return_index=True)
+
+        return dict(keys=keys, starts=np.append(starts, len(rows)), rows=rows[order], oversized=oversized)
+
+    @staticmethod
+    def build(store : MetaStore, dist=None, cell_size=None) -> 'SpatialIndex':
+        '''
+        Creates the index for all messages in the store.
+
+        :param dist:        Projection distance of images, see message_bounds.
+        :param cell_size:   Edge length of the grid cells in [m]. Defaults to the median image footprint size.
+        '''
+        min_corners, max_corners = message_bounds(store, dist)
+
+        if cell_size is None:
+
+            extent = (max_corners - min_corners).max(axis=1)
+            extent = extent[extent > 0]
+
+            cell_size = np.median(extent) if len(extent) > 0 else 1.0
+
+        return SpatialIndex(min_corners, max_corners, cell_size)
+
+    @staticmethod
+    def file_name(dist=None) -> str:
+        '''
+        Name of the persisted index for a projection distance, each distance has its own file.
+        '''
+        return f'spatial_index_{"auto" if dist is None else format(dist, "g")}.npz'
+
+    @staticmethod
+    def open(root, store : MetaStore, dist=None, save=True) -> 'SpatialIndex':
+        '''
+        Loads the index persisted in the dataset at root.
+        The index is rebuilt if it does not match the messages in the store.
+        '''
+        path = Path(root).joinpath(INDEX_DIR, SpatialIndex.file_name(dist))
+
+        fingerprint = f'{SpatialIndex.VERSION}:{dist}:{store_fingerprint(store)}'
+
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+
+                if str(npz['fingerprint']) == fingerprint:
+
+                    grid = { name: npz[name] for name in ('keys', 'starts', 'rows', 'oversized') }
+
+                    return SpatialIndex(npz['min'], npz['max'], float(npz['cell_size']), grid)
+
+        except (OSError, KeyError, ValueError):
+            pass
+
+        index = SpatialIndex.build(store, dist)
+
+        if save:
+            save_npz(
+                path,
+                fingerprint=fingerprint,
+                min=index.min_,
+                max=index.max_,
+                cell_size=index.cell_size_,
+                keys=index.keys_,
+                starts=index.starts_,
+                rows=index.rows_,
+                oversized=index.oversized_
+            )
+
+        return index
+
+    def __len__(self):
+
+        return len(self.min_)
+
+    def cell_of(self, points) -> np.ndarray:
+
+        return np.floor((np.asarray(points) - self.origin_) / self.cell_size_).astype(np.int64)
+
+    def key_of(self, cells) -> np.ndarray:
+
+        return np.ravel_multi_index(cells.T, self.shape_, mode='clip')
+
+    def cell_rows(self, cells) -> list:
+        '''
+        Row arrays of the boxes registered in each of the non-empty (K,3) cells within the grid.
+        '''
+        keys = self.key_of(cells)
+
+        if len(self.keys_) == 0:
+            return []
+
+        pos = np.searchsorted(self.keys_, keys)
+        found = pos[self.keys_[np.minimum(pos, len(self.keys_) - 1)] == keys]
+
+        return [self.rows_[self.starts_[i]:self.starts_[i + 1]] for i in found.tolist()]
+
+    def ring_cells(self, center, r : int) -> np.ndarray:
+        '''
+        (K,3) cells within the grid at Chebyshev distance r from the center cell, i.e. the surface of a cube.
+        '''
+        lo = np.maximum(center - r, 0)
+        hi = np.minimum(center + r, self.shape_ - 1)
+
+        faces = []
+
+        for axis in range(3):
+            for side in {center[axis] - r, center[axis] + r}:
+
+                if not 0 <= side < self.shape_[axis]:
+                    continue
+
+                ranges = [np.arange(a, b + 1) for a,b in zip(lo, hi)]
+                ranges[axis] = np.array([side])
+
+                faces.append(np.stack(np.meshgrid(*ranges, indexing='ij'), axis=-1).reshape(-1, 3))
+
+        if len(faces) == 0:
+            return np.zeros((0, 3), dtype=np.int64)
+
+        return np.unique(np.concatenate(faces), axis=0)
+
+    def query_box(self, min_corner, max_corner) -> np.ndarray:
+        '''
+        Rows whose bounding box intersects the box [min_corner, max_corner].
+        '''
+        min_corner = np.asarray(min_corner, dtype=np.float64)
+        max_corner = np.asarray(max_corner, dtype=np.float64)
+
+        lo = np.maximum(self.cell_of(min_corner), 0)
+        hi = np.minimum(self.cell_of(max_corner), self.shape_ - 1)
+
+        candidates = [self.oversized_]
+
+        if (lo <= hi).all():
+
+            cells = np.stack(np.meshgrid(*(np.arange(a, b + 1) for a,b in zip(lo, hi)), indexing='ij'), axis=-1).reshape(-1, 3)
+
+            candidates.extend(self.cell_rows(cells))
+
+        rows = np.unique(np.concatenate(candidates))
+
+        hit = np.all((self.min_[rows] <= max_corner) & (min_corner <= self.max_[rows]), axis=1)
+
+        return rows[hit]
+
+    def query_point(self, point) -> np.ndarray:
+        '''
+        Rows whose bounding box contains the point, e.g. all images covering a location on the shelf.
+        '''
+        return self.query_box(point, point)
+
+    def distance(self, point, rows=None) -> np.ndarray:
+        '''
+        Distance of the point to the bounding box of each row (zero if inside).
+
+        :param rows: Only compute the distance to these rows.
+        '''
+        point = np.asarray(point, dtype=np.float64)
+
+        min_corners = self.min_ if rows is None else self.min_[rows]
+        max_corners = self.max_ if rows is None else self.max_[rows]
+
+        delta = np.maximum(np.maximum(min_corners - point, point - max_corners), 0)
+
+        return np.linalg.norm(delta, axis=1)
+
+    def nearest(self, point, k=1) -> np.ndarray:
+        '''
+        The k rows whose bounding boxes are closest to the point, sorted by distance.
+
+        Grid cells are searched in growing rings around the cell of the point. Boxes not registered
+        within the first r rings are at least r-1 cells away, so the search stops once the k-th
+        closest box found so far is nearer than that.
+        '''
+        point = np.asarray(point, dtype=np.float64)
+
+        k = min(k, len(self))
+
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        center = self.cell_of(point)
+
+        # rings below `first` are outside of the grid, ring `last` reaches the farthest cell
+        first = int(np.maximum(np.maximum(-center, center - (self.shape_ - 1)), 0).max())
+        last = int(np.maximum(np.abs(center), np.abs(center - (self.shape_ - 1))).max())
+
+        seen = np.zeros(len(self), dtype=bool)
+        seen[self.oversized_] = True
+
+        rows = [self.oversized_]
+        dist = [self.distance(point, self.oversized_)]
+
+        found = len(self.oversized_)
+
+        for r in range(first, last + 1):
+
+            # boxes registered in multiple cells are only added once
+            ring = np.concatenate([np.zeros(0, dtype=np.int64)] + self.cell_rows(self.ring_cells(center, r)))
+            ring = np.unique(ring[~seen[ring]])
+
+            seen[ring] = True
+
+            rows.append(ring)
+            dist.append(self.distance(point, ring))
+
+            found += len(ring)
+
+            if found < k:
+                continue
+
+            dist = [np.concatenate(dist)]
+            rows = [np.concatenate(rows)]
+
+            if np.partition(dist[0], k - 1)[k - 1] <= r * self.cell_size_:
+                break
+
+        rows = np.concatenate(rows)
+        dist = np.concatenate(dist)
+
+        nearest = np.argpartition(dist, k - 1)[:k]
+
+        return rows[nearest[np.lexsort((rows[nearest], dist[nearest]))]]
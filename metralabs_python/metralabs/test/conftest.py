@@ -0,0 +1,93 @@
+import json
+
+import shutil
+
+from pathlib import Path
+
+import numpy as np
+
+import pytest
+
+TEST_DATA_DIR = Path(__file__).parent.joinpath('data')
+
+def write_pcd_file(path, points, data, fields=('x', 'y', 'z', 'intensity')):
+    '''
+    Writes float32 points as .pcd file.
+
+    :param data:    'ascii', 'binary' or 'binary_compressed'
+    '''
+    header = '\n'.join([
+        '# .PCD v0.7 - Point Cloud Data file format',
+        'VERSION 0.7',
+        'FIELDS ' + ' '.join(fields),
+        'SIZE ' + ' '.join(['4'] * len(fields)),
+        'TYPE ' + ' '.join(['F'] * len(fields)),
+        'COUNT ' + ' '.join(['1'] * len(fields)),
+        f'WIDTH {len(points)}',
+        'HEIGHT 1',
+        'VIEWPOINT 0 0 0 1 0 0 0',
+        f'POINTS {len(points)}',
+        f'DATA {data}',
+        ''
+    ]).encode()
+
+    if data == 'ascii':
+        body = '\n'.join(' '.join(str(v) for v in p) for p in points.tolist()).encode()
+    elif data == 'binary':
+        body = points.astype(np.float32).tobytes()
+    else:
+        # column major, literal runs only
+        raw = np.ascontiguousarray(points.astype(np.float32).T).tobytes()
+        compressed = b''.join(bytes([len(raw[i:i + 32]) - 1]) + raw[i:i + 32] for i in range(0, len(raw), 32))
+        body = np.array([len(compressed), len(raw)], dtype=np.uint32).tobytes() + compressed
+
+    path.write_bytes(header + body)
+
+@pytest.fixture
+def write_pcd():
+    '''
+    The .pcd writer, see write_pcd_file().
+    '''
+    return write_pcd_file
+
+@pytest.fixture
+def data_dir(tmp_path) -> Path:
+    '''
+    Copy of the test dataset, tests must not write into the source tree.
+    '''
+    path = tmp_path.joinpath('data')
+
+    shutil.copytree(TEST_DATA_DIR, path)
+
+    return path
+
+@pytest.fixture
+def grade_dir(tmp_path) -> Path:
+    '''
+    Copy of the grading test data, containing the `solution` and `reference` directories.
+    '''
+    path = tmp_path.joinpath('grade')
+
+    shutil.copytree(TEST_DATA_DIR.joinpath('grade'), path)
+
+    return path
+
+@pytest.fixture
+def dataset_dir(data_dir) -> Path:
+    '''
+    Copy of the test dataset with a label and a point cloud added.
+    '''
+    label = dict(file='cam1/ColorImage/1715584015812594000.PNG', boxes=[[1, 2, 30, 40]])
+    data_dir.joinpath('cam1/ColorImage/1715584015812594000_label.json').write_text(json.dumps(label))
+
+    data_dir.joinpath('cam1/PointCloud').mkdir()
+
+    write_pcd_file(data_dir.joinpath('cam1/PointCloud/1715584016000000000.pcd'), np.arange(12, dtype=np.float32).reshape(4, 3), 'binary', fields=('x', 'y', 'z'))
+
+    meta = dict(
+        File='cam1/PointCloud/1715584016000000000.pcd', Time=1715584016000000000, Type='POINT_CLOUD',
+        Pose=dict(X=1.0, Y=2.0, Z=3.0, Roll=0.0, Pitch=0.0, Yaw=0.0)
+    )
+    data_dir.joinpath('cam1/PointCloud/1715584016000000000_meta.json').write_text(json.dumps(meta))
+
+    return data_dir
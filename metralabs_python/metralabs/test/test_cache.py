@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import numpy as np
+
+from metralabs import DataFolder
+from metralabs.cache import LRUCache
+
+
+def test_lru_cache_eviction():
+
+    cache = LRUCache(300)
+
+    for key in 'abc':
+        cache.put(key, np.zeros(100, dtype=np.uint8))
+
+    # touch a so that b is the least recently used entry
+    assert cache.get('a') is not None
+
+    cache.put('d', np.zeros(100, dtype=np.uint8))
+
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+
+    stats = cache.stats()
+
+    assert stats['hits'] == 1 and stats['evictions'] == 1 and stats['bytes'] == 300
+
+    # larger than the budget, not cached
+    cache.put('e', np.zeros(1000, dtype=np.uint8))
+
+    assert 'e' not in cache and cache.get('e') is None and cache.stats()['misses'] == 1
+
+def test_lru_cache_pin():
+
+    cache = LRUCache(200)
+
+    cache.pin('a')
+
+    for key in 'abcd':
+        cache.put(key, np.zeros(100, dtype=np.uint8))
+
+    assert 'a' in cache and 'd' in cache and len(cache) == 2
+
+    cache.unpin('a')
+    cache.put('e', np.zeros(100, dtype=np.uint8))
+
+    assert 'a' not in cache
+
+def test_data_folder_cache():
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False, cache_bytes=64 * 2**20)
+
+    meta = next(iter(data))
+
+    image = data.load_data(meta)
+
+    assert data.load_data(meta) is image
+
+    assert data.cache_.stats()['hits'] == 1 and data.cache_.stats()['misses'] == 1
+    assert data.cache_.stats()['bytes'] == image.width * image.height * len(image.getbands())
@@ -0,0 +1,65 @@
+import numpy as np
+
+from metralabs import Camera, MessageMeta
+from metralabs.cache import LRUCache
+
+
+def make_meta(msg_type, xyz=(0,0,0), rpy=(0,0,0)):
+
+    pose = dict(zip(('X', 'Y', 'Z', 'Roll', 'Pitch', 'Yaw'), (*xyz, *rpy)))
+
+    return MessageMeta(dict(Type=msg_type, Time=0, File='cam/depth.PNG', Pose=pose))
+
+def test_world_positions():
+
+    camera = Camera(make_meta('IMAGE_COLOR', (1, 2, 3), (10, 20, 30)))
+
+    x = np.array([0, 0.25, 1])
+    y = np.array([1, 0.5, 0])
+
+    expected = np.array([camera.get_world_position(a, b, 2.0) for a,b in zip(x, y)])
+
+    assert np.allclose(camera.get_world_positions(x, y, 2.0), expected)
+
+def test_depth_to_points():
+
+    meta = make_meta('IMAGE_DEPTH', (1, 2, 3), (10, 20, 30))
+
+    camera = Camera(meta)
+
+    depth = np.random.default_rng(0).integers(0, 3000, (6, 8)).astype(np.uint16)
+    depth[0,0] = 0
+
+    points = camera.depth_to_points(depth)
+
+    # compare with the scalar, per pixel implementation
+    rows, cols = np.nonzero(depth)
+
+    expected = np.array([
+        camera.get_world_position((c + 0.5) / 8, (r + 0.5) / 6, depth[r,c] * 1e-3) for r,c in zip(rows, cols)
+    ])
+
+    assert points.shape == (len(rows), 3)
+    assert np.allclose(points, expected, atol=1e-5)
+
+    # stride and roi select a subset of the pixels
+    local = camera.depth_to_points(depth, stride=2, roi=(2, 2, 8, 6), world=False)
+
+    assert len(local) == np.count_nonzero(depth[2:6:2, 2:8:2])
+
+    assert camera.get_ray_grid(8, 6) is camera.get_ray_grid(8, 6)
+
+def test_ray_grid_cache(monkeypatch):
+
+    # room for 4 grids of 4x6 rays
+    monkeypatch.setattr(Camera, 'RAY_GRIDS', LRUCache(4 * 4 * 6 * 3 * 4))
+
+    camera = Camera(make_meta('IMAGE_DEPTH'))
+
+    grids = [camera.get_ray_grid(width, 6, roi=(0, 0, 4, 6)) for width in range(8, 16)]
+
+    assert len(Camera.RAY_GRIDS) == 4
+
+    # the most recently used grids are kept
+    assert camera.get_ray_grid(15, 6, roi=(0, 0, 4, 6)) is grids[-1]
+    assert camera.get_ray_grid(8, 6, roi=(0, 0, 4, 6)) is not grids[0]
@@ -0,0 +1,61 @@
+import os
+
+import json
+
+from metralabs.convert_dataset import CONVERTED, SKIPPED, FAILED, convert, get_boxes, summarize
+
+VOC = '''<annotation>
+    <filename>a.png</filename>
+    <object><name>product</name><bndbox><xmin>1</xmin><ymin>2</ymin><xmax>30</xmax><ymax>40</ymax></bndbox></object>
+    <object><name>product</name><bndbox><xmin>5</xmin><ymin>6</ymin><xmax>7</xmax><ymax>8</ymax></bndbox></object>
+</annotation>
+'''
+
+def make_annotation(directory, name, voc=VOC):
+
+    directory.mkdir(parents=True, exist_ok=True)
+
+    directory.joinpath(name + '.xml').write_text(voc)
+    directory.joinpath(name + '_meta.json').write_text(json.dumps(dict(File=f'cam1/{name}.png')))
+
+def test_get_boxes(tmp_path):
+
+    make_annotation(tmp_path, 'a')
+
+    assert get_boxes(tmp_path.joinpath('a.xml')) == [[1, 2, 30, 40], [5, 6, 7, 8]]
+
+def test_convert(tmp_path):
+
+    make_annotation(tmp_path.joinpath('cam1'), 'a')
+    make_annotation(tmp_path.joinpath('cam1'), 'b', '<annotation></annotation>')
+    make_annotation(tmp_path.joinpath('cam2'), 'c', '<annotation><object>')
+
+    label_path = tmp_path.joinpath('cam1', 'a_label.json')
+
+    # dry run writes nothing
+    results = convert(tmp_path, dry_run=True)
+
+    assert summarize(results) == { CONVERTED: 3, SKIPPED: 0, FAILED: 0 }
+    assert not label_path.exists()
+
+    results = convert(tmp_path)
+
+    assert [(r.source, r.status) for r in results] == [
+        (os.path.join('cam1', 'a.xml'), CONVERTED),
+        (os.path.join('cam1', 'b.xml'), CONVERTED),
+        (os.path.join('cam2', 'c.xml'), FAILED),
+    ]
+
+    assert json.loads(label_path.read_text()) == dict(file='cam1/a.png', boxes=[[1, 2, 30, 40], [5, 6, 7, 8]])
+    assert json.loads(tmp_path.joinpath('cam1', 'b_label.json').read_text())['boxes'] == []
+    assert not tmp_path.joinpath('cam2', 'c_label.json').exists()
+
+    # unchanged annotations are skipped, failed ones are tried again
+    assert summarize(convert(tmp_path)) == { CONVERTED: 0, SKIPPED: 2, FAILED: 1 }
+
+    # a newer annotation is converted again
+    mtime = label_path.stat().st_mtime_ns
+    os.utime(tmp_path.joinpath('cam1', 'a.xml'), ns=(mtime + 10**9, mtime + 10**9))
+
+    assert summarize(convert(tmp_path, jobs=2)) == { CONVERTED: 1, SKIPPED: 1, FAILED: 1 }
+    assert summarize(convert(tmp_path, force=True)) == { CONVERTED: 2, SKIPPED: 0, FAILED: 1 }
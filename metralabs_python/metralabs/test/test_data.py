@@ -1,16 +1,20 @@
 
+import json
+
 from pathlib import Path
 
 import numpy as np
 
-from metralabs import DataFolder
+from metralabs import DataFolder, MessageType, DataQuery, TimeRange, MessageTypes, Folder, PoseBox
+from metralabs.message import MetaStore
 
 
 def test_data_folder():
 
     test_data_dir = Path(__file__).parent.joinpath('data')
 
-    data = DataFolder(test_data_dir)
+    # no index, tests must not write into the source tree
+    data = DataFolder(test_data_dir, index=False)
 
     meta = list(data)
 
@@ -23,3 +27,144 @@ def test_data_folder():
     assert np.isclose(test_image_meta.pose().trans_,  np.array([0,0,0])).all()
 
     assert np.isclose(test_image_meta.pose().rot_.as_euler('xyz'), np.array([0,0,0])).all()
+
+def test_data_folder_index(data_dir):
+
+    test_data_dir = data_dir
+
+    data = DataFolder(test_data_dir)
+
+    assert test_data_dir.joinpath('.metralabs', 'meta_index.npz').exists()
+
+    assert [m.file_path_str() for m in data] == [m.file_path_str() for m in DataFolder(test_data_dir, index=False)]
+
+    # remove one message and modify another, the index must pick up both changes
+    test_data_dir.joinpath('cam1/ColorImage/1715584015812594000_meta.json').unlink()
+
+    meta_path = test_data_dir.joinpath('cam2/ColorImage/1715584017539594000_meta.json')
+    meta = json.loads(meta_path.read_text())
+    meta['Pose']['X'] = 1.5
+    meta_path.write_text(json.dumps(meta))
+
+    data = DataFolder(test_data_dir)
+
+    assert len(data) == 5
+
+    modified = next(m for m in data if m.file_path_str() == 'cam2/ColorImage/1715584017539594000.PNG')
+    assert np.isclose(modified.pose().trans_, np.array([1.5,0,0])).all()
+
+    assert len(DataFolder(test_data_dir, rebuild=True)) == 5
+
+def test_data_folder_same_time(tmp_path):
+
+    meta = dict(Time=1715584015000000000, Type='IMAGE_COLOR', Pose=dict(X=0, Y=0, Z=0, Roll=0, Pitch=0, Yaw=0))
+
+    # written in reverse order, messages with the same time stamp are ordered by file path
+    for name in ('b', 'a'):
+        tmp_path.joinpath(f'{name}_meta.json').write_text(json.dumps(dict(meta, File=f'{name}.PNG')))
+
+    for index in (True, False):
+        assert [m.file_path_str() for m in DataFolder(tmp_path, index=index)] == ['a.PNG', 'b.PNG']
+
+    store = MetaStore.from_records(dict(meta, File=f'{name}.PNG') for name in ('b', 'a')).sorted()
+
+    assert [m.file_path_str() for m in store] == ['a.PNG', 'b.PNG']
+
+def test_meta_store():
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False)
+
+    store = data.store()
+
+    assert store.time_.dtype == np.int64 and store.type_.dtype == np.uint8
+    assert store.pose_.shape == (6, 6)
+    assert (np.diff(store.time_) >= 0).all()
+
+    # views are created on demand and create their Transform on first access
+    meta = store[3]
+    assert store[3] == meta and hash(store[3]) == hash(meta)
+    assert store[3] != store[2]
+    assert meta.transform_ is None
+    assert meta.pose() is meta.pose()
+
+    assert meta.time() == store.time_[3]
+    assert store[-1] == store[len(store) - 1]
+
+    # slices return lists of views
+    assert store[2:5] == [store[2], store[3], store[4]]
+    assert store[::-2] == [store[5], store[3], store[1]]
+    assert store[10:] == []
+    assert meta.type() == MessageType.IMAGE_COLOR
+    assert [m.file_path_str() for m in store.take(store.time_ >= meta.time())] == [m.file_path_str() for m in data][3:]
+
+def test_data_query():
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False)
+
+    times = [m.time() for m in data]
+
+    class Custom(DataQuery):
+
+        def matches(self, meta):
+            return (meta.time() // 1000000) % 2 == 0
+
+    queries = [
+        TimeRange(times[1], times[4]),
+        TimeRange(times[1], times[4]) & MessageTypes(MessageType.IMAGE_COLOR),
+        TimeRange(times[1], times[4]) & MessageTypes(MessageType.POINT_CLOUD),
+        Folder('cam2') & ~TimeRange(times[0], times[3]),
+        Folder('cam1/ColorImage') | PoseBox((-1,-1,-1), (1,1,1)) & Custom(),
+        Custom() & TimeRange(times[2], times[5]),
+    ]
+
+    for query in queries:
+        # the planned query on the store must yield the same result as checking each message
+        expected = [m for m in data if query.matches(m)]
+
+        assert list(query.run(data)) == expected
+        assert list(query.run(iter(data))) == expected
+
+    assert len(list(Folder('cam2').run(data))) == 4
+
+def test_iter_loaded():
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False)
+
+    loaded = list(data.iter_loaded(prefetch=2, workers=2, types=[MessageType.IMAGE_COLOR]))
+
+    assert [meta for meta,_ in loaded] == list(data)
+
+    for meta, image in loaded:
+        assert image.size == data.load_image(meta.file_path()).size
+
+    # stopping early must not hang or leak the pool
+    gen = data.iter_loaded(prefetch=4, query=Folder('cam2'))
+
+    meta, _ = next(gen)
+    assert meta.file_path_str().startswith('cam2/')
+
+    gen.close()
+
+    assert len(list(data.iter_loaded(types=[MessageType.POINT_CLOUD]))) == 0
+
+def test_load_images():
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False)
+
+    meta = list(data)[:3]
+
+    expected = np.stack([np.asarray(data.load_image(m.file_path()).convert('RGB')) for m in meta])
+
+    batch = data.load_images(meta, workers=2)
+
+    assert batch.dtype == np.uint8 and batch.shape == expected.shape
+    assert np.array_equal(batch, expected)
+
+    assert np.array_equal(data.load_images(meta, workers=1), expected)
+
+    height, width = expected.shape[1:3]
+
+    small = data.load_images(meta, size=(width // 4, height // 4), normalize=True, workers=2)
+
+    assert small.shape == (3, height // 4, width // 4, 3) and small.dtype == np.float32
+    assert 0 <= small.min() and small.max() <= 1
@@ -1,9 +1,20 @@
 
+import csv
+
+import json
+
 from pathlib import Path
 
 import numpy as np
 
-from metralabs.grade import grade_boxes, intersection, area, associate_boxes, grade_solution_dir
+from scipy.optimize import linear_sum_assignment
+
+import pytest
+
+import metralabs.grade
+
+from metralabs.grade import grade_boxes, intersection, area, associate_boxes, grade_solution_dir, iou_matrix, grade_files, grade_solution, summarize
+from metralabs.grade import grade_label, grouped_metrics, write_metrics, FileResult
 
 def test_area():
     assert area((1, 1, 4, 4)) == 9
@@ -16,6 +27,49 @@ def test_intersection():
     assert intersection((1, 1, 4, 4), (0, 0, 2, 2)) == 1
     assert intersection( (2, 2, 4, 4),  (2, 2, 4, 4)) == area( (2, 2, 4, 4))
 
+def random_boxes(rng, n):
+
+    corners = rng.uniform(0, 1000, (n, 2))
+
+    return np.concatenate((corners, corners + rng.uniform(5, 100, (n, 2))), axis=1)
+
+def test_iou_matrix():
+
+    rng = np.random.default_rng(0)
+
+    solution = random_boxes(rng, 30)
+    reference = random_boxes(rng, 20)
+
+    expected = np.array([
+        [intersection(s, r) / (area(r) + area(s) - intersection(s, r)) for r in reference]
+        for s in solution
+    ])
+
+    assert np.array_equal(iou_matrix(solution, reference), expected)
+
+    assert iou_matrix([], reference).shape == (0, 20)
+
+def test_associate_boxes_optimal():
+
+    rng = np.random.default_rng(1)
+
+    for n_sol, n_ref in [(200, 150), (50, 300), (1, 1), (0, 3)]:
+
+        solution = random_boxes(rng, n_sol)
+        reference = random_boxes(rng, n_ref)
+
+        iou, matches = associate_boxes(solution, reference)
+
+        n = max(n_sol, n_ref)
+
+        # a complete assignment of the padded matrix
+        assert [i for i, _ in matches] == list(range(n))
+        assert sorted(j for _, j in matches) == list(range(n))
+
+        rows, cols = linear_sum_assignment(iou, maximize=True)
+
+        assert np.isclose(sum(iou[i, j] for i, j in matches), iou[rows, cols].sum())
+
 def test_associate_boxes_identical():
     reference = np.array([[224, 431, 600, 1080], [601, 433, 988, 1080], [959, 431, 1270, 945], [1256, 431, 1920, 861]])
     solution = reference
@@ -121,3 +175,142 @@ def test_grade_solution_dir():
     score, _, _ = grade_solution_dir(reference_dir, solution_dir)
     assert score < 1.0
 
+
+def test_grade_solution_dir_jobs():
+
+    solution_dir = Path(__file__).parent.joinpath('data/grade/solution')
+
+    reference_dir = Path(__file__).parent.joinpath('data/grade/reference')
+
+    assert grade_solution_dir(solution_dir, reference_dir, jobs=2) == grade_solution_dir(solution_dir, reference_dir)
+
+def test_grade_files():
+
+    reference = [
+        dict(file='b.PNG', boxes=[(1, 1, 3, 3), (2, 2, 4, 4)]),
+        dict(file='a.PNG', boxes=[(3, 3, 5, 5)]),
+    ]
+
+    solution = [
+        dict(file='a.PNG', boxes=[(3, 3, 5, 5), (10, 10, 20, 20)]),
+        dict(file='b.PNG', boxes=[(2, 2, 4, 4), (1, 1, 3, 3)]),
+    ]
+
+    results = grade_files(solution, iter(reference))
+
+    # sorted by file
+    assert [result.file for result in results] == ['a.PNG', 'b.PNG']
+
+    assert results[0].score == 0.5
+    assert results[0].sol_count == 2
+    assert results[1].score == 1.0
+
+    assert summarize(results) == grade_solution(solution, reference) == (2.5 / 3, 4, 3)
+
+    with pytest.raises(Exception, match='Missing solution label for file b.PNG'):
+        grade_files(solution[:1], reference)
+
+def test_grade_solution_dir_cache(tmp_path, grade_dir, monkeypatch):
+
+    solution_dir = grade_dir.joinpath('solution')
+    reference_dir = grade_dir.joinpath('reference')
+    cache_dir = tmp_path.joinpath('cache')
+
+    expected = grade_solution_dir(solution_dir, reference_dir)
+
+    assert grade_solution_dir(solution_dir, reference_dir, cache_dir=cache_dir) == expected
+
+    # nothing changed, nothing is graded
+    with monkeypatch.context() as m:
+        m.setattr(metralabs.grade, 'grade_label', None)
+
+        assert grade_solution_dir(solution_dir, reference_dir, cache_dir=cache_dir) == expected
+
+    # drop a box from one solution label
+    label_path = next(solution_dir.glob('**/*_label.json'))
+
+    label = json.loads(label_path.read_text())
+    label['boxes'] = label['boxes'][1:]
+    label_path.write_text(json.dumps(label))
+
+    expected = grade_solution_dir(solution_dir, reference_dir)
+
+    graded = []
+
+    with monkeypatch.context() as m:
+        m.setattr(metralabs.grade, 'grade_label', lambda sol, ref: graded.append(ref['file']) or metralabs.grade.FileResult(ref['file'], grade_boxes(sol['boxes'], ref['boxes']), len(sol['boxes']), len(ref['boxes']), 0.0))
+
+        assert grade_solution_dir(solution_dir, reference_dir, cache_dir=cache_dir) == expected
+
+    assert graded == [label['file']]
+
+    # a changed reference label is graded again as well
+    ref_path = next(path for path in reference_dir.glob('**/*_label.json') if json.loads(path.read_text())['file'] == label['file'])
+
+    ref = json.loads(ref_path.read_text())
+    ref['boxes'] = ref['boxes'][1:]
+    ref_path.write_text(json.dumps(ref))
+
+    expected = grade_solution_dir(solution_dir, reference_dir)
+
+    graded = []
+
+    with monkeypatch.context() as m:
+        m.setattr(metralabs.grade, 'grade_label', lambda sol, ref: graded.append(ref['file']) or metralabs.grade.FileResult(ref['file'], grade_boxes(sol['boxes'], ref['boxes']), len(sol['boxes']), len(ref['boxes']), 0.0))
+
+        assert grade_solution_dir(solution_dir, reference_dir, cache_dir=cache_dir) == expected
+
+    assert graded == [label['file']]
+
+    # grading does not write into its inputs
+    assert not reference_dir.joinpath('.metralabs').exists()
+    assert not solution_dir.joinpath('.metralabs').exists()
+
+def test_detection_metrics(tmp_path):
+
+    reference = [
+        dict(file='cam1/ColorImage/a.PNG', boxes=[(0, 0, 10, 10), (20, 20, 30, 30)]),
+        dict(file='cam2/ColorImage/b.PNG', boxes=[(0, 0, 10, 10)]),
+    ]
+
+    solution = [
+        # IoU 1 and 0.6, one false positive
+        dict(file='cam1/ColorImage/a.PNG', boxes=[(0, 0, 10, 10), (20, 20, 30, 26), (50, 50, 60, 60)]),
+        # IoU 0.8
+        dict(file='cam2/ColorImage/b.PNG', boxes=[(0, 0, 10, 8)]),
+    ]
+
+    results = [grade_label(sol, ref) for sol, ref in zip(solution, reference)]
+
+    assert np.allclose(np.sort(results[0].ious), [0.6, 1.0])
+
+    # results are plain values that can be compared
+    assert results[0] == results[0]._replace()
+    assert results[0] != results[1]
+    assert FileResult('a.PNG', 1.0, 1, 1, 0.0).ious == ()
+
+    metrics = grouped_metrics(results, ['all', 'all'], thresholds=(0.5, 0.75, 0.9))['all']
+
+    assert metrics['sol_count'] == 4
+    assert metrics['ref_count'] == 3
+
+    assert np.isclose(metrics['precision@0.5'], 3 / 4)
+    assert np.isclose(metrics['recall@0.5'], 1)
+    assert np.isclose(metrics['precision@0.75'], 2 / 4)
+    assert np.isclose(metrics['recall@0.9'], 1 / 3)
+    assert np.isclose(metrics['f1@0.75'], 2 * 0.5 * (2 / 3) / (0.5 + 2 / 3))
+    assert np.isclose(metrics['ap@0.75'], 0.5 * 2 / 3)
+    assert np.isclose(metrics['mAP'], np.mean([3 / 4, 1 / 3, 1 / 12]))
+    assert np.isclose(metrics['score'], summarize(results)[0])
+
+    write_metrics(results, tmp_path, thresholds=(0.5, 0.75))
+
+    with open(tmp_path.joinpath('cameras.csv')) as f:
+        cameras = { row['camera']: row for row in csv.DictReader(f) }
+
+    assert sorted(cameras) == ['all', 'cam1', 'cam2']
+    assert np.isclose(float(cameras['cam2']['precision@0.75']), 1)
+    assert np.isclose(float(cameras['all']['recall@0.5']), 1)
+
+    with open(tmp_path.joinpath('files.csv')) as f:
+        assert [row['file'] for row in csv.DictReader(f)] == [label['file'] for label in reference]
@@ -0,0 +1,73 @@
+import json
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.labels import LabelStore
+
+def read_labels(path : Path) -> dict:
+
+    labels = (json.loads(p.read_text()) for p in path.glob('**/*_label.json'))
+
+    return { label['file']: label['boxes'] for label in labels }
+
+def test_label_store(grade_dir):
+
+    reference_dir = grade_dir.joinpath('reference')
+
+    expected = read_labels(reference_dir)
+
+    store = LabelStore.open(reference_dir)
+
+    assert len(store) == len(expected)
+    assert store.boxes_.dtype == np.int32
+
+    for file, boxes in expected.items():
+        assert store.label(file) == dict(file=file, boxes=boxes)
+
+    assert store.boxes('missing.PNG') is None
+    assert 'missing.PNG' not in store
+
+    # persisted, boxes are memory-mapped
+    loaded = LabelStore.load(reference_dir)
+
+    assert isinstance(loaded.boxes_, np.memmap)
+    assert list(loaded) == list(store)
+    assert loaded.refresh() == False
+
+    # change, add, and remove label files
+    paths = sorted(reference_dir.glob('**/*_label.json'))
+
+    changed = json.loads(paths[0].read_text())
+    changed['boxes'] = [[0.5, 1, 2, 3]]
+    paths[0].write_text(json.dumps(changed))
+
+    added = dict(file='cam9/ColorImage/1.PNG', boxes=[])
+    paths[1].parent.joinpath('1_label.json').write_text(json.dumps(added))
+
+    removed = json.loads(paths[2].read_text())
+    paths[2].unlink()
+
+    store = LabelStore.open(reference_dir)
+
+    # non-integral coordinates
+    assert store.boxes_.dtype == np.float64
+
+    assert store.label(changed['file']) == changed
+    assert store.label(added['file']) == added
+    assert store.label(removed['file']) is None
+
+    assert len(store) == len(expected)
+
+    assert list(LabelStore.open(reference_dir, rebuild=True, save=False)) == list(store)
+
+def test_label_store_from_labels():
+
+    labels = [dict(file='b.PNG', boxes=[[1, 2, 3, 4]]), dict(file='a.PNG', boxes=[[5, 6, 7, 8], [1, 1, 2, 2]])]
+
+    store = LabelStore.from_labels(labels)
+
+    assert store.files() == ['a.PNG', 'b.PNG']
+    assert np.array_equal(store.boxes('a.PNG'), [[5, 6, 7, 8], [1, 1, 2, 2]])
+    assert list(store) == sorted(labels, key=lambda label: label['file'])
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metralabs import DataFolder
+from metralabs.lod import PointPyramid, voxel_keys
+
+def test_point_pyramid():
+
+    rng = np.random.default_rng(0)
+
+    points = rng.uniform(0, 2, (20000, 3)).astype(np.float32)
+
+    pyramid = PointPyramid.build(points, min_voxel_size=0.05, levels=5)
+
+    assert len(pyramid) == 6
+
+    # the finest level is the full cloud, reordered
+    assert pyramid.counts_[-1] == len(points)
+    assert np.array_equal(np.sort(pyramid.level(5), axis=0), np.sort(points, axis=0))
+
+    assert np.all(np.diff(pyramid.counts_) >= 0)
+
+    for l in range(5):
+
+        keys = voxel_keys(pyramid.level(l), pyramid.voxel_sizes_[l])
+
+        # one point per occupied voxel
+        assert len(np.unique(keys)) == len(keys) == len(np.unique(voxel_keys(points, pyramid.voxel_sizes_[l])))
+
+    assert pyramid.level_for_budget(0) == 0
+    assert pyramid.level_for_budget(len(points)) == 5
+    assert pyramid.counts_[pyramid.level_for_budget(5000)] <= 5000 < pyramid.counts_[pyramid.level_for_budget(5000) + 1]
+
+def test_point_pyramid_cache(dataset_dir, write_pcd):
+
+    path = dataset_dir
+
+    file_path = 'cam1/PointCloud/1715584016000000000.pcd'
+
+    points = np.random.default_rng(1).uniform(0, 1, (1000, 3)).astype(np.float32)
+
+    write_pcd(path.joinpath(file_path), points, 'binary', fields=('x', 'y', 'z'))
+
+    data = DataFolder(path)
+
+    pyramid = PointPyramid.open(data, file_path, levels=3)
+
+    assert PointPyramid.cache_path(data, file_path).exists()
+
+    cached = PointPyramid.open(data, file_path, levels=3)
+
+    assert np.array_equal(cached.points_, pyramid.points_)
+    assert np.array_equal(cached.counts_, pyramid.counts_)
+
+    # outdated cache entries are rebuilt
+    write_pcd(path.joinpath(file_path), points[:10], 'binary', fields=('x', 'y', 'z'))
+
+    assert PointPyramid.open(data, file_path, levels=3).counts_[-1] == 10
+
+    # pyramids of the same file built by several threads at once
+    write_pcd(path.joinpath(file_path), points, 'binary', fields=('x', 'y', 'z'))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pyramids = list(executor.map(lambda _: PointPyramid.open(data, file_path, levels=3), range(8)))
+
+    assert all(np.array_equal(p.points_, pyramids[0].points_) for p in pyramids)
+
+    assert np.array_equal(PointPyramid.open(data, file_path, levels=3, save=False).points_, pyramids[0].points_)
+
+    assert list(PointPyramid.cache_path(data, file_path).parent.glob('*.tmp')) == []
@@ -0,0 +1,53 @@
+import numpy as np
+
+from scipy.spatial.transform import Rotation
+
+from metralabs.message import Transform, TransformArray, euler_to_matrix
+
+
+def random_poses(n, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    return np.concatenate((rng.uniform(-5, 5, (n, 3)), rng.uniform(-180, 180, (n, 3))), axis=1)
+
+def test_euler_to_matrix():
+
+    rpy = random_poses(20)[:,3:]
+
+    assert np.allclose(euler_to_matrix(rpy), Rotation.from_euler('xyz', rpy, degrees=True).as_matrix())
+
+def test_transform():
+
+    a, b = (Transform(p[:3], p[3:]) for p in random_poses(2))
+
+    v = np.random.default_rng(1).uniform(-1, 1, (10, 3))
+
+    assert np.allclose(a.apply(v), Rotation.from_euler('xyz', random_poses(2)[0,3:], degrees=True).apply(v) + a.trans_)
+
+    assert np.allclose((a @ b).apply(v), a.apply(b.apply(v)))
+    assert np.allclose(a.inv().apply(a.apply(v)), v)
+
+    # homogeneous matrix
+    assert np.allclose((a.matrix() @ np.append(v[0], 1))[:3], a.apply(v[0]))
+
+    c = Transform([1, 2, 3], None, rot=a.rot_)
+    assert np.allclose(c.rotation(), a.rotation()) and np.allclose(c.trans_, [1, 2, 3])
+
+def test_transform_array():
+
+    poses = random_poses(8)
+
+    transforms = TransformArray.from_poses(poses)
+
+    single = [Transform(p[:3], p[3:]) for p in poses]
+
+    v = np.random.default_rng(2).uniform(-1, 1, (8, 3))
+
+    assert np.allclose(transforms.apply(v), [t.apply(x) for t,x in zip(single, v)])
+    assert np.allclose(transforms.apply_all(v), [t.apply(v) for t in single])
+    assert np.allclose(transforms.apply(np.stack([v] * 8)), transforms.apply_all(v))
+
+    assert np.allclose((transforms @ transforms.inv()).matrices(), np.identity(4))
+    assert np.allclose((single[0] @ transforms)[3].matrix(), (single[0] @ single[3]).matrix())
+    assert np.allclose(transforms[2:4].translations(), poses[2:4,:3])
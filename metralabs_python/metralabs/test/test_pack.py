@@ -0,0 +1,43 @@
+import numpy as np
+
+from metralabs import DataFolder
+from metralabs.pack import pack
+
+def test_pack(tmp_path, dataset_dir):
+
+    data = DataFolder(dataset_dir)
+
+    for raw_images in (False, True):
+
+        packed_path = tmp_path.joinpath(f'packed_{raw_images}')
+
+        # tiny shards to test reading across multiple shards
+        assert pack(data, packed_path, shard_bytes=1, raw_images=raw_images) == len(data)
+
+        packed = DataFolder(packed_path)
+
+        assert [(m.file_path_str(), m.time()) for m in packed] == [(m.file_path_str(), m.time()) for m in data]
+        assert np.array_equal(packed.store().pose_, data.store().pose_)
+
+        for meta, packed_meta in zip(data, packed):
+
+            if meta.type().name.startswith('IMAGE'):
+                assert np.array_equal(np.asarray(packed.load_data(packed_meta)), np.asarray(data.load_data(meta)))
+                assert packed.load_label(packed_meta) == data.load_label(meta)
+            else:
+                assert np.array_equal(packed.load_pcd(packed_meta.file_path(), raw=True), data.load_pcd(meta.file_path(), raw=True))
+
+                # the point clouds own their points and can be modified
+                for folder, m in ((data, meta), (packed, packed_meta)):
+
+                    pc = folder.load_pcd(m.file_path())
+                    pc.points[0, 0] = 5
+
+                    assert pc.points[0, 0] == 5
+                    assert folder.load_pcd(m.file_path(), raw=True)[0, 0] == 0
+
+        images = [m for m in data if m.type().name.startswith('IMAGE')]
+
+        assert np.array_equal(packed.load_images(images, workers=2), data.load_images(images, workers=1))
+
+        assert list(packed.labels()) == list(data.labels())
@@ -0,0 +1,23 @@
+import itertools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from metralabs.parallel import chunks, map_chunks
+
+def test_chunks():
+
+    assert list(chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunks([], 3)) == []
+
+def test_map_chunks():
+
+    assert list(map_chunks(lambda chunk: [2 * v for v in chunk], range(10), chunk_size=3)) == list(range(0, 20, 2))
+
+    # items are consumed lazily, even from an endless iterator
+    with ThreadPoolExecutor(max_workers=2) as executor:
+
+        doubled = map_chunks(lambda chunk: [2 * v for v in chunk], itertools.count(), executor, chunk_size=4, max_pending=2)
+
+        assert list(itertools.islice(doubled, 10)) == list(range(0, 20, 2))
+
+        doubled.close()
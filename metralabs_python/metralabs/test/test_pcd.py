@@ -0,0 +1,39 @@
+import numpy as np
+
+from metralabs.pcd import read_pcd, lzf_decompress
+
+def test_read_pcd(tmp_path, write_pcd):
+
+    points = np.random.default_rng(0).uniform(-5, 5, (100, 4)).astype(np.float32)
+
+    for data in ('ascii', 'binary', 'binary_compressed'):
+
+        path = tmp_path.joinpath(f'{data}.pcd')
+
+        write_pcd(path, points, data)
+
+        xyz = read_pcd(path)
+
+        assert xyz.shape == (100, 3) and xyz.dtype == np.float32
+        assert np.allclose(xyz, points[:,:3])
+
+def test_read_pcd_view(tmp_path, write_pcd):
+
+    points = np.arange(30, dtype=np.float32).reshape(10, 3)
+
+    path = tmp_path.joinpath('xyz.pcd')
+
+    write_pcd(path, points, 'binary', fields=('x', 'y', 'z'))
+
+    xyz = read_pcd(path)
+
+    # packed xyz data is returned without copying
+    assert not xyz.flags.owndata and not xyz.flags.writeable
+    assert np.array_equal(xyz, points)
+
+def test_lzf_back_reference():
+
+    # literal 'abc' followed by a back reference of length 6 to offset 3 (overlapping)
+    compressed = bytes([2]) + b'abc' + bytes([(4 << 5) | 0, 2])
+
+    assert lzf_decompress(compressed, 9) == bytearray(b'abcabcabc')
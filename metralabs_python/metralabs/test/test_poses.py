@@ -0,0 +1,58 @@
+import numpy as np
+
+from scipy.spatial.transform import Rotation, Slerp
+
+from metralabs.message import MESSAGE_TYPES, MetaStore, MessageType, poses_to_matrices
+from metralabs.poses import PoseBuffer
+
+
+def test_pose_buffer_interpolation():
+
+    rng = np.random.default_rng(0)
+
+    times = np.sort(rng.choice(10**9, 20, replace=False)).astype(np.int64)
+
+    poses = np.concatenate((rng.uniform(-5, 5, (20, 3)), rng.uniform(-180, 180, (20, 3))), axis=1)
+
+    # unsorted input
+    order = rng.permutation(20)
+
+    buffer = PoseBuffer(times[order], poses_to_matrices(poses)[order])
+
+    query = rng.integers(times[0], times[-1], 100)
+
+    rotations = Rotation.from_euler('xyz', poses[:,3:], degrees=True)
+
+    expected_rot = Slerp(times, rotations)(query).as_matrix()
+    expected_trans = np.stack([np.interp(query, times, poses[:,k]) for k in range(3)], axis=1)
+
+    result = buffer.poses_at(query)
+
+    assert np.allclose(result.rotations(), expected_rot, atol=1e-9)
+    assert np.allclose(result.translations(), expected_trans)
+
+    # recorded time stamps reproduce the recorded poses, outside times are clamped
+    assert np.allclose(buffer.pose_at(times[5]).matrix(), poses_to_matrices(poses[5])[0])
+    assert np.allclose(buffer.pose_at(times[-1] + 10**9).matrix(), poses_to_matrices(poses[-1])[0])
+    assert np.allclose(buffer.pose_at(0).matrix(), poses_to_matrices(poses[0])[0])
+
+def test_pose_buffer_per_camera():
+
+    pose = np.zeros((4, 6))
+    pose[:,0] = [0, 1, 10, 20]
+
+    store = MetaStore(
+        [0, 10, 0, 10],
+        [MESSAGE_TYPES.index(MessageType.IMAGE_COLOR)] * 4,
+        pose,
+        ['cam1/ColorImage/a.PNG', 'cam1/ColorImage/b.PNG', 'cam2/ColorImage/a.PNG', 'cam2/ColorImage/b.PNG']
+    )
+
+    buffers = PoseBuffer.per_camera(store)
+
+    assert sorted(buffers) == ['cam1', 'cam2']
+
+    assert np.allclose(buffers['cam1'].pose_at(5).trans_, [0.5, 0, 0])
+    assert np.allclose(buffers['cam2'].pose_at(5).trans_, [15, 0, 0])
+
+    assert len(PoseBuffer.per_camera(store, types=[MessageType.POINT_CLOUD])) == 0
@@ -0,0 +1,42 @@
+import numpy as np
+
+import pytest
+
+from PIL import Image
+
+import metralabs.render
+
+from metralabs import DataFolder
+from metralabs.render import frame_times, render
+
+def test_render(tmp_path, dataset_dir):
+
+    path = dataset_dir
+
+    data = DataFolder(path)
+
+    times = frame_times(data, 0.1)
+
+    assert times[0] == data.get_start_time()
+    assert times[-1] <= data.get_end_time()
+    assert np.all(np.diff(times) == 10**8)
+
+    frames = render(path, tmp_path.joinpath('frames'), step=0.5, jobs=1, size=(64, 48))
+
+    assert len(frames) == len(frame_times(data, 0.5))
+    assert [frame.name for frame in frames] == [f'frame_{i:06d}.png' for i in range(len(frames))]
+
+    image = np.asarray(Image.open(frames[0]))
+
+    assert image.shape == (48, 64, 3)
+
+def test_render_empty(tmp_path, monkeypatch):
+
+    path = tmp_path.joinpath('data')
+    path.mkdir()
+
+    # no plotter is created without frames
+    monkeypatch.setattr(metralabs.render, 'Renderer', None)
+
+    with pytest.warns(UserWarning, match='No frames'):
+        assert render(path, tmp_path.joinpath('frames'), jobs=1) == []
@@ -0,0 +1,94 @@
+import gc
+
+import json
+
+from pathlib import Path
+
+import numpy as np
+
+import pytest
+
+from metralabs.solution import Solution, export_solution, read_solution
+from metralabs.grade import grade_solution_dir
+
+def test_solution_files(tmp_path):
+
+    boxes = np.array([[1, 2, 3, 4], [5, 6, 7, 8]])
+
+    with Solution(tmp_path) as solution:
+
+        solution.append('cam1/ColorImage/1.PNG', boxes)
+        solution.append('cam2/ColorImage/2.PNG', [(1, 1, 2, 2)])
+
+        # the caller may reuse its arrays
+        boxes[:] = 0
+
+    label = json.loads(tmp_path.joinpath('cam1/ColorImage/1_sol_label.json').read_text())
+
+    assert label == dict(file='cam1/ColorImage/1.PNG', boxes=[[1, 2, 3, 4], [5, 6, 7, 8]])
+
+    assert sorted(label['file'] for label in read_solution(tmp_path)) == ['cam1/ColorImage/1.PNG', 'cam2/ColorImage/2.PNG']
+
+def test_solution_jsonl(tmp_path):
+
+    reference_dir = Path(__file__).parent.joinpath('data/grade/reference')
+    solution_dir = Path(__file__).parent.joinpath('data/grade/solution')
+
+    labels = list(read_solution(solution_dir))
+
+    jsonl_dir = tmp_path.joinpath('jsonl')
+
+    with Solution(jsonl_dir, jsonl=True, shard_records=50, queue_size=8) as solution:
+        for label in labels:
+            solution.append(label['file'], label['boxes'])
+
+    assert len(list(jsonl_dir.glob('solution_*.jsonl'))) == (len(labels) + 49) // 50
+
+    expected = grade_solution_dir(solution_dir, reference_dir)
+
+    assert grade_solution_dir(jsonl_dir, reference_dir) == expected
+    assert grade_solution_dir(jsonl_dir, reference_dir, cache_dir=tmp_path.joinpath('cache')) == expected
+
+    files_dir = tmp_path.joinpath('files')
+
+    assert export_solution(jsonl_dir, files_dir) == len(labels)
+
+    assert grade_solution_dir(files_dir, reference_dir) == expected
+
+def test_solution_errors(tmp_path):
+
+    # the output directory cannot be created
+    path = tmp_path.joinpath('file')
+    path.write_text('')
+
+    solution = Solution(path)
+
+    solution.append('cam1/ColorImage/1.PNG', [(1, 2, 3, 4)])
+
+    with pytest.raises(RuntimeError, match='labels were lost'):
+        solution.flush()
+
+    # the error is sticky
+    with pytest.raises(RuntimeError, match='labels were lost'):
+        solution.append('cam1/ColorImage/2.PNG', [(1, 2, 3, 4)])
+
+    with pytest.raises(RuntimeError, match='labels were lost'):
+        solution.close()
+
+    with pytest.raises(RuntimeError, match='labels were lost'):
+        solution.close()
+
+def test_solution_collected(tmp_path):
+
+    solution = Solution(tmp_path)
+
+    solution.append('cam1/ColorImage/1.PNG', [(1, 2, 3, 4)])
+
+    writer = solution.writer_
+
+    # abandoned solutions are not kept alive, their labels are still written
+    del solution
+    gc.collect()
+
+    assert not writer.thread_.is_alive()
+    assert tmp_path.joinpath('cam1/ColorImage/1_sol_label.json').exists()
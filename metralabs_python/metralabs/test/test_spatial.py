@@ -0,0 +1,91 @@
+import numpy as np
+
+from metralabs import DataFolder, Camera
+from metralabs.message import MetaStore, MessageType
+from metralabs.spatial import SpatialIndex, message_bounds
+
+
+def random_store(n, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    pose = np.zeros((n, 6))
+    pose[:,0] = rng.uniform(0, 20, n)
+    pose[:,1] = rng.uniform(0.8, 1.2, n)
+    pose[:,2] = rng.uniform(0, 2, n)
+    pose[:,3:] = rng.uniform(-10, 10, (n, 3))
+
+    types = rng.integers(0, len(MessageType), n)
+
+    return MetaStore(np.arange(n), types, pose, [f'cam/{i}.PNG' for i in range(n)])
+
+def test_message_bounds():
+
+    store = random_store(50)
+
+    min_corners, max_corners = message_bounds(store)
+
+    for meta, lo, hi in zip(store, min_corners, max_corners):
+
+        if meta.type() == MessageType.POINT_CLOUD:
+            assert np.allclose(lo, meta.pose().trans_) and np.allclose(hi, meta.pose().trans_)
+            continue
+
+        # the footprint must contain the extent of the image plane
+        for corner in Camera(meta).get_world_extent(meta.pose().trans_[1] + 0.1):
+            assert (lo - 1e-9 <= corner).all() and (corner <= hi + 1e-9).all()
+
+def test_spatial_index_queries():
+
+    store = random_store(2000)
+
+    index = SpatialIndex.build(store)
+
+    rng = np.random.default_rng(1)
+
+    for _ in range(20):
+
+        lo = rng.uniform((0, -1, 0), (20, 1, 2))
+        hi = lo + rng.uniform(0, 2, 3)
+
+        expected = np.flatnonzero(np.all((index.min_ <= hi) & (lo <= index.max_), axis=1))
+
+        assert (index.query_box(lo, hi) == expected).all()
+
+    point = (10, 0, 1)
+
+    assert (index.query_point(point) == index.query_box(point, point)).all()
+
+    nearest = index.nearest(point, k=5)
+
+    assert len(nearest) == 5
+    assert np.sort(index.distance(point))[4] == index.distance(point)[nearest[-1]]
+
+    # the ring search must find the same distances as a full scan, also for points outside of the grid
+    for point in rng.uniform((-10, -5, -5), (30, 5, 5), (20, 3)):
+        for k in (1, 7, 50):
+
+            expected = np.sort(index.distance(point))[:k]
+
+            assert np.array_equal(index.distance(point)[index.nearest(point, k)], expected)
+
+    assert len(index.nearest(point, k=len(index) + 1)) == len(index)
+
+def test_spatial_index_persistent(data_dir):
+
+    test_data_dir = data_dir
+
+    index = DataFolder(test_data_dir).spatial_index()
+
+    assert test_data_dir.joinpath('.metralabs', SpatialIndex.file_name()).exists()
+
+    # each projection distance has its own file
+    DataFolder(test_data_dir).spatial_index(dist=2.0)
+
+    assert test_data_dir.joinpath('.metralabs', SpatialIndex.file_name(2.0)).exists()
+
+    loaded = DataFolder(test_data_dir).spatial_index()
+
+    assert np.array_equal(index.min_, loaded.min_) and np.array_equal(index.max_, loaded.max_)
+    assert np.array_equal(index.keys_, loaded.keys_) and np.array_equal(index.rows_, loaded.rows_)
+    assert len(loaded.query_point((0, 0, 0.1))) == len(loaded)
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import numpy as np
+
+from PIL import Image
+
+from metralabs import DataFolder, MessageType
+from metralabs.textures import TextureCache, annotated_image, mip_level
+
+def test_mip_level():
+
+    assert mip_level(1080, 1080) == 0
+    assert mip_level(1080, 2000) == 0
+    assert mip_level(1080, 540) == 1
+    assert mip_level(1080, 300) == 1
+    assert mip_level(1080, 10) == 4
+    assert mip_level(1080, None) == 4
+
+def test_annotated_image():
+
+    image = Image.new('RGB', (64, 32))
+
+    array = annotated_image(image, [(8, 8, 24, 16)], level=1)
+
+    assert array.shape == (16, 32, 3)
+
+    # box drawn at half the coordinates
+    assert tuple(array[4, 4]) == (255, 0, 0)
+    assert tuple(array[0, 0]) == (0, 0, 0)
+
+    # the source image is not modified
+    assert np.asarray(image).max() == 0
+
+def test_texture_cache(monkeypatch):
+
+    data = DataFolder(Path(__file__).parent.joinpath('data'), index=False)
+
+    meta = next(meta for meta in data if meta.type() == MessageType.IMAGE_COLOR)
+
+    with data.load_image(meta.file_path()) as image:
+        height = image.height
+
+    textures = TextureCache(max_bytes=2**30, max_level=2)
+
+    opened = []
+
+    load_image = data.load_image
+    monkeypatch.setattr(data, 'load_image', lambda file_path: opened.append(file_path) or load_image(file_path))
+
+    boxes = [(1, 2, 30, 40)]
+
+    coarse, level = textures.get(data, meta, boxes)
+
+    assert level == 2
+    assert coarse.shape[0] == height // 4
+
+    # the size and the pixels are read with one open
+    assert len(opened) == 1
+
+    fine, level = textures.get(data, meta, boxes, screen_height=height)
+
+    assert level == 0
+    assert fine.shape[0] == height
+
+    again, _ = textures.get(data, meta, boxes, screen_height=height)
+
+    assert again is fine
+    assert textures.stats()['hits'] == 1
+
+    # cached textures do not open the image
+    assert len(opened) == 2
+
+    # a different label is a different texture
+    other, _ = textures.get(data, meta, [], screen_height=height)
+
+    assert other is not fine
+    assert textures.stats()['misses'] == 3
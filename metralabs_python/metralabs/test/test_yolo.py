@@ -0,0 +1,55 @@
+import numpy as np
+
+from PIL import Image
+
+from metralabs import DataFolder
+from metralabs.pack import pack
+from metralabs.yolo import export_yolo, format_yolo, image_size, yolo_boxes
+
+FILE = 'cam1/ColorImage/1715584015812594000.PNG'
+
+def test_yolo_boxes():
+
+    boxes = yolo_boxes([[0, 0, 100, 50], [50, 25, 150, 75]], 100, 50)
+
+    assert np.allclose(boxes, [[0.5, 0.5, 1.0, 1.0], [0.75, 0.75, 0.5, 0.5]])
+
+    assert format_yolo([[10, 20, 30, 40]], 100, 100, class_id=2) == '2 0.200000 0.300000 0.200000 0.200000\n'
+    assert format_yolo([], 100, 100) == ''
+
+def test_export_yolo(tmp_path, dataset_dir):
+
+    path = dataset_dir
+
+    with Image.open(path.joinpath(FILE)) as image:
+        width, height = image.size
+
+    assert image_size(path.joinpath(FILE)) == (width, height)
+
+    output = tmp_path.joinpath('yolo')
+
+    results = export_yolo(DataFolder(path), output, jobs=2)
+
+    assert [(r.file, r.image_written, r.label_written, r.error) for r in results] == [(FILE, True, True, '')]
+
+    image = output.joinpath('cam1_ColorImage_1715584015812594000.PNG')
+
+    assert image.read_bytes() == path.joinpath(FILE).read_bytes()
+    assert output.joinpath('cam1_ColorImage_1715584015812594000.txt').read_text() == format_yolo([[1, 2, 30, 40]], width, height)
+
+    # nothing changed
+    results = export_yolo(DataFolder(path), output)
+
+    assert [(r.image_written, r.label_written) for r in results] == [(False, False)]
+
+    # packed datasets are exported from their shards
+    packed = tmp_path.joinpath('packed')
+
+    pack(DataFolder(path), packed)
+
+    packed_output = tmp_path.joinpath('packed_yolo')
+
+    results = export_yolo(DataFolder(packed), packed_output)
+
+    assert [(r.image_written, r.label_written, r.error) for r in results] == [(True, True, '')]
+    assert packed_output.joinpath(image.name).read_bytes() == image.read_bytes()
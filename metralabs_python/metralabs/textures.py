@@ -0,0 +1,119 @@
+import zlib
+
+import threading
+
+import numpy as np
+
+from PIL import Image, ImageDraw
+
+from metralabs.cache import LRUCache
+from metralabs.message import MessageMeta
+
+def label_version(boxes) -> int:
+    '''
+    Checksum of the boxes of a label, changes whenever the boxes change.
+    '''
+    return zlib.crc32(np.asarray(boxes, dtype=np.float64).reshape(-1, 4).tobytes())
+
+def mip_level(image_height : int, screen_height : float, max_level=4) -> int:
+    '''
+    Coarsest mip level (downscaling by 2**level) that still has at least `screen_height` pixels of height.
+    '''
+    if screen_height is None or screen_height <= 0:
+        return max_level
+
+    level = int(np.floor(np.log2(max(image_height / screen_height, 1.0))))
+
+    return min(level, max_level)
+
+def annotated_image(image : Image.Image, boxes, level=0) -> np.ndarray:
+    '''
+    Downscales the image by 2**level and draws the boxes (in full resolution coordinates) into it.
+    Returns an (H,W,C) uint8 array.
+    '''
+    factor = 2**level
+
+    if factor > 1:
+        image = image.reduce(factor)
+    else:
+        image = image.copy()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    draw = ImageDraw.Draw(image)
+
+    for box in boxes:
+        draw.rectangle([v / factor for v in box], width=max(1, round(7 / factor)), outline='red', fill=None)
+
+    return np.asarray(image)
+
+class TextureCache:
+    '''
+    Box-annotated, downscaled images for textures, keyed by file, label version and mip level.
+    Thread-safe, evicts least recently used textures to stay within the memory budget.
+    '''
+
+    def __init__(self, max_bytes=512 * 2**20, max_level=4):
+
+        self.cache_ = LRUCache(max_bytes)
+        self.max_level_ = max_level
+
+        # file -> full resolution image height, avoids opening cached images again
+        self.heights_ = {}
+        self.lock_ = threading.Lock()
+
+    def get(self, data, meta : MessageMeta, boxes, screen_height=None):
+        '''
+        Returns (image (H,W,C) uint8 array, mip level) for the image message. Do not modify the array.
+
+        :param data:            DataFolder.
+        :param boxes:           Boxes to draw into the image.
+        :param screen_height:   Height of the image on screen in pixels, selects the mip level. Coarsest level if None.
+        '''
+        file = meta.file_path_str()
+
+        version = label_version(boxes)
+
+        def texture(image, level):
+
+            array = annotated_image(image, boxes, level)
+
+            array.flags.writeable = False
+
+            return array
+
+        with self.lock_:
+            height = self.heights_.get(file)
+
+        if height is not None:
+
+            level = mip_level(height, screen_height, self.max_level_)
+
+            def load():
+
+                with data.load_image(meta.file_path()) as image:
+                    return texture(image, level)
+
+            return self.cache_.get_or_load((file, version, level), load), level
+
+        # first request of the image, its size and pixels are read from the same handle
+        with data.load_image(meta.file_path()) as image:
+
+            with self.lock_:
+                self.heights_[file] = image.height
+
+            level = mip_level(image.height, screen_height, self.max_level_)
+
+            return self.cache_.get_or_load((file, version, level), lambda: texture(image, level)), level
+
+    def image_height(self, file : str) -> int:
+        '''
+        Full resolution height of an image seen before, None otherwise.
+        '''
+        with self.lock_:
+            return self.heights_.get(file)
+
+    def stats(self) -> dict:
+
+        return self.cache_.stats()
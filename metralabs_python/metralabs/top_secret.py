@@ -2,25 +2,18 @@
 Damn, they forgot to remove the correct solution from the code >:)
 '''
 
-import json
-
-from pathlib import Path
-
 import random
 
 from metralabs import MessageMeta, DataFolder
 
 def find_product_boxes(meta : MessageMeta, data : DataFolder):
 
-    label_path = data.resolve(meta.file_path())\
-        .with_suffix('')\
-        .absolute()\
-        .__str__() + '_label.json'
+    label = data.load_label(meta)
 
-    if not Path(label_path).exists():
+    if label is None:
         return []
 
-    boxes = json.load(open(label_path, 'r'))['boxes']
+    boxes = list(label['boxes'])
 
     random.shuffle(boxes)
 
@@ -0,0 +1,284 @@
+import numpy as np
+
+import pyvista as pv
+
+from metralabs.data import DataFolder
+from metralabs.message import MessageMeta, MessageType
+from metralabs.camera import Camera, shelf_distance
+from metralabs.lod import PointPyramid
+from metralabs.textures import TextureCache, annotated_image
+
+class ActorPool:
+    '''
+    Keeps hidden VTK actors of released visualizations for reuse, so scrubbing through time
+    updates existing actors instead of destroying and recreating them.
+    Actors are pooled per kind since a kind defines the render properties (opacity, point size, ...).
+    '''
+
+    def __init__(self, plotter, max_free=64):
+
+        self.plotter_ = plotter
+        self.max_free_ = max_free
+
+        # kind -> hidden actors
+        self.free_ = {}
+
+    def acquire(self, kind : str, kwargs : dict):
+        '''
+        Returns a visible actor showing kwargs['mesh'] (and kwargs['texture']), reusing a pooled actor if possible.
+        '''
+        free = self.free_.get(kind)
+
+        if not free:
+            return self.plotter_.add_mesh(**kwargs, render=False)
+
+        actor = free.pop()
+
+        # replace the contents of the actor's mesh in place
+        actor.mapper.dataset.shallow_copy(kwargs['mesh'])
+
+        if 'texture' in kwargs:
+            actor.texture = kwargs['texture']
+
+        actor.visibility = True
+
+        return actor
+
+    def release(self, kind : str, actor):
+        '''
+        Hides the actor and keeps it for reuse. Actors beyond the pool capacity are removed.
+        '''
+        free = self.free_.setdefault(kind, [])
+
+        if len(free) < self.max_free_:
+            actor.visibility = False
+            free.append(actor)
+        else:
+            self.plotter_.remove_actor(actor, render=False)
+
+class MessageVisualization:
+    '''
+    Actors showing the data of one message. Call release() to remove them from the plotter.
+
+    Creating a visualization is split in two steps: prepare(...) loads the data into NumPy
+    payloads and may run in a worker thread, create_polydata(...) turns the payload into
+    meshes and textures and must run in the thread owning the plotter.
+    '''
+
+    # actors of the same kind are interchangeable, see ActorPool
+    kind = None
+
+    def __init__(self, plotter, meta : MessageMeta, data_folder : DataFolder, pool : ActorPool = None, payload=None):
+        '''
+        :param payload: Result of prepare(...). Prepared in the calling thread if None.
+        '''
+        self.plotter_ = plotter
+        self.meta_ = meta
+        self.data_folder_ = data_folder
+        self.pool_ = pool
+
+        if payload is None:
+            payload = self.prepare(meta, data_folder)
+
+        self.actors_ = [self.acquire(kwargs) for kwargs in self.create_polydata(payload)]
+
+    @staticmethod
+    def prepare(meta : MessageMeta, data_folder : DataFolder, label=None):
+        '''
+        Loads the data of the message. Must not create any VTK objects.
+        '''
+        return None
+
+    def create_polydata(self, payload):
+        return []
+
+    def acquire(self, kwargs : dict):
+
+        if self.pool_ is not None:
+            return self.pool_.acquire(self.kind, kwargs)
+
+        return self.plotter_.add_mesh(**kwargs, render=False)
+
+    def release(self):
+        '''
+        Removes the actors from the plotter, or hands them back to the pool.
+        '''
+        for actor in self.actors_:
+
+            if self.pool_ is not None:
+                self.pool_.release(self.kind, actor)
+            else:
+                self.plotter_.remove_actor(actor, render=False)
+
+        self.actors_ = []
+
+class ImageVisualization(MessageVisualization):
+
+    kind = 'image'
+
+    # corners of the image in pixel coordinates (normalized) and their texture coordinates
+    TEXTURE_COORDINATES = [
+        (0,0), (1,1), (1,0), (0,1),
+    ]
+
+    def __init__(self, plotter, meta : MessageMeta, data_folder : DataFolder, label, pool : ActorPool = None, payload=None):
+
+        if payload is None:
+            payload = ImageVisualization.prepare(meta, data_folder, label)
+
+        MessageVisualization.__init__(self, plotter, meta, data_folder, pool, payload)
+
+    @staticmethod
+    def corners(meta : MessageMeta) -> np.ndarray:
+        '''
+        World positions of the image corners (see TEXTURE_COORDINATES) projected onto the shelf.
+        '''
+        pose = meta.pose()
+        
+        # project the image onto the shelf
+        dist = shelf_distance(pose.trans_)
+
+        camera = Camera(meta)
+
+        return np.array([
+            camera.get_world_position(x,y, dist) for x,y in ImageVisualization.TEXTURE_COORDINATES
+        ])
+
+    @staticmethod
+    def prepare(meta : MessageMeta, data_folder : DataFolder, label=None, textures : TextureCache = None, screen_height=None):
+        '''
+        Returns the image with the label boxes drawn into it as (H,W,C) array, its mip level, and its corners.
+
+        :param textures:        Cache to take the image from, at the resolution required by `screen_height`.
+                                Full resolution without a cache.
+        :param screen_height:   Height of the image on screen in pixels.
+        '''
+        boxes = [] if label is None else label['boxes']
+
+        if textures is not None:
+            image, level = textures.get(data_folder, meta, boxes, screen_height)
+        else:
+            with data_folder.load_image(meta.file_path()) as full:
+                image, level = annotated_image(full, boxes), 0
+
+        return dict(image=image, level=level, points=ImageVisualization.corners(meta))
+
+    def create_polydata(self, payload):
+
+        self.level_ = payload['level']
+        self.corners_ = payload['points']
+
+        texture = pv.numpy_to_texture(payload['image'])
+
+        plane = pv.PolyData(payload['points'], faces=[4,0,2,1,3])
+
+        plane.active_texture_coordinates = np.array([(u, 1.0 - v) for u,v in ImageVisualization.TEXTURE_COORDINATES])
+
+        yield dict(
+            mesh=plane,
+            texture=texture,
+            opacity=0.85
+        )
+
+    def update(self, payload):
+        '''
+        Replaces the texture, e.g. by one of a finer mip level.
+        '''
+        self.level_ = payload['level']
+
+        for actor in self.actors_:
+            actor.texture = pv.numpy_to_texture(payload['image'])
+
+
+
+class PointCloudVisualization(MessageVisualization):
+    '''
+    Shows a level of the point cloud's PointPyramid, see set_budget(...).
+    '''
+
+    kind = 'point_cloud'
+
+    # number of points shown until a budget is set
+    initial_budget = 100000
+
+    @staticmethod
+    def prepare(meta : MessageMeta, data_folder : DataFolder, label=None):
+        '''
+        Returns the PointPyramid of the point cloud, built on first use and cached with the dataset.
+        '''
+        save = data_folder.index_ is not None or data_folder.packed_ is not None
+
+        return PointPyramid.open(data_folder, meta.file_path_str(), save=save)
+
+    def create_polydata(self, payload):
+
+        self.pyramid_ = payload
+        self.level_ = payload.level_for_budget(PointCloudVisualization.initial_budget)
+
+        yield dict(
+            mesh=pv.PolyData(self.pyramid_.level(self.level_), deep=False),
+            point_size=1,
+            render_points_as_spheres=True
+        )
+
+    def center(self) -> np.ndarray:
+
+        return self.pyramid_.center()
+
+    def set_budget(self, budget : int) -> bool:
+        '''
+        Shows the finest level with at most `budget` points. Returns True if the level changed.
+        '''
+        level = self.pyramid_.level_for_budget(budget)
+
+        if level == self.level_ or len(self.actors_) == 0:
+            return False
+
+        self.level_ = level
+
+        # levels are prefixes of the same array: the points are wrapped without a copy (deep=False),
+        # only the vertex cells of the level are created
+        self.actors_[0].mapper.dataset.shallow_copy(pv.PolyData(self.pyramid_.level(level), deep=False))
+
+        return True
+
+def visualization_type(meta : MessageMeta):
+    '''
+    Visualization class for the message.
+    '''
+    return PointCloudVisualization if meta.type() == MessageType.POINT_CLOUD else ImageVisualization
+
+def screen_height(corners : np.ndarray, camera, window_height : int) -> float:
+    '''
+    Approximate height in pixels of an image with the given world corners (see ImageVisualization.corners) on screen.
+
+    :param camera:  pyvista Camera of the plotter.
+    '''
+    dist = max(np.linalg.norm(corners.mean(axis=0) - np.array(camera.position)), 1e-3)
+
+    height = np.linalg.norm(corners[3] - corners[0])
+
+    visible_height = 2 * dist * np.tan(np.radians(camera.view_angle) / 2)
+
+    return height / visible_height * window_height
+
+def distribute_points(clouds, camera_position, budget : int) -> bool:
+    '''
+    Distributes the point budget over the PointCloudVisualizations, giving clouds closer to the camera more points.
+    Returns True if any cloud changed its level.
+    '''
+    if len(clouds) == 0:
+        return False
+
+    camera_position = np.asarray(camera_position, dtype=np.float64)
+
+    distances = np.array([np.linalg.norm(vis.center() - camera_position) for vis in clouds])
+
+    # on-screen density falls with the squared distance
+    weights = 1.0 / np.maximum(distances, 0.1)**2
+
+    budgets = budget * weights / weights.sum()
+
+    changed = [vis.set_budget(int(b)) for vis, b in zip(clouds, budgets)]
+
+    return any(changed)
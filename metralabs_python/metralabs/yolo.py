@@ -0,0 +1,266 @@
+#!/bin/env python
+'''
+Exports the labeled images of a dataset for training YOLO detectors.
+
+Run:
+
+python -m metralabs.yolo path/to/dataset path/to/output [--jobs N] [--class-id 0]
+
+All labeled images are placed in one directory next to a .txt file per image with one
+`class x_center y_center width height` line per box, normalized by the image size. Images are
+hard-linked (copied if linking is not possible), and unchanged outputs are left untouched, so
+exporting again only updates what changed. The output can be split with e.g. yolosplitter.
+'''
+
+import os
+
+import struct
+
+import shutil
+
+from typing import List, NamedTuple
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+
+import numpy as np
+
+from metralabs.data import DataFolder
+from metralabs.images import ByteRange, open_image
+from metralabs.parallel import map_chunks
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def png_size(header : bytes):
+    '''
+    (width, height) from the first 24 bytes of a PNG file, None if it is not a PNG file.
+    '''
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        return None
+
+    return struct.unpack('>II', header[16:24])
+
+def read_header(source, size=24) -> bytes:
+
+    if isinstance(source, ByteRange):
+        with open(source.path, 'rb') as f:
+            f.seek(source.offset)
+            return f.read(min(size, source.length))
+
+    with open(source, 'rb') as f:
+        return f.read(size)
+
+def image_size(source) -> tuple:
+    '''
+    (width, height) of an image (path or ByteRange) without decoding it.
+    PNG sizes are read from the header, other formats are opened lazily by PIL.
+    '''
+    if isinstance(source, ByteRange) and source.shape is not None:
+        return source.shape[1], source.shape[0]
+
+    size = png_size(read_header(source))
+
+    if size is not None:
+        return size
+
+    with open_image(source) as image:
+        return image.size
+
+def yolo_boxes(boxes, width : int, height : int) -> np.ndarray:
+    '''
+    Converts (K,4) [xmin, ymin, xmax, ymax] pixel boxes into (K,4) [x_center, y_center, width, height]
+    normalized by the image size. Boxes are clipped to the image.
+    '''
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+    size = np.array([width, height, width, height], dtype=np.float64)
+
+    boxes = np.clip(boxes, 0, size) / size
+
+    return np.concatenate(((boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]), axis=1)
+
+def format_yolo(boxes, width : int, height : int, class_id=0) -> str:
+    '''
+    Contents of the YOLO label file of an image.
+    '''
+    return ''.join(
+        f'{class_id} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n'
+        for x, y, w, h in yolo_boxes(boxes, width, height).tolist()
+    )
+
+def yolo_name(file : str) -> str:
+    '''
+    Name of the exported image, unique within the flat output directory, e.g. cam1/ColorImage/1.PNG -> cam1_ColorImage_1.PNG
+    '''
+    return file.replace('\\', '/').replace('/', '_')
+
+def export_image(source, dst : Path) -> bool:
+    '''
+    Hard-links (or copies) the image to dst unless it is already there. Returns True if dst was written.
+    '''
+    if isinstance(source, ByteRange):
+
+        # images within shards of packed datasets are written out, raw images are encoded as PNG
+        if dst.exists() and (source.shape is not None or dst.stat().st_size == source.length):
+            return False
+
+    elif dst.exists():
+
+        source_stat = os.stat(source)
+        dst_stat = dst.stat()
+
+        if (dst_stat.st_dev, dst_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+            return False
+
+        # copies keep the modification time of the source
+        if dst_stat.st_size == source_stat.st_size and dst_stat.st_mtime_ns == source_stat.st_mtime_ns:
+            return False
+
+    tmp = dst.with_name(dst.name + '.tmp')
+
+    try:
+        tmp.unlink(missing_ok=True)
+
+        if not isinstance(source, ByteRange):
+            try:
+                os.link(source, tmp)
+            except OSError:
+                shutil.copy2(source, tmp)
+
+        elif source.shape is not None:
+            with open_image(source) as image:
+                image.save(tmp, format='PNG')
+
+        else:
+            with open(source.path, 'rb') as f_src, open(tmp, 'wb') as f_dst:
+                f_src.seek(source.offset)
+                f_dst.write(f_src.read(source.length))
+
+        os.replace(tmp, dst)
+
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return True
+
+def write_if_changed(path : Path, text : str) -> bool:
+    '''
+    Writes the text file unless it already has this content. Returns True if it was written.
+    '''
+    try:
+        if path.read_text() == text:
+            return False
+    except OSError:
+        pass
+
+    tmp = path.with_name(path.name + '.tmp')
+
+    try:
+        tmp.write_text(text)
+
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return True
+
+class ExportResult(NamedTuple):
+    file: str
+    image_written: bool = False
+    label_written: bool = False
+    error: str = ''
+
+def export_item(file : str, source, boxes, output : Path, class_id=0) -> ExportResult:
+    '''
+    Exports one labeled image and its YOLO label file into output.
+    '''
+    name = yolo_name(file)
+
+    try:
+        width, height = image_size(source)
+
+        label_written = write_if_changed(output.joinpath(Path(name).stem + '.txt'), format_yolo(boxes, width, height, class_id))
+
+        image_written = export_image(source, output.joinpath(name))
+
+    except (OSError, ValueError, SyntaxError) as e:
+        # PIL raises SyntaxError for some broken image headers
+        return ExportResult(file, error=f'{type(e).__name__}: {e}')
+
+    return ExportResult(file, image_written, label_written)
+
+def export_items(items) -> List[ExportResult]:
+    '''
+    Exports a chunk of (file, source, boxes, output, class_id) items.
+    '''
+    return [export_item(*item) for item in items]
+
+def export_yolo(data : DataFolder, output, jobs=None, class_id=0) -> List[ExportResult]:
+    '''
+    Exports all labeled images of the dataset with their YOLO label files into the directory output.
+    Image sizes are read from the image headers, images are not decoded.
+    Returns one result per labeled image, sorted by file.
+
+    :param jobs:        Number of worker threads, the work is I/O bound. Defaults to the Python default for thread pools.
+    :param class_id:    Class of all boxes.
+    '''
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    labels = data.label_store()
+
+    def items():
+
+        store = data.store()
+
+        # labels of files that are not messages of the dataset are ignored
+        for row in range(len(store)):
+
+            file = store.file_path_str(row)
+
+            boxes = labels.boxes(file)
+
+            if boxes is None:
+                continue
+
+            if data.packed_ is not None:
+                source = data.packed_.byte_range(file)
+            else:
+                source = data.resolve(file)
+
+            yield file, source, boxes, output, class_id
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(map_chunks(export_items, items(), executor, chunk_size=64))
+
+    return sorted(results, key=lambda result: result.file)
+
+if __name__ == '__main__':
+
+    import sys
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export the labeled images of a dataset in YOLO format.')
+    parser.add_argument('dataset', help='dataset directory')
+    parser.add_argument('output', help='output directory')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='number of worker threads')
+    parser.add_argument('--class-id', type=int, default=0, help='class of all boxes')
+
+    args = parser.parse_args()
+
+    results = export_yolo(DataFolder(args.dataset), args.output, args.jobs, args.class_id)
+
+    failures = [result for result in results if result.error]
+
+    images = sum(result.image_written for result in results)
+    labels = sum(result.label_written for result in results)
+
+    print(f'Exported {len(results) - len(failures)} images to {args.output}: {images} images and {labels} labels written, failed {len(failures)}')
+
+    for result in failures:
+        print(f'Failed {result.file}: {result.error}', file=sys.stderr)
+
+    if len(failures) > 0:
+        sys.exit(1)
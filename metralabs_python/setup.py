@@ -11,11 +11,9 @@ setup(
     'pyvista',
     'pyvistaqt',
     'numpy',
-    'open3d',
     'matplotlib',
     'pytest',
     'pillow',
-    'scipy',
-    'munkres'
+    'scipy'
   ]
 )